@@ -0,0 +1,119 @@
+"""
+Seeded synthetic inputs of algorithms: corpora of words with Zipf distribution of frequencies,
+road edges and logs of travels over them with tunable number of edges and skew of traffic.
+The same arguments always give the same rows.
+"""
+import random
+import string
+import typing as tp
+from datetime import datetime
+from datetime import timedelta
+from itertools import accumulate
+
+from compgraph.misc import TRow
+
+TIME_FORMAT = "%Y%m%dT%H%M%S.%f"
+# most words go without punctuation, as in ordinary text
+PUNCTUATION = ["", "", "", "", "", ",", ".", "!", "?", ";"]
+
+
+def zipf_weights(count: int, exponent: float) -> list[float]:
+    """Cumulative weights of ranks 1..count, rank k has probability proportional to 1 / k ** exponent;
+    exponent 0 gives uniform distribution
+    """
+    return list(accumulate(1 / rank**exponent for rank in range(1, count + 1)))
+
+
+def make_vocabulary(size: int, rnd: random.Random) -> list[str]:
+    """Distinct lowercase words in random order, so frequency rank doesn't follow alphabet"""
+    words: set[str] = set()
+    while len(words) < size:
+        words.add("".join(rnd.choices(string.ascii_lowercase, k=rnd.randint(2, 12))))
+    result = sorted(words)
+    rnd.shuffle(result)
+    return result
+
+
+def text_corpus(
+    docs: int,
+    vocabulary: int = 20_000,
+    words_per_doc: int = 50,
+    exponent: float = 1.1,
+    seed: int = 0,
+) -> list[TRow]:
+    """
+    Documents {"doc_id": ..., "text": ...} of words drawn with Zipf distribution, some of them
+    capitalized or followed by punctuation
+    :param docs: number of documents
+    :param vocabulary: number of distinct words
+    :param words_per_doc: average number of words in document
+    :param exponent: exponent of Zipf distribution, greater is more skewed
+    :param seed: seed of random generator
+    """
+    rnd = random.Random(seed)
+    words = make_vocabulary(vocabulary, rnd)
+    weights = zipf_weights(vocabulary, exponent)
+    rows = []
+    for doc_id in range(docs):
+        chosen = rnd.choices(words, cum_weights=weights, k=rnd.randint(1, 2 * words_per_doc - 1))
+        text = " ".join(
+            (word.capitalize() if rnd.random() < 0.1 else word) + rnd.choice(PUNCTUATION)
+            for word in chosen
+        )
+        rows.append({"doc_id": doc_id, "text": text})
+    return rows
+
+
+def road_edges(edges: int, seed: int = 0) -> list[TRow]:
+    """
+    Edges {"edge_id": ..., "start": [lon, lat], "end": [lon, lat]} up to a couple of kilometers long
+    :param edges: number of edges
+    :param seed: seed of random generator
+    """
+    rnd = random.Random(seed)
+    rows = []
+    for edge_id in range(edges):
+        start = [37.3 + rnd.random() * 0.6, 55.5 + rnd.random() * 0.4]
+        end = [start[0] + rnd.uniform(-0.02, 0.02), start[1] + rnd.uniform(-0.01, 0.01)]
+        rows.append({"edge_id": edge_id, "start": start, "end": end})
+    return rows
+
+
+def travel_log(
+    rows: int,
+    edges: int,
+    skew: float = 0.0,
+    days: int = 28,
+    seed: int = 0,
+) -> list[TRow]:
+    """
+    Travels {"edge_id": ..., "enter_time": ..., "leave_time": ...} with times in TIME_FORMAT
+    :param rows: number of travels
+    :param edges: number of edges travels are spread over
+    :param skew: exponent of Zipf distribution of travels over edges, 0 for uniform
+    :param days: number of days travels start in, from 2017-10-01
+    :param seed: seed of random generator
+    """
+    rnd = random.Random(seed)
+    weights = zipf_weights(edges, skew)
+    edge_ids = rnd.choices(range(edges), cum_weights=weights, k=rows)
+    first = datetime(2017, 10, 1)
+    result = []
+    for edge_id in edge_ids:
+        enter = first + timedelta(microseconds=rnd.randrange(days * 86_400_000_000))
+        leave = enter + timedelta(microseconds=rnd.randrange(5_000_000, 600_000_000))
+        result.append(
+            {
+                "edge_id": edge_id,
+                "enter_time": enter.strftime(TIME_FORMAT),
+                "leave_time": leave.strftime(TIME_FORMAT),
+            }
+        )
+    return result
+
+
+def sources(rows: dict[str, list[TRow]]) -> dict[str, tp.Callable[[], tp.Iterator[TRow]]]:
+    """Keyword arguments of Graph.run reading copies of rows, as mappers may change rows in place"""
+    return {
+        name: (lambda source=source: (dict(row) for row in source)) for name, source in rows.items()
+    }
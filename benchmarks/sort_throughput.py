@@ -0,0 +1,46 @@
+"""
+Measure throughput of ExternalSort, batch_size=1 approximates row by row transport
+
+    python -m benchmarks.sort_throughput --rows 200000
+"""
+import argparse
+import random
+import time
+
+from compgraph.external_sort import ExternalSort
+from compgraph.misc import TRow
+
+
+def make_rows(count: int, seed: int = 0) -> list[TRow]:
+    rnd = random.Random(seed)
+    return [
+        {"doc_id": rnd.randrange(1000), "text": "w%d" % rnd.randrange(50000), "count": i}
+        for i in range(count)
+    ]
+
+
+def measure(sort: ExternalSort, rows: list[TRow], repeat: int) -> float:
+    """Return best throughput in rows per second"""
+    best = 0.0
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in sort(iter(rows)):
+            pass
+        best = max(best, len(rows) / (time.perf_counter() - start))
+    return best
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=200_000)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    rows = make_rows(args.rows)
+    for batch_size in (1, ExternalSort(["text"]).batch_size):
+        throughput = measure(ExternalSort(["text"], batch_size=batch_size), rows, args.repeat)
+        print(f"ExternalSort batch_size={batch_size}: {args.rows} rows, {throughput:,.0f} rows/s")
+
+
+if __name__ == "__main__":
+    main()
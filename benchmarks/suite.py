@@ -0,0 +1,191 @@
+"""
+Run algorithms on seeded synthetic data of several sizes, record throughput, wall time, peak RSS
+and profile of every operation, and compare results with a stored baseline.
+Every case runs in a fresh process, so peak RSS of one case doesn't hide that of another.
+Size is the number of documents for text algorithms and the number of travels for yandex_maps.
+
+    python -m benchmarks.suite --sizes 1000 4000 --output baseline.json
+    python -m benchmarks.suite --sizes 1000 4000 --baseline baseline.json --threshold 0.25
+"""
+import argparse
+import json
+import multiprocessing
+import platform
+import sys
+import time
+import typing as tp
+from concurrent.futures import ProcessPoolExecutor
+
+from benchmarks.data import road_edges
+from benchmarks.data import sources
+from benchmarks.data import text_corpus
+from benchmarks.data import travel_log
+from compgraph.algorithms import inverted_index_graph
+from compgraph.algorithms import pmi_graph
+from compgraph.algorithms import word_count_graph
+from compgraph.algorithms import yandex_maps_graph
+from compgraph.graph import Graph
+from compgraph.misc import TRow
+from compgraph.profile import peak_rss
+from compgraph.profile import Profile
+
+TCase = tuple[Graph, dict[str, list[TRow]]]
+
+
+def word_count_case(size: int, args: argparse.Namespace) -> TCase:
+    docs = text_corpus(size, args.vocabulary, args.words_per_doc, args.exponent, args.seed)
+    return word_count_graph("docs"), {"docs": docs}
+
+
+def inverted_index_case(size: int, args: argparse.Namespace) -> TCase:
+    docs = text_corpus(size, args.vocabulary, args.words_per_doc, args.exponent, args.seed)
+    return inverted_index_graph("docs"), {"docs": docs}
+
+
+def pmi_case(size: int, args: argparse.Namespace) -> TCase:
+    docs = text_corpus(size, args.vocabulary, args.words_per_doc, args.exponent, args.seed)
+    return pmi_graph("docs"), {"docs": docs}
+
+
+def yandex_maps_case(size: int, args: argparse.Namespace) -> TCase:
+    travels = travel_log(size, args.edges, args.skew, seed=args.seed)
+    edges = road_edges(args.edges, args.seed)
+    return yandex_maps_graph("travels", "edges"), {"travels": travels, "edges": edges}
+
+
+CASES: dict[str, tp.Callable[[int, argparse.Namespace], TCase]] = {
+    "word_count": word_count_case,
+    "inverted_index": inverted_index_case,
+    "pmi": pmi_case,
+    "yandex_maps": yandex_maps_case,
+}
+
+
+def run_case(algorithm: str, size: int, args: argparse.Namespace) -> dict[str, tp.Any]:
+    """Best wall time of unprofiled runs, and statistics of operations of one more profiled run"""
+    graph, rows = CASES[algorithm](size, args)
+    kwargs = sources(rows)
+    input_rows = sum(len(source) for source in rows.values())
+
+    best = float("inf")
+    output_rows = 0
+    for _ in range(args.repeat):
+        start = time.perf_counter()
+        output_rows = sum(1 for _ in graph.run(**kwargs))
+        best = min(best, time.perf_counter() - start)
+
+    profile = Profile()
+    for _ in graph.run(profile=profile, **kwargs):
+        pass
+    return {
+        "algorithm": algorithm,
+        "size": size,
+        "input_rows": input_rows,
+        "output_rows": output_rows,
+        "wall_time": best,
+        "rows_per_second": input_rows / best,
+        "peak_rss": peak_rss(),
+        "operations": [
+            stats.to_dict()
+            | {"rows_per_second": stats.rows_out / stats.wall_time if stats.wall_time else None}
+            for stats in profile.operations
+        ],
+    }
+
+
+def run_suite(args: argparse.Namespace) -> dict[str, tp.Any]:
+    results = []
+    for algorithm in args.algorithms:
+        for size in args.sizes:
+            # spawned process starts with small RSS, forked one would inherit data of previous cases
+            with ProcessPoolExecutor(1, mp_context=multiprocessing.get_context("spawn")) as executor:
+                result = executor.submit(run_case, algorithm, size, args).result()
+            print(format_result(result), flush=True)
+            results.append(result)
+    return {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "parameters": {
+            name: value for name, value in vars(args).items() if name not in ("output", "baseline")
+        },
+        "results": results,
+    }
+
+
+def format_result(result: dict[str, tp.Any]) -> str:
+    lines = [
+        f"{result['algorithm']} size={result['size']}: {result['wall_time']:.3f}s,"
+        f" {result['rows_per_second']:,.0f} rows/s, peak RSS {result['peak_rss'] / 2**20:.1f}MiB"
+    ]
+    for stats in result["operations"]:
+        throughput = f"{stats['rows_per_second']:,.0f} rows/s" if stats["rows_per_second"] else "-"
+        lines.append(
+            f"    {'    ' * stats['depth']}{stats['operation']}  rows {stats['rows_out']}"
+            f"  wall {stats['wall_time']:.3f}s  {throughput}  peak +{stats['peak_memory'] / 2**20:.1f}MiB"
+        )
+    return "\n".join(lines)
+
+
+def compare(
+    results: dict[str, tp.Any], baseline: dict[str, tp.Any], threshold: float, memory_threshold: float
+) -> list[str]:
+    """Regressions of cases present in both results: wall time or peak RSS grown by more than threshold
+    :param threshold: allowed relative growth of wall time
+    :param memory_threshold: allowed relative growth of peak RSS
+    """
+    old_results = {(result["algorithm"], result["size"]): result for result in baseline["results"]}
+    regressions = []
+    for result in results["results"]:
+        old = old_results.get((result["algorithm"], result["size"]))
+        if old is None:
+            continue
+        name = f"{result['algorithm']} size={result['size']}"
+        if result["output_rows"] != old["output_rows"]:
+            regressions.append(f"{name}: {result['output_rows']} output rows instead of {old['output_rows']}")
+        if result["wall_time"] > old["wall_time"] * (1 + threshold):
+            regressions.append(
+                f"{name}: wall time {old['wall_time']:.3f}s -> {result['wall_time']:.3f}s"
+                f" x{result['wall_time'] / old['wall_time']:.2f}"
+            )
+        if result["peak_rss"] > old["peak_rss"] * (1 + memory_threshold):
+            regressions.append(
+                f"{name}: peak RSS {old['peak_rss'] / 2**20:.1f}MiB -> {result['peak_rss'] / 2**20:.1f}MiB"
+            )
+    return regressions
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--algorithms", nargs="+", choices=list(CASES), default=list(CASES))
+    parser.add_argument("--sizes", nargs="+", type=int, default=[1000, 4000])
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--vocabulary", type=int, default=20_000, help="distinct words of corpora")
+    parser.add_argument("--words-per-doc", type=int, default=50)
+    parser.add_argument("--exponent", type=float, default=1.1, help="Zipf exponent of word frequencies")
+    parser.add_argument("--edges", type=int, default=1000, help="number of road edges")
+    parser.add_argument("--skew", type=float, default=0.0, help="Zipf exponent of travels over edges")
+    parser.add_argument("--output", help="write results to JSON file")
+    parser.add_argument("--baseline", help="compare results with JSON file written by --output")
+    parser.add_argument("--threshold", type=float, default=0.25, help="allowed relative growth of wall time")
+    parser.add_argument("--memory-threshold", type=float, default=0.25, help="allowed relative growth of peak RSS")
+    args = parser.parse_args()
+
+    results = run_suite(args)
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump(results, file, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as file:
+            baseline = json.load(file)
+        regressions = compare(results, baseline, args.threshold, args.memory_threshold)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        if regressions:
+            sys.exit(1)
+        print("no regressions")
+
+
+if __name__ == "__main__":
+    main()
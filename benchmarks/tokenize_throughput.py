@@ -0,0 +1,70 @@
+"""
+Compare throughput of Tokenize with FilterPunctuation, LowerCase and Split applied one after another
+
+    python -m benchmarks.tokenize_throughput --docs 5000
+"""
+import argparse
+import random
+import string
+import time
+
+from compgraph.mapper import FilterPunctuation
+from compgraph.mapper import LowerCase
+from compgraph.mapper import Split
+from compgraph.mapper import Tokenize
+from compgraph.misc import TRow
+from compgraph.operation import FusedMap
+from compgraph.operation import Map
+from compgraph.operation import Operation
+
+
+def make_docs(count: int, seed: int = 0) -> list[TRow]:
+    rnd = random.Random(seed)
+    alphabet = string.ascii_letters + "äöüß"
+    words = ["".join(rnd.choices(alphabet, k=rnd.randint(1, 10))) for _ in range(5000)]
+    return [
+        {
+            "doc_id": i,
+            "text": " ".join(
+                rnd.choice(words) + rnd.choice(["", "", "", ",", ".", "!", "?!"])
+                for _ in range(rnd.randint(10, 300))
+            ),
+        }
+        for i in range(count)
+    ]
+
+
+def measure(operation: Operation, docs: list[TRow], repeat: int) -> tuple[float, list[TRow]]:
+    """Return best throughput in words per second and words of the last run"""
+    best = 0.0
+    result: list[TRow] = []
+    for _ in range(repeat):
+        rows = [dict(doc) for doc in docs]
+        start = time.perf_counter()
+        result = list(operation(rows))
+        best = max(best, len(result) / (time.perf_counter() - start))
+    return best, result
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--docs", type=int, default=5000)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    docs = make_docs(args.docs)
+    chain = FusedMap([FilterPunctuation("text"), LowerCase("text"), Split("text")])
+    chain_throughput, expected = measure(chain, docs, args.repeat)
+    print(f"FilterPunctuation+LowerCase+Split: {len(expected)} words, {chain_throughput:,.0f} words/s")
+
+    throughput, result = measure(Map(Tokenize("text")), docs, args.repeat)
+    assert result == expected, "Tokenize gives other words"
+    print(f"Tokenize: {len(result)} words, {throughput:,.0f} words/s, x{throughput / chain_throughput:.1f}")
+
+    throughput, result = measure(Map(Tokenize("text", batch=True)), docs, args.repeat)
+    words = sum(len(row["text"]) for row in result)
+    print(f"Tokenize batch=True: {words} words, {throughput * words / len(result):,.0f} words/s")
+
+
+if __name__ == "__main__":
+    main()
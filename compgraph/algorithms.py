@@ -1,18 +1,17 @@
 import json
 from copy import copy
 
+from compgraph.columnar_format import COLUMNAR_SUFFIX
 from compgraph.graph import Graph
 from compgraph.joiner import InnerJoiner
 from compgraph.mapper import CalcHaversine
 from compgraph.mapper import Divide
 from compgraph.mapper import Filter
-from compgraph.mapper import FilterPunctuation
-from compgraph.mapper import LowerCase
 from compgraph.mapper import NaturalLog
 from compgraph.mapper import ParseTime
 from compgraph.mapper import Product
 from compgraph.mapper import Project
-from compgraph.mapper import Split
+from compgraph.mapper import Tokenize
 from compgraph.misc import Columns
 from compgraph.misc import TRowsGenerator
 from compgraph.reducer import Count
@@ -22,11 +21,16 @@ from compgraph.reducer import TermFrequency
 from compgraph.reducer import TopN
 
 
-def json_line_parser(line: str) -> TRowsGenerator:
+def json_line_parser(line: str | bytes | memoryview) -> TRowsGenerator:
+    if not isinstance(line, str):
+        # json.loads would guess encoding of bytes and doesn't take memoryview, JSON lines are UTF-8
+        line = str(line, "utf-8")
     yield from json.loads(line)
 
 
 def init_graph(input_stream_name: str, from_file: bool = False) -> "Graph":
+    if from_file and input_stream_name.endswith(COLUMNAR_SUFFIX):
+        return Graph.graph_from_columnar(input_stream_name)
     if from_file:
         return Graph.graph_from_file(input_stream_name, json_line_parser)
     return Graph.graph_from_iter(input_stream_name)
@@ -37,16 +41,17 @@ def word_count_graph(
     text_column: str = "text",
     count_column: str = "count",
     from_file: bool = False,
+    workers: int | None = 1,
 ) -> Graph:
-    """Constructs graph which counts words in text_column of all rows passed"""
+    """Constructs graph which counts words in text_column of all rows passed
+    :param workers: number of processes to count words in
+    """
 
     return (
         init_graph(input_stream_name, from_file)
-        .map(FilterPunctuation(text_column))
-        .map(LowerCase(text_column))
-        .map(Split(text_column))
+        .map(Tokenize(text_column))
         .sort([text_column])
-        .reduce(Count(count_column), [text_column])
+        .reduce(Count(count_column), [text_column], workers=workers)
         .sort([count_column, text_column])
     )
 
@@ -63,9 +68,8 @@ def inverted_index_graph(
 
     split_word = (
         copy(graph)
-        .map(FilterPunctuation(text_column))
-        .map(LowerCase(text_column))
-        .map(Split(text_column))
+        .map(Tokenize(text_column))
+        .cache("disk")
     )
 
     count_docs = (
@@ -112,24 +116,26 @@ def pmi_graph(
     text_column: str = "text",
     result_column: str = "pmi",
     from_file: bool = False,
+    workers: int | None = 1,
 ) -> Graph:
-    """Constructs graph which gives for every document the top 10 words ranked by pointwise mutual information"""
+    """Constructs graph which gives for every document the top 10 words ranked by pointwise mutual information
+    :param workers: number of processes to rank words of documents in
+    """
 
     graph = init_graph(input_stream_name, from_file)
 
     graph = (
         copy(graph)
-        .map(FilterPunctuation(text_column))
-        .map(LowerCase(text_column))
-        .map(Split(text_column))
+        .map(Tokenize(text_column))
         .sort([doc_column, text_column])
+        .cache("disk")
     )
 
-    filtered1 = copy(graph).map(Filter(lambda row: len(row[text_column]) > 4))
+    filtered1 = copy(graph).map(Filter(lambda row: len(row[text_column]) > 4, [text_column]))
     filtered2 = (
         copy(graph)
         .reduce(Count(Columns.count), [doc_column, text_column])
-        .map(Filter(lambda row: row["count"] >= 2))
+        .map(Filter(lambda row: row["count"] >= 2, [Columns.count]))
     )
     filtered = copy(filtered1).join(
         InnerJoiner(), filtered2, [doc_column, text_column]
@@ -154,7 +160,7 @@ def pmi_graph(
         .map(NaturalLog(Columns.fraction, result_column))
         .map(Project([doc_column, text_column, result_column]))
         .sort([doc_column, result_column, text_column])
-        .reduce(TopN(result_column, 10), [doc_column])
+        .reduce(TopN(result_column, 10), [doc_column], workers=workers)
     )
     return result
 
@@ -172,8 +178,11 @@ def yandex_maps_graph(
     speed_result_column: str = "speed",
     time_from_file: bool = False,
     length_from_file: bool = False,
+    workers: int | None = 1,
 ) -> Graph:
-    """Constructs graph which measures average speed in km/h depending on the weekday and hour"""
+    """Constructs graph which measures average speed in km/h depending on the weekday and hour
+    :param workers: number of processes to measure speed in
+    """
     graph_time = init_graph(input_stream_name_time, time_from_file)
 
     time = graph_time.map(
@@ -182,18 +191,20 @@ def yandex_maps_graph(
             "%Y%m%dT%H%M%S.%f",
             weekday_result_column,
             hour_result_column,
+            Columns.enter_micros,
         )
-    ).sort([edge_id_column])
+    )
 
     graph_length = init_graph(input_stream_name_length, length_from_file)
 
     length = graph_length.map(
         CalcHaversine(start_coord_column, end_coord_column, "length")
-    ).sort([edge_id_column])
+    )
 
     graph = (
-        time.join(InnerJoiner(), length, [edge_id_column])
-        .sort([weekday_result_column, hour_result_column])
+        time.join(InnerJoiner(), length, [edge_id_column], strategy="hash")
+        # rows of a group are summed in order of edges, as after merge join of sides sorted by edge
+        .sort([weekday_result_column, hour_result_column, edge_id_column])
         .reduce(
             Speed(
                 "length",
@@ -201,8 +212,10 @@ def yandex_maps_graph(
                 leave_time_column,
                 "%Y%m%dT%H%M%S.%f",
                 speed_result_column,
+                Columns.enter_micros,
             ),
             [weekday_result_column, hour_result_column],
+            workers=workers,
         )
     )
 
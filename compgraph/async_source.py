@@ -0,0 +1,184 @@
+"""
+Asynchronous data sources. Graph.arun runs the graph in a thread of default executor, so operations
+never block the event loop. Rows of an async iterable are read by a task in event loop and passed
+to the graph thread in batches through a thread-safe queue: the graph takes batches without waiting
+for event loop, a source is read ahead by about buffer_size rows, and its reading waits while the graph is busy.
+"""
+import asyncio
+import queue
+import typing as tp
+
+from compgraph.misc import TRow
+from compgraph.misc import TRowsGenerator
+from compgraph.operation import Operation
+
+DEFAULT_BUFFER_ROWS = 4096
+BUFFER_BATCHES = 4
+
+TAsyncRows = tp.AsyncIterable[TRow]
+TAsyncSource = TAsyncRows | tp.Callable[[], TAsyncRows]
+
+
+class _End:
+    """Last item of channel, error of source if any"""
+
+    def __init__(self, error: BaseException | None = None) -> None:
+        self.error = error
+
+
+class _Channel:
+    """
+    Batches of rows from event loop to graph thread. Queue itself is not bounded, so that end
+    can be put at any moment; batches put and not yet taken are bounded by feeder.
+    Counters and `waiting` are written by one thread each, `batch`, `hungry` and `writable`
+    are used only in event loop
+    """
+
+    def __init__(self, buffer_size: int) -> None:
+        self.batch_rows = max(1, buffer_size // BUFFER_BATCHES)
+        self.max_batches = max(1, buffer_size // self.batch_rows - 1)
+        self.queue: queue.SimpleQueue[list[TRow] | _End] = queue.SimpleQueue()
+        self.batch: list[TRow] = []
+        self.put = 0
+        self.taken = 0
+        self.waiting = False
+        self.hungry = False
+        self.writable = asyncio.Event()
+
+    async def send(self) -> None:
+        """Put batch, waits while graph has enough batches not taken"""
+        while self.put - self.taken >= self.max_batches:
+            self.writable.clear()
+            self.waiting = True
+            # graph may take a batch before it sees the flag
+            if self.put - self.taken < self.max_batches:
+                break
+            await self.writable.wait()
+        self.waiting = False
+        self.flush()
+
+    def flush(self) -> None:
+        """Put batch as is"""
+        if self.batch:
+            self.hungry = False
+            self.queue.put(self.batch)
+            self.put += 1
+            self.batch = []
+
+    def feed(self) -> None:
+        """Called in event loop when graph has nothing to take: rows of slow source may be waiting
+        in a batch which is not full yet, or the next row must be put as soon as it is read
+        """
+        if self.batch:
+            self.flush()
+        else:
+            self.hungry = True
+
+    def take(self, loop: asyncio.AbstractEventLoop) -> list[TRow] | _End:
+        """Next batch, called from graph thread"""
+        try:
+            item = self.queue.get_nowait()
+        except queue.Empty:
+            loop.call_soon_threadsafe(self.feed)
+            item = self.queue.get()
+        if isinstance(item, list):
+            self.taken += 1
+            if self.waiting:
+                loop.call_soon_threadsafe(self.writable.set)
+        return item
+
+
+class AsyncSource:
+    """
+    Async source of rows bound to event loop, read by a graph running in another thread.
+    Source is async iterable or function returning async iterable; only a function may be read
+    more than once, as when graph uses the same source in several branches
+    """
+
+    def __init__(self, name: str, source: TAsyncSource, loop: asyncio.AbstractEventLoop) -> None:
+        self._name = name
+        self._source = source
+        self._loop = loop
+        self._reads = 0
+        self._feeders: dict["asyncio.Task[None]", _Channel] = {}
+        self._closed = False
+
+    def rows(self, buffer_size: int) -> TRowsGenerator:
+        """Rows of source, called from graph thread
+        :param buffer_size: number of rows read ahead of graph
+        """
+        if self._reads and not callable(self._source):
+            raise ValueError(
+                f"async source {self._name!r} is read more than once, pass a function returning async iterable"
+            )
+        self._reads += 1
+        channel = _Channel(buffer_size)
+        self._loop.call_soon_threadsafe(self._start, channel)
+        try:
+            while isinstance(batch := channel.take(self._loop), list):
+                yield from batch
+            if batch.error is not None:
+                raise batch.error
+        finally:
+            # loop of cancelled arun may be over before graph thread stops
+            if not self._loop.is_closed():
+                self._loop.call_soon_threadsafe(self._stop, channel)
+
+    def close(self) -> None:
+        """Stop reading, called from event loop; graph thread gets CancelledError on its next read"""
+        self._closed = True
+        for task, channel in self._feeders.items():
+            task.cancel()
+            channel.queue.put(_End(asyncio.CancelledError()))
+
+    def _start(self, channel: _Channel) -> None:
+        if self._closed:
+            channel.queue.put(_End(asyncio.CancelledError()))
+            return
+        rows = self._source() if callable(self._source) else self._source
+        task = asyncio.create_task(self._produce(rows, channel))
+        self._feeders[task] = channel
+        task.add_done_callback(self._feeders.pop)
+
+    def _stop(self, channel: _Channel) -> None:
+        for task, task_channel in self._feeders.items():
+            if task_channel is channel:
+                task.cancel()
+
+    @staticmethod
+    async def _produce(rows: TAsyncRows, channel: _Channel) -> None:
+        # rows are appended without awaiting anything but source, until batch is full or graph waits for rows
+        error = None
+        try:
+            async for row in rows:
+                channel.batch.append(row)
+                if channel.hungry:
+                    channel.flush()
+                elif len(channel.batch) >= channel.batch_rows:
+                    await channel.send()
+        except Exception as exception:
+            error = exception
+        channel.flush()
+        channel.queue.put(_End(error))
+
+
+class ReadAsyncIter(Operation):
+    """Read rows of async source passed to Graph.arun"""
+
+    def __init__(self, name: str, buffer_size: int = DEFAULT_BUFFER_ROWS) -> None:
+        """
+        :param name: name of kwarg of Graph.arun to use as data source
+        :param buffer_size: number of rows read ahead of graph
+        """
+        self._name = name
+        self._buffer_size = buffer_size
+
+    @property
+    def name(self) -> str:
+        return self._name
+
+    def __call__(self, *args: tp.Any, **kwargs: tp.Any) -> TRowsGenerator:
+        source = kwargs[self._name]
+        if not isinstance(source, AsyncSource):
+            raise TypeError(f"source {self._name!r} is async, run graph with Graph.arun")
+        yield from source.rows(self._buffer_size)
@@ -0,0 +1,57 @@
+import typing as tp
+
+from compgraph.context import RunContext
+from compgraph.misc import StringEnum
+from compgraph.misc import TRowsGenerator
+from compgraph.misc import TRowsIterable
+from compgraph.operation import Operation
+from compgraph.spill import SpillFile
+
+
+class CacheLevel(StringEnum):
+    memory = "memory"
+    disk = "disk"
+
+
+class Cache(Operation):
+    """
+    Materialize rows once per run and replay them to every consumer.
+    All copies of a graph share the same Cache instance, so the first branch that reads it
+    computes upstream operations, and the others only replay stored rows.
+    """
+
+    def __init__(self, level: CacheLevel = CacheLevel.memory, tmp_dir: str | None = None) -> None:
+        """
+        :param level: keep rows in memory or in spill file on disk
+        :param tmp_dir: directory for spill file, system temp dir by default
+        """
+        self._level = CacheLevel(level)
+        self._tmp_dir = tmp_dir
+
+    def output_order(self, input_order: tuple[str, ...]) -> tuple[str, ...]:
+        return input_order
+
+    def __call__(
+        self, rows: TRowsIterable, *args: tp.Any, **kwargs: tp.Any
+    ) -> TRowsGenerator:
+        context: RunContext = args[0]
+        stored = context.get(self)
+        if stored is None:
+            stored = self._materialize(rows, context)
+            context.set(self, stored)
+
+        if self._level == CacheLevel.memory:
+            # consumers are free to modify rows in place
+            for row in stored:
+                yield row.copy()
+        else:
+            yield from stored
+
+    def _materialize(self, rows: TRowsIterable, context: RunContext) -> tp.Iterable[tp.Any]:
+        if self._level == CacheLevel.memory:
+            return list(rows)
+        spill = SpillFile(self._tmp_dir)
+        context.on_close(spill.remove)
+        spill.write(rows)
+        spill.close()
+        return spill
@@ -0,0 +1,248 @@
+"""
+Columnar execution of mappers. Rows are collected in record batches, columns are turned into NumPy
+arrays only when a mapper reads them. Consecutive mappers supporting batches exchange batches,
+rows get results back only at the end of the chain.
+NumPy is an optional dependency, it is needed only when batches are used.
+"""
+import abc
+import typing as tp
+from itertools import compress
+from itertools import islice
+
+from compgraph.misc import TRow
+from compgraph.misc import TRowsGenerator
+from compgraph.misc import TRowsIterable
+from compgraph.operation import Mapper
+from compgraph.operation import Operation
+from compgraph.operation import RowMapper
+from compgraph.record import Record
+from compgraph.record import Schema
+from compgraph.timestamp import TimeParser
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover
+    np = None
+
+DEFAULT_BATCH_SIZE = 4096
+FAST_TIME_FORMAT = "%Y%m%dT%H%M%S.%f"
+MICROSECONDS_IN_DAY = 86_400_000_000
+_DAYS_IN_MONTH = [31, 28, 31, 30, 31, 30, 31, 31, 30, 31, 30, 31]
+
+
+def require_numpy() -> None:
+    if np is None:
+        raise ImportError("batch execution requires numpy, install compgraph[numpy]")
+
+
+def _parse_fixed(strings: tp.Any) -> tuple[tp.Any, tp.Any]:
+    """
+    Parse strings of exactly "YYYYmmddTHHMMSS" or "YYYYmmddTHHMMSS.f" with 1 to 6 digits of fraction,
+    which is what FAST_TIME_FORMAT with its fallback accepts for fields of full width. It is array
+    counterpart of layouts of TimeParser for these formats, strings it rejects are left to TimeParser
+    :return: microseconds since epoch and mask of parsed strings
+    """
+    n = len(strings)
+    width = strings.dtype.itemsize // 4
+    if width < 15:
+        return np.zeros(n, dtype=np.int64), np.zeros(n, dtype=bool)
+    codes = strings.view(np.uint32).reshape(n, width).astype(np.int64)
+    if width < 22:
+        codes = np.pad(codes, ((0, 0), (0, 22 - width)))
+    lengths = np.char.str_len(strings)
+    digits = codes - ord("0")
+    is_digit = (digits >= 0) & (digits <= 9)
+
+    fraction_length = lengths - 16
+    with_fraction = (codes[:, 15] == ord(".")) & (fraction_length >= 1) & (fraction_length <= 6)
+    fraction_used = np.arange(6) < fraction_length[:, None]
+    ok = (codes[:, 8] == ord("T")) & is_digit[:, :8].all(axis=1) & is_digit[:, 9:15].all(axis=1)
+    ok &= (lengths == 15) | (with_fraction & (is_digit[:, 16:22] | ~fraction_used).all(axis=1))
+
+    digits = np.where(is_digit, digits, 0)
+    year = digits[:, 0] * 1000 + digits[:, 1] * 100 + digits[:, 2] * 10 + digits[:, 3]
+    month = digits[:, 4] * 10 + digits[:, 5]
+    day = digits[:, 6] * 10 + digits[:, 7]
+    hour = digits[:, 9] * 10 + digits[:, 10]
+    minute = digits[:, 11] * 10 + digits[:, 12]
+    second = digits[:, 13] * 10 + digits[:, 14]
+    fraction = (np.where(fraction_used, digits[:, 16:22], 0) * 10 ** np.arange(5, -1, -1)).sum(axis=1)
+
+    leap = (year % 4 == 0) & ((year % 100 != 0) | (year % 400 == 0))
+    days_in_month = np.asarray(_DAYS_IN_MONTH)[np.clip(month, 1, 12) - 1] + ((month == 2) & leap)
+    ok &= (year >= 1) & (month >= 1) & (month <= 12) & (day >= 1) & (day <= days_in_month)
+    ok &= (hour < 24) & (minute < 60) & (second < 60)
+
+    # days from civil date, March-based years put leap day at the end of year
+    year = year - (month <= 2)
+    era = year // 400
+    year_of_era = year - era * 400
+    day_of_year = (153 * np.where(month > 2, month - 3, month + 9) + 2) // 5 + day - 1
+    day_of_era = year_of_era * 365 + year_of_era // 4 - year_of_era // 100 + day_of_year
+    days = era * 146097 + day_of_era - 719468
+
+    seconds = ((days * 24 + hour) * 60 + minute) * 60 + second
+    return seconds * 1_000_000 + fraction, ok
+
+
+def parse_times(values: tp.Sequence[tp.Any], time_format: str, parser: TimeParser | None = None) -> tp.Any:
+    """
+    Parse times as get_valid_date does into array of microseconds since epoch.
+    Strings of FAST_TIME_FORMAT (or of its fallback) with fields of full width are parsed
+    with array operations, others are parsed one by one with TimeParser.
+    :param values: times to parse
+    :param time_format: format of times
+    :param parser: parser of time_format to parse times one by one, its cache is kept between calls;
+        a new parser without cache by default
+    """
+    require_numpy()
+    strings = np.asarray(values)
+    if time_format == FAST_TIME_FORMAT and strings.dtype.kind == "U" and strings.ndim == 1:
+        micros, parsed = _parse_fixed(strings)
+    else:
+        micros, parsed = np.zeros(len(values), dtype=np.int64), np.zeros(len(values), dtype=bool)
+    left = np.flatnonzero(~parsed).tolist()
+    if left:
+        parse = (parser or TimeParser(time_format, cache_size=0)).micros
+        for index in left:
+            micros[index] = parse(values[index])
+    return micros
+
+
+class RecordBatch:
+    """
+    Rows stored by columns. Indexing batch by column name gives NumPy array of column values,
+    values are taken from rows only for columns which are read. Columns written to batch are put back
+    into the same row dicts, so columns which are not touched keep their original values.
+    """
+
+    def __init__(self, rows: list[TRow]) -> None:
+        """
+        :param rows: rows of batch, they are changed in place
+        """
+        self._rows: list[TRow] | None = rows
+        self._columns: dict[str, tp.Any] = {}
+        self._written: list[str] = []
+        self.length = len(rows)
+        # rows built by select are records too
+        self._compact = bool(rows) and isinstance(rows[0], Record)
+
+    def _values(self, name: str) -> tp.Any:
+        values = self._columns.get(name)
+        if values is None:
+            if self._rows is None:
+                raise KeyError(name)
+            values = self._columns[name] = [row[name] for row in self._rows]
+        return values
+
+    def __getitem__(self, name: str) -> tp.Any:
+        values = self._values(name)
+        if not isinstance(values, np.ndarray):
+            values = self._columns[name] = np.asarray(values)
+        return values
+
+    def __setitem__(self, name: str, values: tp.Any) -> None:
+        if np.ndim(values) == 0:
+            values = np.full(self.length, values)
+        self._columns[name] = values
+        if self._rows is not None and name not in self._written:
+            self._written.append(name)
+
+    def filter(self, mask: tp.Any) -> "RecordBatch":
+        """Leave rows for which mask is true"""
+        mask = np.asarray(mask, dtype=bool)
+        self._columns = {
+            name: values[mask] if isinstance(values, np.ndarray) else list(compress(values, mask))
+            for name, values in self._columns.items()
+        }
+        if self._rows is not None:
+            self._rows = list(compress(self._rows, mask))
+        self.length = int(mask.sum())
+        return self
+
+    def select(self, names: tp.Sequence[str]) -> "RecordBatch":
+        """Leave only mentioned columns in the same order, rows are built anew"""
+        self._columns = {name: self._values(name) for name in names}
+        self._rows = None
+        self._written = []
+        return self
+
+    def to_rows(self) -> list[TRow]:
+        """Rows of batch, values of arrays are turned back into Python objects"""
+        if self._rows is not None:
+            for name in self._written:
+                values = self._columns[name]
+                if isinstance(values, np.ndarray):
+                    values = values.tolist()
+                for row, value in zip(self._rows, values):
+                    row[name] = value
+            return self._rows
+
+        names = list(self._columns)
+        if not names:
+            return [{} for _ in range(self.length)]
+        columns = [
+            values.tolist() if isinstance(values, np.ndarray) else values
+            for values in self._columns.values()
+        ]
+        if self._compact:
+            schema = Schema.of(names)
+            return [tp.cast(TRow, Record(schema, list(row_values))) for row_values in zip(*columns)]
+        return [dict(zip(names, row_values)) for row_values in zip(*columns)]
+
+
+class BatchMapper(RowMapper):
+    """Base class for row mappers which may be applied to record batches at once"""
+
+    @abc.abstractmethod
+    def apply_batch(self, batch: RecordBatch) -> RecordBatch:
+        """
+        :param batch: record batch
+        :return: resulting batch, passed batch may be changed in place
+        """
+        pass
+
+    def supports_batches(self) -> bool:
+        """Whether apply_batch may be used"""
+        return True
+
+
+def supports_batches(mapper: Mapper) -> bool:
+    return isinstance(mapper, BatchMapper) and mapper.supports_batches()
+
+
+class BatchMap(Operation):
+    """
+    Apply a chain of batch mappers to record batches of at most batch_size rows.
+    NumPy floating point functions may differ from math ones in the last digit.
+    """
+
+    def __init__(self, mappers: tp.Sequence[BatchMapper], batch_size: int = DEFAULT_BATCH_SIZE) -> None:
+        """
+        :param mappers: mappers supporting batches
+        :param batch_size: maximal number of rows in batch
+        """
+        require_numpy()
+        self._mappers = tuple(mappers)
+        self._batch_size = batch_size
+
+    @property
+    def mappers(self) -> tuple[BatchMapper, ...]:
+        return self._mappers
+
+    def output_order(self, input_order: tuple[str, ...]) -> tuple[str, ...]:
+        for mapper in self._mappers:
+            input_order = mapper.output_order(input_order)
+        return input_order
+
+    def __call__(
+        self, rows: TRowsIterable, *args: tp.Any, **kwargs: tp.Any
+    ) -> TRowsGenerator:
+        rows = iter(rows)
+        while chunk := list(islice(rows, self._batch_size)):
+            batch = RecordBatch(chunk)
+            # raise on division by zero and log of negative numbers as math does
+            with np.errstate(divide="raise", invalid="raise"):
+                for mapper in self._mappers:
+                    batch = mapper.apply_batch(batch)
+            yield from batch.to_rows()
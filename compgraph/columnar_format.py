@@ -0,0 +1,235 @@
+"""
+Columnar file format for rows.
+
+File consists of row groups followed by footer:
+    MAGIC, column chunks of row group 1, column chunks of row group 2, ..., footer, footer size, MAGIC
+Every column chunk is encoded by the type of its values:
+    * int64 and float64 - typed arrays
+    * bool - one byte per value
+    * dict - strings encoded as dictionary of distinct strings and array of indices
+    * pickle - list of values of any other or mixed types, missing values included
+Footer keeps names of columns and, for every row group, number of rows and offset, size, encoding
+and min/max statistics of every column chunk. Reader decodes only requested columns and skips
+row groups whose statistics don't intersect requested ranges of values.
+"""
+import math
+import pickle
+import struct
+import typing as tp
+from array import array
+
+from compgraph.misc import TRow
+from compgraph.misc import TRowsGenerator
+from compgraph.misc import TRowsIterable
+from compgraph.operation import Operation
+
+MAGIC = b"CGCOL1\n"
+COLUMNAR_SUFFIX = ".cgc"
+DEFAULT_ROW_GROUP_SIZE = 2**16
+
+_SIZE = struct.Struct("<Q")
+_INDEX_TYPE = "I"
+_INT64_MIN = -(2**63)
+_INT64_MAX = 2**63 - 1
+
+TRange = tuple[tp.Any, tp.Any]
+
+
+class _Missing:
+    """Marks column absent in row"""
+
+    def __reduce__(self) -> str:
+        return "MISSING"
+
+
+MISSING = _Missing()
+
+
+def _encode(values: list[tp.Any]) -> tuple[str, bytes, TRange | None]:
+    """Encode column chunk
+    :return: encoding, encoded bytes and (min, max) statistics or None
+    """
+    types = {type(value) for value in values}
+    if types == {int} and _INT64_MIN <= min(values) and max(values) <= _INT64_MAX:
+        return "int64", array("q", values).tobytes(), (min(values), max(values))
+    if types == {float}:
+        stats = None if any(math.isnan(value) for value in values) else (min(values), max(values))
+        return "float64", array("d", values).tobytes(), stats
+    if types == {bool}:
+        return "bool", bytes(values), (min(values), max(values))
+    if types == {str}:
+        dictionary: dict[str, int] = {}
+        indices = array(_INDEX_TYPE, [dictionary.setdefault(value, len(dictionary)) for value in values])
+        header = pickle.dumps(list(dictionary), protocol=pickle.HIGHEST_PROTOCOL)
+        return "dict", _SIZE.pack(len(header)) + header + indices.tobytes(), (min(dictionary), max(dictionary))
+    return "pickle", pickle.dumps(values, protocol=pickle.HIGHEST_PROTOCOL), None
+
+
+def _decode(encoding: str, data: bytes) -> list[tp.Any]:
+    if encoding == "int64":
+        return array("q", data).tolist()
+    if encoding == "float64":
+        return array("d", data).tolist()
+    if encoding == "bool":
+        return [bool(value) for value in data]
+    if encoding == "dict":
+        (size,) = _SIZE.unpack_from(data)
+        dictionary = pickle.loads(data[_SIZE.size: _SIZE.size + size])
+        indices = array(_INDEX_TYPE, data[_SIZE.size + size:])
+        return [dictionary[index] for index in indices]
+    return tp.cast(list[tp.Any], pickle.loads(data))
+
+
+def write_columnar(
+    file: tp.BinaryIO, rows: TRowsIterable, row_group_size: int = DEFAULT_ROW_GROUP_SIZE
+) -> int:
+    """Write rows to file opened for binary writing
+    :param row_group_size: number of rows in row group
+    :return: number of rows written
+    """
+    names: dict[str, None] = {}
+    row_groups: list[dict[str, tp.Any]] = []
+    file.write(MAGIC)
+    offset = len(MAGIC)
+    count = 0
+    group: list[TRow] = []
+
+    def flush() -> None:
+        nonlocal offset
+        for row in group:
+            for name in row:
+                if name not in names:
+                    names[name] = None
+        chunks = {}
+        for name in names:
+            values = [row.get(name, MISSING) for row in group]
+            if all(value is MISSING for value in values):
+                continue
+            encoding, data, stats = _encode(values)
+            file.write(data)
+            chunks[name] = {"offset": offset, "size": len(data), "encoding": encoding, "stats": stats}
+            offset += len(data)
+        row_groups.append({"rows": len(group), "columns": chunks})
+        group.clear()
+
+    for row in rows:
+        group.append(row)
+        count += 1
+        if len(group) >= row_group_size:
+            flush()
+    if group:
+        flush()
+
+    footer = pickle.dumps({"columns": list(names), "row_groups": row_groups}, protocol=pickle.HIGHEST_PROTOCOL)
+    file.write(footer)
+    file.write(_SIZE.pack(len(footer)))
+    file.write(MAGIC)
+    return count
+
+
+def read_footer(file: tp.BinaryIO) -> dict[str, tp.Any]:
+    """Read metadata of columnar file opened for binary reading"""
+    tail = len(MAGIC) + _SIZE.size
+    file.seek(-tail, 2)
+    data = file.read(tail)
+    if data[_SIZE.size:] != MAGIC:
+        raise ValueError(f"{getattr(file, 'name', 'file')} is not a columnar file")
+    (size,) = _SIZE.unpack_from(data)
+    file.seek(-tail - size, 2)
+    return tp.cast(dict[str, tp.Any], pickle.loads(file.read(size)))
+
+
+def _intersects(stats: TRange | None, value_range: TRange) -> bool:
+    if stats is None:
+        return True
+    low, high = value_range
+    try:
+        return (low is None or stats[1] >= low) and (high is None or stats[0] <= high)
+    except TypeError:  # values of other type than bounds
+        return True
+
+
+def _in_range(value: tp.Any, value_range: TRange) -> bool:
+    low, high = value_range
+    return (low is None or value >= low) and (high is None or value <= high)
+
+
+class ReadColumnar(Operation):
+    """
+    Read rows from columnar file. Only requested columns are decoded, row groups whose statistics
+    show no values in requested ranges are skipped without decoding.
+    """
+
+    def __init__(
+        self,
+        filename: str,
+        columns: tp.Sequence[str] | None = None,
+        ranges: dict[str, TRange] | None = None,
+    ) -> None:
+        """
+        :param filename: filename to read from
+        :param columns: columns to read, all by default; rows keep order of columns in file
+        :param ranges: column name to (low, high) inclusive bounds of values, None bound is open;
+            only rows with values of all such columns in bounds are read
+        """
+        self._filename = filename
+        self._columns = None if columns is None else tuple(columns)
+        self._ranges = dict(ranges or {})
+
+    @property
+    def filename(self) -> str:
+        return self._filename
+
+    @property
+    def columns(self) -> tuple[str, ...] | None:
+        return self._columns
+
+    def with_columns(self, columns: tp.Collection[str]) -> "ReadColumnar":
+        """Same source reading only mentioned columns of those read now"""
+        if self._columns is not None:
+            columns = set(columns) & set(self._columns)
+        return ReadColumnar(self._filename, list(columns), self._ranges)
+
+    def __call__(self, *args: tp.Any, **kwargs: tp.Any) -> TRowsGenerator:
+        with open(self._filename, "rb") as file:
+            footer = read_footer(file)
+            names = footer["columns"]
+            if self._columns is not None:
+                names = [name for name in names if name in self._columns]
+            for group in footer["row_groups"]:
+                chunks = group["columns"]
+                if not all(
+                    name in chunks and _intersects(chunks[name]["stats"], value_range)
+                    for name, value_range in self._ranges.items()
+                ):
+                    continue
+                yield from self._read_group(file, group, names)
+
+    def _read_group(self, file: tp.BinaryIO, group: dict[str, tp.Any], names: tp.Sequence[str]) -> TRowsGenerator:
+        chunks = group["columns"]
+        columns: dict[str, list[tp.Any]] = {}
+        for name in set(names) | set(self._ranges):
+            if name in chunks:
+                chunk = chunks[name]
+                file.seek(chunk["offset"])
+                columns[name] = _decode(chunk["encoding"], file.read(chunk["size"]))
+
+        mask: list[bool] | None = None
+        for name, value_range in self._ranges.items():
+            values = columns[name]
+            passed = [value is not MISSING and _in_range(value, value_range) for value in values]
+            mask = passed if mask is None else [a and b for a, b in zip(mask, passed)]
+
+        present = [name for name in names if name in columns]
+        rows: tp.Iterable[tuple[tp.Any, ...]] = zip(*(columns[name] for name in present))
+        if not present:
+            rows = [()] * group["rows"]
+        if mask is not None:
+            rows = (row_values for row_values, passed in zip(rows, mask) if passed)
+        # only pickled columns may have missing values
+        if any(chunks[name]["encoding"] == "pickle" for name in present):
+            for row_values in rows:
+                yield {name: value for name, value in zip(present, row_values) if value is not MISSING}
+        else:
+            for row_values in rows:
+                yield dict(zip(present, row_values))
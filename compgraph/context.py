@@ -0,0 +1,34 @@
+import typing as tp
+
+if tp.TYPE_CHECKING:
+    from compgraph.profile import Profile
+
+
+class RunContext:
+    """State shared by all operations of a single Graph.run call"""
+
+    def __init__(self, compact: bool = False, profile: tp.Optional["Profile"] = None) -> None:
+        """
+        :param compact: turn rows of data sources into records
+        :param profile: collect statistics of operations into profile
+        """
+        self.compact = compact
+        self.profile = profile
+        self._state: dict[int, tp.Any] = {}
+        self._cleanups: list[tp.Callable[[], None]] = []
+
+    def get(self, owner: object) -> tp.Any:
+        """Return state stored for owner or None"""
+        return self._state.get(id(owner))
+
+    def set(self, owner: object, state: tp.Any) -> None:
+        self._state[id(owner)] = state
+
+    def on_close(self, callback: tp.Callable[[], None]) -> None:
+        """Register callback to release resources when run is over"""
+        self._cleanups.append(callback)
+
+    def close(self) -> None:
+        self._state.clear()
+        while self._cleanups:
+            self._cleanups.pop()()
@@ -1,3 +1,6 @@
+import heapq
+import shutil
+import tempfile
 import typing as tp
 from multiprocessing import connection
 from multiprocessing import Pipe
@@ -5,19 +8,70 @@ from multiprocessing import Process
 from operator import itemgetter
 
 from . import operations as ops
+from .spill import SpillFile
+from .transport import BatchSender
+from .transport import DEFAULT_BATCH_SIZE
+from .transport import recv_batch
+from .transport import recv_rows
 
+DEFAULT_MEMORY_LIMIT = 32 * 2**20
 
-def do_sort(endpoint: connection.Connection, keys: tuple[str, ...]) -> None:
-    rows = []
-    while True:
-        row = endpoint.recv()
-        if row is None:
-            break
-        rows.append(row)
-    rows.sort(key=itemgetter(*keys))
-    for row in rows:
-        endpoint.send(row)
-    endpoint.send(None)
+
+def sort_received(
+    endpoint: connection.Connection,
+    keys: tuple[str, ...],
+    memory_limit: int,
+    tmp_dir: str,
+) -> tp.Iterable[ops.TRow]:
+    """Sort rows received from endpoint until the end of stream mark with sort_batches"""
+    return sort_batches(iter(lambda: recv_batch(endpoint), None), keys, memory_limit, tmp_dir)
+
+
+def sort_batches(
+    batches: tp.Iterable[tuple[list[ops.TRow], int]],
+    keys: tuple[str, ...],
+    memory_limit: int,
+    tmp_dir: str,
+) -> tp.Iterable[ops.TRow]:
+    """
+    Sort rows of batches given along with their serialized size in bytes.
+    Rows are collected in runs of at most memory_limit serialized bytes, every full run is sorted
+    and spilled to tmp_dir, and the result is k-way merge of sorted runs.
+    """
+    key = itemgetter(*keys)
+    runs: list[SpillFile] = []
+    rows: list[ops.TRow] = []
+    run_size = 0
+    for batch_rows, batch_bytes in batches:
+        rows.extend(batch_rows)
+        run_size += batch_bytes
+        if run_size >= memory_limit:
+            rows.sort(key=key)
+            run = SpillFile(tmp_dir)
+            run.write(rows)
+            run.close()
+            runs.append(run)
+            rows = []
+            run_size = 0
+    rows.sort(key=key)
+
+    if runs:
+        # heapq.merge keeps equal rows in order of iterables, so the sort stays stable
+        return heapq.merge(*runs, rows, key=key)
+    return rows
+
+
+def do_sort(
+    endpoint: connection.Connection,
+    keys: tuple[str, ...],
+    memory_limit: int,
+    tmp_dir: str,
+    batch_size: int = DEFAULT_BATCH_SIZE,
+) -> None:
+    """Sort rows received from endpoint with sort_received and send them back"""
+    sender = BatchSender(endpoint, batch_size)
+    sender.send_all(sort_received(endpoint, keys, memory_limit, tmp_dir))
+    sender.close()
 
 
 class ExternalSort(ops.Operation):
@@ -25,28 +79,57 @@ class ExternalSort(ops.Operation):
     In order to not account materialization during sorting in main process memory consumption, we delegate
     sorting to a separate process.
     This class illustrates cross-process streaming.
+    Sorting process keeps in memory at most memory_limit bytes of serialized rows, bigger inputs
+    are sorted by runs spilled to temporary files and merged back.
+    Rows travel between processes in pickled batches of at most batch_size rows.
     """
 
-    def __init__(self, keys: tp.Sequence[str]):
+    def __init__(
+        self,
+        keys: tp.Sequence[str],
+        memory_limit: int = DEFAULT_MEMORY_LIMIT,
+        tmp_dir: str | None = None,
+        batch_size: int = DEFAULT_BATCH_SIZE,
+    ):
+        """
+        :param keys: sorting keys
+        :param memory_limit: approximate budget in bytes of serialized rows held by sorting process
+        :param tmp_dir: directory for sorted runs, system temp dir by default
+        :param batch_size: maximal number of rows sent between processes in one message
+        """
         self.keys = tuple(keys)
+        self.memory_limit = memory_limit
+        self.tmp_dir = tmp_dir
+        self.batch_size = batch_size
+
+    def output_order(self, input_order: tuple[str, ...]) -> tuple[str, ...]:
+        return self.keys
 
     def __call__(
         self, rows: ops.TRowsIterable, *args: tp.Any, **kwargs: tp.Any
     ) -> ops.TRowsGenerator:
+        run_dir = tempfile.mkdtemp(prefix="compgraph-sort-", dir=self.tmp_dir)
         local_endpoint, remote_endpoint = Pipe()
-        process = Process(target=do_sort, args=(remote_endpoint, self.keys))
-        process.start()
-        row_count_before = 0
-        for row in rows:
-            local_endpoint.send(row)
-            row_count_before += 1
-        local_endpoint.send(None)
-        row_count_after = 0
-        while True:
-            local_endpoint_row = local_endpoint.recv()
-            if local_endpoint_row is None:
-                break
-            yield local_endpoint_row
-            row_count_after += 1
-        assert row_count_before == row_count_after
-        process.join()
+        process = Process(
+            target=do_sort,
+            args=(remote_endpoint, self.keys, self.memory_limit, run_dir, self.batch_size),
+        )
+        try:
+            process.start()
+            remote_endpoint.close()
+            sender = BatchSender(local_endpoint, self.batch_size)
+            sender.send_all(rows)
+            sender.close()
+            row_count_before = sender.rows
+            row_count_after = 0
+            for local_endpoint_row in recv_rows(local_endpoint):
+                yield local_endpoint_row
+                row_count_after += 1
+            assert row_count_before == row_count_after
+            process.join()
+        finally:
+            local_endpoint.close()
+            if process.is_alive():
+                process.terminate()
+                process.join()
+            shutil.rmtree(run_dir, ignore_errors=True)
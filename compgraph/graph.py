@@ -1,15 +1,51 @@
+import asyncio
+import threading
 import typing as tp
 from copy import copy
 
 from compgraph.joiner import Join
 from compgraph.joiner import Joiner
+from compgraph.operation import CombinableReducer
 from compgraph.operation import Map
 from compgraph.operation import Mapper
 from compgraph.operation import Reduce
 from compgraph.operation import Reducer
+from .async_source import AsyncSource
+from .async_source import DEFAULT_BUFFER_ROWS
+from .async_source import ReadAsyncIter
+from .async_source import TAsyncSource
+from .cache import Cache
+from .cache import CacheLevel
+from .columnar_format import ReadColumnar
+from .columnar_format import TRange
+from .context import RunContext
+from .external_sort import DEFAULT_MEMORY_LIMIT
 from .external_sort import ExternalSort
+from .hash_aggregate import HashReduce
+from .hash_aggregate import ReduceStrategy
+from .hash_join import HashJoin
+from .hash_join import JoinStrategy
+from .incremental import incremental_graph
+from .incremental import StateStore
+from .misc import TRow
 from .misc import TRowsGenerator
 from .operation import Operation
+from .optimizer import explain
+from .optimizer import optimize
+from .parallel import DEFAULT_CHUNK_SIZE
+from .parallel import ParallelMap
+from .parallel import ParallelRead
+from .parallel import ParallelReduce
+from .pipeline import Pipeline
+from .pipeline import Pipelined
+from .pipeline import pipeline_graph
+from .pipeline import start_processes
+from .profile import Profile
+from .record import compact_rows
+from .record import to_dicts
+from .sink import DEFAULT_BUFFER_SIZE
+from .sink import SinkFormat
+from .sink import write_rows
 from .operation import Read
 from .operation import ReadIterFactory
 from .operation import TRowsIterable
@@ -19,11 +55,14 @@ def call_single_method(
     func: Operation,
     result: TRowsIterable,
     join_params_temp: list["Graph"],
+    context: RunContext,
     **kwargs: tp.Any,
 ) -> TRowsGenerator:
     if isinstance(func, Join):
-        return func(result, join_params_temp.pop().run(**kwargs))
+        return func(result, join_params_temp.pop()._run(context, **kwargs))
         # print("status")
+    if isinstance(func, (Cache, Pipelined)):
+        return func(result, context)
     return func(result)
 
 
@@ -33,6 +72,8 @@ class Graph:
     def __init__(self) -> None:
         self._operations: list[Operation] = list()
         self._join_params: list["Graph"] = list()
+        self.last_profile: Profile | None = None
+        self.last_pipeline: Pipeline | None = None
 
     def update_ops(
         self, *operations: Operation, join_params: tp.Optional["Graph"] = None
@@ -52,62 +93,334 @@ class Graph:
         return Graph().update_ops(copy(ReadIterFactory(name)))
 
     @staticmethod
-    def graph_from_file(filename: str, parser: tp.Callable[[str], TRowsGenerator]) -> "Graph":
+    def graph_from_async_iter(name: str, buffer_size: int = DEFAULT_BUFFER_ROWS) -> "Graph":
+        """Construct new graph which reads rows from async iterable passed to 'arun' method
+        as kwarg, or from function returning such iterable if graph reads the source more than once
+        Use ReadAsyncIter
+        :param name: name of kwarg to use as data source
+        :param buffer_size: number of rows read from source ahead of graph
+        """
+        return Graph().update_ops(ReadAsyncIter(name, buffer_size))
+
+    @staticmethod
+    def graph_from_file(
+        filename: str,
+        parser: tp.Callable[[tp.Any], TRowsGenerator],
+        workers: int | None = 1,
+        ordered: bool = True,
+        binary: bool = False,
+    ) -> "Graph":
         """Construct new graph extended with operation for reading rows from file
         Use Read
         :param filename: filename to read from
-        :param parser: parser from string to Row
+        :param parser: parser from line to rows, line is string or bytes-like object in binary mode
+        :param workers: number of processes to parse byte ranges of file in, None for number of CPUs;
+            with more than one worker parser must be picklable
+        :param ordered: keep order of rows when file is parsed in several processes
+        :param binary: pass lines to parser without decoding, lines keep their line endings as is;
+            file is memory-mapped and parser gets memoryview of line valid only until it returns,
+            in worker processes parser gets bytes
+        """
+        if workers != 1:
+            return Graph().update_ops(
+                ParallelRead(filename, parser, workers, ordered, binary=binary)
+            )
+        return Graph().update_ops(copy(Read(filename, parser, binary)))
+
+    @staticmethod
+    def graph_from_columnar(
+        filename: str,
+        columns: tp.Sequence[str] | None = None,
+        ranges: dict[str, TRange] | None = None,
+    ) -> "Graph":
+        """Construct new graph reading rows from columnar file written by write_to_file with fmt="columnar"
+        Use ReadColumnar
+        :param filename: filename to read from
+        :param columns: columns to read, all by default; optimizer drops columns not used by graph
+        :param ranges: column name to (low, high) inclusive bounds of values, None bound is open;
+            only rows with values in bounds are read and row groups without such values are skipped
         """
-        return Graph().update_ops(copy(Read(filename, parser)))
+        return Graph().update_ops(ReadColumnar(filename, columns, ranges))
 
-    def map(self, mapper: Mapper) -> "Graph":
+    def map(
+        self,
+        mapper: Mapper,
+        workers: int | None = 1,
+        chunk_size: int = DEFAULT_CHUNK_SIZE,
+        ordered: bool = True,
+    ) -> "Graph":
         """Construct new graph extended with map operation with particular mapper
         :param mapper: mapper to use
+        :param workers: number of processes to apply mapper in, None for number of CPUs;
+            with more than one worker mapper must be picklable
+        :param chunk_size: number of rows sent to worker process at once
+        :param ordered: keep order of rows when mapper is applied in several processes
         """
         if not self._operations:
             raise ValueError("graph has no data source")
 
+        if workers != 1:
+            return self.update_ops(ParallelMap(mapper, workers, chunk_size, ordered))
         return self.update_ops(copy(Map(mapper)))
 
-    def reduce(self, reducer: Reducer, keys: tp.Sequence[str]) -> "Graph":
+    def reduce(
+        self,
+        reducer: Reducer,
+        keys: tp.Sequence[str],
+        strategy: str = ReduceStrategy.sort,
+        workers: int | None = 1,
+    ) -> "Graph":
         """Construct new graph extended with reduce operation with particular reducer
         :param reducer: reducer to use
         :param keys: keys for grouping
+        :param strategy: "sort" groups consecutive rows, so rows must be sorted by keys;
+            "hash" aggregates rows of CombinableReducer in hash table without sorting;
+            "auto" uses hash aggregation for CombinableReducer unless rows are known to be sorted by keys
+        :param workers: number of processes to reduce partitions of rows in, None for number of CPUs;
+            with more than one worker rows are partitioned by keys and every partition is sorted
+            and reduced in its process, so strategy is not used and sort by keys right before reduce
+            is done by workers
         """
         if not self._operations:
             raise ValueError("graph has no data source")
 
+        if workers != 1 and keys:
+            return self.update_ops(ParallelReduce(reducer, keys, workers))
+
+        strategy = ReduceStrategy(strategy)
+        if strategy == ReduceStrategy.hash and not isinstance(reducer, CombinableReducer):
+            raise ValueError(f"{type(reducer).__name__} doesn't support hash aggregation")
+        if strategy != ReduceStrategy.sort and isinstance(reducer, CombinableReducer):
+            return self.update_ops(
+                HashReduce(reducer, keys, auto=strategy == ReduceStrategy.auto)
+            )
         return self.update_ops(copy(Reduce(reducer, keys)))
 
-    def sort(self, keys: tp.Sequence[str]) -> "Graph":
+    def sort(
+        self,
+        keys: tp.Sequence[str],
+        memory_limit: int = DEFAULT_MEMORY_LIMIT,
+        tmp_dir: str | None = None,
+    ) -> "Graph":
         """Construct new graph extended with sort operation
         :param keys: sorting keys (typical is tuple of strings)
+        :param memory_limit: approximate size in bytes of rows sorted in memory before spilling to disk
+        :param tmp_dir: directory for sorted runs spilled to disk, system temp dir by default
         """
         if not self._operations:
             raise ValueError("graph has no data source")
 
-        return self.update_ops(copy(ExternalSort(keys)))
+        return self.update_ops(copy(ExternalSort(keys, memory_limit, tmp_dir)))
 
     def join(
-        self, joiner: Joiner, join_graph: "Graph", keys: tp.Sequence[str]
+        self,
+        joiner: Joiner,
+        join_graph: "Graph",
+        keys: tp.Sequence[str],
+        strategy: str = JoinStrategy.merge,
     ) -> "Graph":
         """Construct new graph extended with join operation with another graph
         :param joiner: join strategy to use
         :param join_graph: other graph to join with
         :param keys: keys for grouping
+        :param strategy: "merge" joins consecutive groups, so both graphs must be sorted by keys;
+            "hash" puts rows of the smaller graph in hash table and needs no sorting
         """
         if not self._operations:
             raise ValueError("graph has no data source")
+        if JoinStrategy(strategy) == JoinStrategy.hash:
+            return self.update_ops(HashJoin(joiner, keys), join_params=join_graph)
         return self.update_ops(Join(joiner, keys), join_params=join_graph)
 
-    def run(self, **kwargs: tp.Any) -> TRowsIterable:
-        """Single method to start execution; data sources passed as kwargs"""
+    def cache(self, level: str = CacheLevel.memory) -> "Graph":
+        """Construct new graph which computes rows only once per run and replays them to every
+        graph built from it with copy
+        :param level: "memory" to keep rows in memory, "disk" to keep them in temporary file
+        """
+        if not self._operations:
+            raise ValueError("graph has no data source")
+
+        return self.update_ops(Cache(CacheLevel(level)))
+
+    def optimize(self, batch_size: int | None = None) -> "Graph":
+        """Construct equivalent graph with operations rewritten for faster execution:
+        filters and projections are moved closer to source, unused columns are dropped before sorting
+        and consecutive maps are fused
+        :param batch_size: apply maps supporting record batches to batches of that many rows (needs numpy)
+        """
+        return optimize(self, batch_size=batch_size)
+
+    def explain(self, batch_size: int | None = None) -> str:
+        """Describe operations of optimized graph in execution order, the order rows are sorted by after
+        each of them and sorts removed by optimizer; statistics of operations of a run profiled
+        with Graph.run(profile=True) are described by last_profile.explain()
+        :param batch_size: describe graph optimized for record batches of that many rows
+        """
+        return explain(self, batch_size)
+
+    def run(
+        self,
+        *,
+        optimize: bool = True,
+        batch_size: int | None = None,
+        compact: bool = False,
+        profile: bool | Profile = False,
+        pipeline: bool | Pipeline = False,
+        state: StateStore | None = None,
+        **kwargs: tp.Any,
+    ) -> TRowsIterable:
+        """Single method to start execution; data sources passed as kwargs
+        :param optimize: rewrite operations with Graph.optimize before execution; rewrites keep rows
+            and their order, so it is on by default as explain() describes optimized graph; off only to
+            run operations exactly as they were added
+        :param batch_size: apply maps supporting record batches to batches of that many rows (needs numpy),
+            used only with optimize
+        :param compact: keep rows inside graph as records sharing schema of columns instead of dicts,
+            result rows are dicts anyway; mappers and reducers must not rely on rows being dicts
+        :param profile: collect rows, time and memory of every operation into Profile,
+            True for a new one; profile of the last profiled run is kept in last_profile
+        :param pipeline: run operations between data sources, joins and caches in worker processes
+            connected by bounded queues, see compgraph.pipeline; Pipeline sets sizes of queues
+            and gets their statistics, True for a new one; the last one is kept in last_pipeline.
+            Operations must be picklable where processes are spawned rather than forked
+        :param state: run incrementally keeping states of reduces in store, see compgraph.incremental:
+            data sources pass only rows added since the previous run, result is that of all rows;
+            states are saved when all result rows are read
+        """
+        graph = incremental_graph(self, state) if state is not None else self
+        if optimize:
+            graph = graph.optimize(batch_size)
+        if pipeline is True:
+            pipeline = Pipeline()
+        if pipeline:
+            self.last_pipeline = pipeline
+            pipeline.queues = []
+            graph = pipeline_graph(graph, pipeline)
+        if profile is True:
+            profile = Profile()
+        if profile:
+            self.last_profile = profile
+            profile.start()
+        context = RunContext(compact, profile or None)
+        try:
+            if pipeline:
+                start_processes(graph, context)
+            if compact:
+                yield from to_dicts(graph._run(context, **kwargs))
+            else:
+                yield from graph._run(context, **kwargs)
+            if state is not None:
+                state.commit()
+        finally:
+            context.close()
+            if profile:
+                profile.finish()
+
+    async def arun(
+        self,
+        *,
+        optimize: bool = True,
+        batch_size: int | None = None,
+        compact: bool = False,
+        profile: bool | Profile = False,
+        state: StateStore | None = None,
+        **kwargs: tp.Any,
+    ) -> list[TRow]:
+        """Run graph in a thread of default executor of event loop and return result rows; data sources
+        passed as kwargs as to run, sources of graph_from_async_iter are async iterables read in event loop.
+        Operations never block event loop, CPU-bound ones may be run in processes with their workers.
+        Cancelling arun stops reading of async sources at once; graph thread is not waited for, it stops
+        on its next read of an async source or on its next result row, and state is not committed
+        :param optimize: as in run
+        :param batch_size: as in run
+        :param compact: as in run
+        :param profile: as in run
+        :param state: as in run
+        """
+        loop = asyncio.get_running_loop()
+        sources = {
+            name: AsyncSource(name, tp.cast(TAsyncSource, kwargs[name]), loop)
+            for name in self._async_source_names()
+            if name in kwargs
+        }
+        kwargs.update(sources)
+        stopped = threading.Event()
+
+        def run() -> list[TRow]:
+            rows = self.run(
+                optimize=optimize,
+                batch_size=batch_size,
+                compact=compact,
+                profile=profile,
+                state=state,
+                **kwargs,
+            )
+            result = []
+            try:
+                for row in rows:
+                    if stopped.is_set():
+                        raise asyncio.CancelledError()
+                    result.append(row)
+            finally:
+                rows.close()
+            return result
+
+        try:
+            return await loop.run_in_executor(None, run)
+        finally:
+            stopped.set()
+            for source in sources.values():
+                source.close()
+
+    def _async_source_names(self) -> set[str]:
+        names = {step.name for step in self._operations if isinstance(step, ReadAsyncIter)}
+        for join_graph in self._join_params:
+            names |= join_graph._async_source_names()
+        return names
+
+    def write_to_file(
+        self,
+        path: str,
+        fmt: str = SinkFormat.jsonl,
+        buffer_size: int = DEFAULT_BUFFER_SIZE,
+        compression: str | None = None,
+        atomic: bool = True,
+        **kwargs: tp.Any,
+    ) -> int:
+        """Run graph and write result rows to file as they are computed; data sources passed as kwargs
+        as to run
+        :param path: file to write to
+        :param fmt: "jsonl" for JSON object per line, "tsv" for tab separated values with header
+            or "columnar" for columnar file read by graph_from_columnar
+        :param buffer_size: size in bytes of write buffer
+        :param compression: None, "gzip", "bz2" or "xz"
+        :param atomic: write to temporary file and rename it to path when all rows are written
+        :return: number of rows written
+        """
+        return write_rows(self.run(**kwargs), path, fmt, buffer_size, compression, atomic)
+
+    def _run(self, context: RunContext, **kwargs: tp.Any) -> TRowsGenerator:
+        """Chain generators of operations, join subgraphs are chained right away when their joins are"""
         if not self._operations:
             raise ValueError("graph has no data source")
 
+        profile = context.profile
         join_params_temp = self._join_params.copy()
-        result: TRowsGenerator = self._operations[-1](**kwargs)
+        source = self._operations[-1]
+        result: TRowsGenerator = source(**kwargs)
+        if context.compact:
+            result = compact_rows(result)
+        if profile is not None:
+            stats = profile.add(source)
+            result = profile.track(stats, result)
         for func in self._operations[-2::-1]:
-            result = call_single_method(func, result, join_params_temp, **kwargs)
+            if profile is None:
+                result = call_single_method(func, result, join_params_temp, context, **kwargs)
+                continue
+            previous, stats = stats, profile.add(func)
+            stats.inputs.append(previous)
+            with profile.subgraph(stats):
+                result = call_single_method(func, result, join_params_temp, context, **kwargs)
+            result = profile.track(stats, result)
 
-        yield from result
+        return result
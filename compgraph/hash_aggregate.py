@@ -0,0 +1,329 @@
+import heapq
+import pickle
+import typing as tp
+from itertools import chain
+from itertools import islice
+from operator import itemgetter
+
+from compgraph.misc import group_key
+from compgraph.misc import StringEnum
+from compgraph.misc import TRow
+from compgraph.misc import TRowsGenerator
+from compgraph.misc import TRowsIterable
+from compgraph.operation import CombinableReducer
+from compgraph.operation import Operation
+from compgraph.operation import Reduce
+from compgraph.operation import Reducer
+from compgraph.record import select_columns
+from compgraph.spill import SpillFile
+
+DEFAULT_MAX_GROUPS = 2**18
+DEFAULT_MEMORY_LIMIT = 32 * 2**20
+DEFAULT_PARTITIONS = 16
+# size of hash table is estimated every that many rows by pickled size of a sample of its groups
+_CHECK_ROWS = 2**12
+_SAMPLE_GROUPS = 64
+# partitions are spilled again by other hashes at most that many times
+_MAX_SPILL_DEPTH = 4
+
+
+class ReduceStrategy(StringEnum):
+    sort = "sort"
+    hash = "hash"
+    auto = "auto"
+
+
+class HashReduce(Operation):
+    """
+    Reduce without sorting: rows are aggregated in hash table of group states, groups are emitted
+    in order of keys, so result is the same as of sorting by keys followed by Reduce.
+    When the table grows over memory_limit bytes or max_groups groups, its states are spilled to partition
+    files by hash of key and partitions are merged one by one at the end; a partition too big the same way
+    is spilled again to partitions by another hash of key. Size of the table is estimated every few
+    thousand rows by pickled size of a sample of its groups, as sizes of spilled states.
+    Keys which can't be hashed even with lists replaced by FrozenList are aggregated by sorting instead.
+    """
+
+    def __init__(
+        self,
+        reducer: CombinableReducer,
+        keys: tp.Sequence[str],
+        max_groups: int = DEFAULT_MAX_GROUPS,
+        partitions: int = DEFAULT_PARTITIONS,
+        tmp_dir: str | None = None,
+        auto: bool = False,
+        memory_limit: int = DEFAULT_MEMORY_LIMIT,
+    ) -> None:
+        """
+        :param reducer: reducer to use
+        :param keys: keys for grouping
+        :param max_groups: number of groups kept in memory before spilling to disk
+        :param partitions: number of partition files to spill to
+        :param tmp_dir: directory for partition files, system temp dir by default
+        :param auto: strategy was chosen automatically, optimizer may replace it with sorted Reduce
+        :param memory_limit: approximate size in bytes of pickled groups kept in memory before spilling to disk
+        """
+        self._reducer = reducer
+        self._keys = tuple(keys)
+        self._max_groups = max_groups
+        self._memory_limit = memory_limit
+        self._partitions = partitions
+        self._tmp_dir = tmp_dir
+        self._auto = auto
+
+    @property
+    def reducer(self) -> CombinableReducer:
+        return self._reducer
+
+    @property
+    def keys(self) -> tuple[str, ...]:
+        return self._keys
+
+    @property
+    def auto(self) -> bool:
+        return self._auto
+
+    def output_order(self, input_order: tuple[str, ...]) -> tuple[str, ...]:
+        return self._keys
+
+    def __call__(
+        self, rows: TRowsIterable, *args: tp.Any, **kwargs: tp.Any
+    ) -> TRowsGenerator:
+        keys = self._keys
+        reducer = self._reducer
+        table: dict[tuple[tp.Any, ...], list[tp.Any]] = {}
+        partitions: list[SpillFile] = []
+        check = _CHECK_ROWS
+        iterator = iter(rows)
+        try:
+            for row in iterator:
+                key = group_key(row, keys)
+                try:
+                    entry = table.get(key)
+                except TypeError:
+                    yield from self._sort_reduce(partitions, table, chain([row], iterator))
+                    return
+                if entry is None:
+                    if len(table) >= self._max_groups:
+                        self._spill(table, partitions, 0)
+                    key_values = select_columns(row, keys)
+                    entry = table[key] = [key_values, reducer.start()]
+                entry[1] = reducer.add(entry[1], row)
+                check -= 1
+                if not check:
+                    check = _CHECK_ROWS
+                    if _table_bytes(table) >= self._memory_limit:
+                        self._spill(table, partitions, 0)
+
+            if not partitions:
+                for key in sorted(table):
+                    yield from reducer.finish(*table[key])
+                return
+
+            self._spill(table, partitions, 0)
+            for _, row in self._finish_partitions(partitions, 1):
+                yield row
+        finally:
+            for spill in partitions:
+                spill.remove()
+
+    def _spill(
+        self, table: dict[tuple[tp.Any, ...], list[tp.Any]], partitions: list[SpillFile], depth: int
+    ) -> None:
+        """Write states to partition files by hash of key seeded with depth of partitioning"""
+        if not partitions:
+            partitions.extend(SpillFile(self._tmp_dir) for _ in range(self._partitions))
+        parts: list[list[tp.Any]] = [[] for _ in partitions]
+        for key, (key_values, state) in table.items():
+            parts[hash((depth, key)) % len(partitions)].append((key, key_values, state))
+        for partition, part in zip(partitions, parts):
+            partition.write(part)
+        table.clear()
+
+    def _finish_partitions(self, partitions: list[SpillFile], depth: int) -> tp.Iterator[tuple[tp.Any, TRow]]:
+        """Rows of groups of spilled partitions along with their keys, in order of keys"""
+        results: list[SpillFile] = []
+        try:
+            for partition in partitions:
+                result = SpillFile(self._tmp_dir)
+                results.append(result)
+                result.write(self._finish_partition(partition, depth))
+                result.close()
+                partition.remove()
+            # groups of different partitions never have equal keys
+            yield from heapq.merge(*results, key=itemgetter(0))
+        finally:
+            for result in results:
+                result.remove()
+
+    def _finish_partition(self, partition: SpillFile, depth: int) -> tp.Iterator[tuple[tp.Any, TRow]]:
+        """Merge spilled states of partition in order they were spilled and finish them,
+        a partition of too many groups is partitioned again
+        """
+        table: dict[tuple[tp.Any, ...], list[tp.Any]] = {}
+        parts: list[SpillFile] = []
+        check = _CHECK_ROWS
+        try:
+            for key, key_values, state in partition:
+                entry = table.get(key)
+                if entry is None:
+                    if len(table) >= self._max_groups and depth < _MAX_SPILL_DEPTH:
+                        self._spill(table, parts, depth)
+                    table[key] = [key_values, state]
+                else:
+                    entry[1] = self._reducer.merge(entry[1], state)
+                check -= 1
+                if not check:
+                    check = _CHECK_ROWS
+                    if depth < _MAX_SPILL_DEPTH and _table_bytes(table) >= self._memory_limit:
+                        self._spill(table, parts, depth)
+            if not parts:
+                for key in sorted(table):
+                    for row in self._reducer.finish(*table[key]):
+                        yield key, row
+                return
+            self._spill(table, parts, depth)
+            yield from self._finish_partitions(parts, depth + 1)
+        finally:
+            for part in parts:
+                part.remove()
+
+    def _sort_reduce(
+        self,
+        partitions: list[SpillFile],
+        table: dict[tuple[tp.Any, ...], list[tp.Any]],
+        rows: TRowsIterable,
+    ) -> TRowsGenerator:
+        """Finish aggregation by sorting, as Combine, sort and MergeStates do: states aggregated so far
+        go first, then every row left becomes a state of its own
+        """
+        from compgraph.external_sort import ExternalSort
+
+        reducer = self._reducer
+
+        def states() -> TRowsGenerator:
+            for partition in partitions:
+                for _, key_values, state in partition:
+                    key_values[STATE_COLUMN] = state
+                    yield key_values
+            for key_values, state in table.values():
+                key_values[STATE_COLUMN] = state
+                yield key_values
+            for row in rows:
+                key_values = select_columns(row, self._keys)
+                key_values[STATE_COLUMN] = reducer.add(reducer.start(), row)
+                yield key_values
+
+        sorted_states = ExternalSort(self._keys, tmp_dir=self._tmp_dir)(states())
+        yield from Reduce(MergeStates(reducer), self._keys)(sorted_states)
+
+
+def _table_bytes(table: dict[tuple[tp.Any, ...], list[tp.Any]]) -> int:
+    """Estimated size in bytes of pickled groups of hash table by average size of its first groups"""
+    if not table:
+        return 0
+    sample = list(islice(table.values(), _SAMPLE_GROUPS))
+    return len(pickle.dumps(sample, protocol=pickle.HIGHEST_PROTOCOL)) * len(table) // len(sample)
+
+
+STATE_COLUMN = "__compgraph_state__"
+DEFAULT_COMBINE_GROUPS = 2**14
+
+
+class Combine(Operation):
+    """
+    Pre-aggregate rows of CombinableReducer before sorting. Rows are aggregated in windows
+    of at most max_groups groups, every group of a window becomes one row with values of keys
+    and reducer state in STATE_COLUMN. Such rows are reduced with MergeStates.
+    Lists in keys are hashed as FrozenList; after a key which can't be hashed anyway, rows are passed
+    to sorting one state per row.
+    """
+
+    def __init__(
+        self,
+        reducer: CombinableReducer,
+        keys: tp.Sequence[str],
+        max_groups: int = DEFAULT_COMBINE_GROUPS,
+    ) -> None:
+        """
+        :param reducer: reducer to use
+        :param keys: keys for grouping, at least one
+        :param max_groups: number of groups in window
+        """
+        self._reducer = reducer
+        self._keys = tuple(keys)
+        self._max_groups = max_groups
+
+    @property
+    def reducer(self) -> CombinableReducer:
+        return self._reducer
+
+    @property
+    def keys(self) -> tuple[str, ...]:
+        return self._keys
+
+    def __call__(
+        self, rows: TRowsIterable, *args: tp.Any, **kwargs: tp.Any
+    ) -> TRowsGenerator:
+        keys = self._keys
+        reducer = self._reducer
+        table: dict[tp.Any, list[tp.Any]] = {}
+        iterator = iter(rows)
+        for row in iterator:
+            key = group_key(row, keys)
+            try:
+                entry = table.get(key)
+            except TypeError:
+                # key can't be hashed: rows go to sorting as they are, every one with state of its own
+                yield from self._flush(table)
+                for row in chain([row], iterator):
+                    key_values = select_columns(row, keys)
+                    key_values[STATE_COLUMN] = reducer.add(reducer.start(), row)
+                    yield key_values
+                return
+            if entry is None:
+                if len(table) >= self._max_groups:
+                    yield from self._flush(table)
+                key_values = select_columns(row, keys)
+                entry = table[key] = [key_values, reducer.start()]
+            entry[1] = reducer.add(entry[1], row)
+        yield from self._flush(table)
+
+    @staticmethod
+    def _flush(table: dict[tp.Any, list[tp.Any]]) -> TRowsGenerator:
+        for key_values, state in table.values():
+            key_values[STATE_COLUMN] = state
+            yield key_values
+        table.clear()
+
+
+class MergeStates(Reducer):
+    """Reduce rows produced by Combine: merge states of a group and finish them with combined reducer"""
+
+    def __init__(self, reducer: CombinableReducer) -> None:
+        """
+        :param reducer: reducer used by Combine
+        """
+        self._reducer = reducer
+
+    @property
+    def reducer(self) -> CombinableReducer:
+        return self._reducer
+
+    def __call__(
+        self, group_key: tuple[str, ...], rows: TRowsIterable
+    ) -> TRowsGenerator:
+        merge = self._reducer.merge
+        key_values: TRow | None = None
+        state: tp.Any = None
+        for row in rows:
+            if key_values is None:
+                key_values = select_columns(row, group_key)
+                state = row[STATE_COLUMN]
+            else:
+                state = merge(state, row[STATE_COLUMN])
+        if key_values is not None:
+            yield from self._reducer.finish(key_values, state)
+
+    def columns_read(self) -> tp.Collection[str] | None:
+        return (STATE_COLUMN,)
@@ -0,0 +1,229 @@
+import typing as tp
+from itertools import chain
+from itertools import islice
+
+from compgraph.joiner import Join
+from compgraph.joiner import Joiner
+from compgraph.misc import group_key
+from compgraph.misc import StringEnum
+from compgraph.misc import TRow
+from compgraph.misc import TRowsGenerator
+from compgraph.misc import TRowsIterable
+from compgraph.spill import SpillFile
+
+DEFAULT_MAX_BUILD_ROWS = 2**20
+DEFAULT_PARTITIONS = 16
+READ_CHUNK_SIZE = 1024
+
+
+class JoinStrategy(StringEnum):
+    merge = "merge"
+    hash = "hash"
+
+
+class HashJoin(Join):
+    """
+    Join without sorting: rows of the smaller side are put into hash table by keys and rows of the other
+    side are streamed against it, pairs are yielded as soon as their probe row is read. Both sides are read
+    in turns until one of them ends, it becomes the build side. When both sides have more than max_rows rows,
+    they are spilled to partition files by hash of key and partitions are joined one by one.
+    Columns met in both rows of a pair are suffixed in that pair only. Rows without a pair are kept on disk
+    until all pairs are found and are suffixed by columns duplicated in pairs with smaller keys, as merge
+    join does. So when rows of each side have the same columns, result is that of merge join up to order
+    of rows; merge join also suffixes columns of a pair duplicated in pairs before it, hash join does not.
+    Lists in keys are hashed as FrozenList.
+    """
+
+    def __init__(
+        self,
+        joiner: Joiner,
+        keys: tp.Sequence[str],
+        max_rows: int = DEFAULT_MAX_BUILD_ROWS,
+        partitions: int = DEFAULT_PARTITIONS,
+        tmp_dir: str | None = None,
+    ) -> None:
+        """
+        :param joiner: join strategy to use
+        :param keys: join keys
+        :param max_rows: number of rows of each side kept in memory before spilling to disk
+        :param partitions: number of partition files of each side to spill to
+        :param tmp_dir: directory for partition files, system temp dir by default
+        """
+        super().__init__(joiner, keys)
+        self._max_rows = max_rows
+        self._partitions = partitions
+        self._tmp_dir = tmp_dir
+
+    def output_order(self, input_order: tuple[str, ...]) -> tuple[str, ...]:
+        return ()
+
+    def _key(self, row: TRow) -> tuple[tp.Any, ...]:
+        return group_key(row, self._keys)
+
+    def __call__(
+        self, rows: TRowsIterable, *args: tp.Any, **kwargs: tp.Any
+    ) -> TRowsGenerator:
+        left, right = iter(rows), iter(args[0])
+        left_rows: list[TRow] = []
+        right_rows: list[TRow] = []
+        left_ended = right_ended = False
+        # rows of each side with keys above all keys of the other side, merge join emits them at the end
+        tails = SpillFile(self._tmp_dir), SpillFile(self._tmp_dir)
+        # other rows without a pair, they are suffixed by columns duplicated in pairs with smaller keys
+        unmatched = SpillFile(self._tmp_dir), SpillFile(self._tmp_dir)
+        # smallest key of a pair each duplicated column was met in
+        first_keys: dict[str, tuple[tp.Any, ...]] = {}
+        left_parts: list[SpillFile] = []
+        right_parts: list[SpillFile] = []
+        try:
+            while len(left_rows) <= self._max_rows or len(right_rows) <= self._max_rows:
+                if not left_ended:
+                    chunk = list(islice(left, READ_CHUNK_SIZE))
+                    left_rows.extend(chunk)
+                    left_ended = len(chunk) < READ_CHUNK_SIZE
+                if not right_ended:
+                    chunk = list(islice(right, READ_CHUNK_SIZE))
+                    right_rows.extend(chunk)
+                    right_ended = len(chunk) < READ_CHUNK_SIZE
+                if left_ended or right_ended:
+                    break
+
+            if left_ended or right_ended:
+                build_is_left = left_ended and (not right_ended or len(left_rows) <= len(right_rows))
+                if build_is_left:
+                    build_rows, probe = left_rows, chain(right_rows, right)
+                else:
+                    build_rows, probe = right_rows, chain(left_rows, left)
+                table, columns = self._build(build_rows)
+                yield from self._probe(
+                    table, columns, probe, build_is_left, max(table, default=None), None, tails, unmatched, first_keys
+                )
+            else:
+                left_max = self._spill(chain(left_rows, left), left_parts)
+                right_max = self._spill(chain(right_rows, right), right_parts)
+                del left_rows, right_rows
+                # equal keys always fall into the same partition
+                for left_part, right_part in zip(left_parts, right_parts):
+                    build_is_left = left_part.rows <= right_part.rows
+                    build, probe = (left_part, right_part) if build_is_left else (right_part, left_part)
+                    build_max, probe_max = (left_max, right_max) if build_is_left else (right_max, left_max)
+                    table, columns = self._build(build)
+                    build.remove()
+                    yield from self._probe(
+                        table, columns, probe, build_is_left, build_max, probe_max, tails, unmatched, first_keys
+                    )
+                    probe.remove()
+                    del table, columns
+
+            for row in unmatched[0]:
+                yield from self._joiner(self._keys, [row], [], self._duplicates_before(self._key(row), first_keys))
+            for row in unmatched[1]:
+                yield from self._joiner(self._keys, [], [row], self._duplicates_before(self._key(row), first_keys))
+            # merge join has found all duplicated columns by the time it reaches tails
+            duplicates = set(first_keys)
+            yield from self._rename(
+                self._joiner(self._keys, tails[0], [], duplicates), self._joiner._b_suffix, duplicates
+            )
+            yield from self._rename(
+                self._joiner(self._keys, [], tails[1], duplicates), self._joiner._a_suffix, duplicates
+            )
+        finally:
+            for part in left_parts + right_parts + list(tails) + list(unmatched):
+                part.remove()
+
+    def _spill(self, rows: TRowsIterable, parts: list[SpillFile]) -> tuple[tp.Any, ...] | None:
+        """Write rows to partition files by hash of key, return maximal key"""
+        parts.extend(SpillFile(self._tmp_dir) for _ in range(self._partitions))
+        buffers: list[list[TRow]] = [[] for _ in parts]
+        max_key = None
+        for row in rows:
+            key = self._key(row)
+            if max_key is None or key > max_key:
+                max_key = key
+            index = hash(key) % len(parts)
+            buffers[index].append(row)
+            if len(buffers[index]) >= READ_CHUNK_SIZE:
+                parts[index].write(buffers[index])
+                buffers[index].clear()
+        for part, buffer in zip(parts, buffers):
+            part.write(buffer)
+            part.close()
+        return max_key
+
+    def _duplicates_before(self, key: tuple[tp.Any, ...], first_keys: dict[str, tuple[tp.Any, ...]]) -> set[str]:
+        """Columns merge join has found in both sides by the time it reaches key"""
+        return {column for column, first_key in first_keys.items() if first_key < key}
+
+    def _build(
+        self, rows: TRowsIterable
+    ) -> tuple[dict[tuple[tp.Any, ...], list[TRow]], dict[tuple[tp.Any, ...], set[str]]]:
+        """Hash table of build rows by key and columns met in rows of every key"""
+        table: dict[tuple[tp.Any, ...], list[TRow]] = {}
+        columns: dict[tuple[tp.Any, ...], set[str]] = {}
+        for row in rows:
+            key = self._key(row)
+            table.setdefault(key, []).append(row)
+            columns.setdefault(key, set()).update(row)
+        return table, columns
+
+    def _probe(
+        self,
+        table: dict[tuple[tp.Any, ...], list[TRow]],
+        columns: dict[tuple[tp.Any, ...], set[str]],
+        probe: TRowsIterable,
+        build_is_left: bool,
+        build_max: tuple[tp.Any, ...] | None,
+        probe_max: tuple[tp.Any, ...] | None,
+        tails: tuple[SpillFile, SpillFile],
+        unmatched: tuple[SpillFile, SpillFile],
+        first_keys: dict[str, tuple[tp.Any, ...]],
+    ) -> TRowsGenerator:
+        """
+        Join probe rows with their pairs in table of build rows as they come. Rows without a pair which
+        merge join emits after all others are written to tails, the rest of rows without a pair
+        are written to unmatched
+        :param build_max: maximal key of build side
+        :param probe_max: maximal key of probe side, computed while probing if None
+        """
+        keys = self._keys
+        joiner = self._joiner
+        build_tail, probe_tail = tails if build_is_left else tails[::-1]
+        build_unmatched, probe_unmatched = unmatched if build_is_left else unmatched[::-1]
+        known_probe_max = probe_max is not None
+        matched_keys: set[tuple[tp.Any, ...]] = set()
+        pending: list[TRow] = []
+        pending_unmatched: list[TRow] = []
+        for row in probe:
+            key = self._key(row)
+            if not known_probe_max and (probe_max is None or key > probe_max):
+                probe_max = key
+            group = table.get(key)
+            if group is not None:
+                matched_keys.add(key)
+                for column in columns[key].intersection(row).difference(keys):
+                    if column not in first_keys or key < first_keys[column]:
+                        first_keys[column] = key
+                if build_is_left:
+                    yield from joiner(keys, group, [row])
+                else:
+                    yield from joiner(keys, [row], group)
+            elif build_max is not None and key > build_max:
+                pending.append(row)
+                if len(pending) >= READ_CHUNK_SIZE:
+                    probe_tail.write(pending)
+                    pending.clear()
+            else:
+                pending_unmatched.append(row)
+                if len(pending_unmatched) >= READ_CHUNK_SIZE:
+                    probe_unmatched.write(pending_unmatched)
+                    pending_unmatched.clear()
+        probe_tail.write(pending)
+        probe_unmatched.write(pending_unmatched)
+
+        for key, group in table.items():
+            if key in matched_keys:
+                continue
+            if probe_max is None or key > probe_max:
+                build_tail.write(group)
+            else:
+                build_unmatched.write(group)
@@ -0,0 +1,215 @@
+"""
+Incremental runs over append-only inputs. Reduces with CombinableReducer which rows of data sources reach
+through row-wise operations only (maps, sorts and caches) keep state of every group in StateStore between runs.
+A run is given only rows added since the previous one: their groups are aggregated and merged into
+stored states, and all groups are finished, so operations after such reduces see the same rows as after
+a full recompute. States are written to the store only when the whole result of a run is read.
+Every path from a data source must pass such a reduce, mappers before it must handle rows independently
+of each other, and rows must never be passed to an incremental run twice.
+"""
+import os
+import pickle
+import tempfile
+import typing as tp
+from copy import copy
+
+from compgraph.cache import Cache
+from compgraph.external_sort import ExternalSort
+from compgraph.hash_aggregate import HashReduce
+from compgraph.misc import group_key
+from compgraph.misc import TRowsGenerator
+from compgraph.misc import TRowsIterable
+from compgraph.operation import CombinableReducer
+from compgraph.operation import FusedMap
+from compgraph.operation import Map
+from compgraph.operation import Operation
+from compgraph.operation import Reduce
+from compgraph.parallel import ParallelMap
+from compgraph.parallel import ParallelReduce
+from compgraph.record import select_columns
+
+if tp.TYPE_CHECKING:
+    from compgraph.graph import Graph
+
+_FORMAT_VERSION = 1
+
+TStates = dict[tuple[tp.Any, ...], list[tp.Any]]
+
+
+class StateStore:
+    """
+    File with states of groups of incremental reduces of a graph, written atomically.
+    States of every reduce are pickled separately, so each run of a reduce merges into its own copy
+    """
+
+    def __init__(self, path: str) -> None:
+        """
+        :param path: file to keep states in, created by the first run
+        """
+        self.path = path
+        self._names: frozenset[str] = frozenset()
+        self._states: dict[str, bytes] = {}
+        self._pending: dict[str, bytes] = {}
+
+    def open(self, names: tp.Collection[str]) -> None:
+        """Read states stored by previous runs and forget states of unfinished ones
+        :param names: names of incremental reduces of graph, must be the same as of the graph that wrote the file
+        """
+        self._names = frozenset(names)
+        self._pending = {}
+        self._states = {}
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, "rb") as file:
+            data = pickle.load(file)
+        if data["version"] != _FORMAT_VERSION:
+            raise ValueError(f"state file {self.path!r} has unsupported version {data['version']}")
+        if set(data["states"]) != self._names:
+            raise ValueError(
+                f"state file {self.path!r} is written by another graph: it has reduces {sorted(data['states'])},"
+                f" graph has {sorted(names)}"
+            )
+        self._states = data["states"]
+
+    def load(self, name: str) -> TStates:
+        """States of groups of reduce by key values, empty before the first run"""
+        states = self._states.get(name)
+        return {} if states is None else tp.cast(TStates, pickle.loads(states))
+
+    def save(self, name: str, states: TStates) -> None:
+        """Remember states of reduce to write them on commit"""
+        self._pending[name] = pickle.dumps(states, protocol=pickle.HIGHEST_PROTOCOL)
+
+    def commit(self) -> None:
+        """Write states of the run replacing the file, so it is never left half written"""
+        missing = self._names - set(self._pending)
+        if missing:
+            # stored states of such reduces would miss rows of the run
+            raise RuntimeError(
+                f"incremental reduces {sorted(missing)} didn't read all their rows, states are not saved"
+            )
+        self._states = self._states | self._pending
+        self._pending = {}
+        directory = os.path.dirname(os.path.abspath(self.path))
+        descriptor, tmp_path = tempfile.mkstemp(prefix=".compgraph-state-", dir=directory)
+        try:
+            with os.fdopen(descriptor, "wb") as file:
+                pickle.dump(
+                    {"version": _FORMAT_VERSION, "states": self._states}, file, protocol=pickle.HIGHEST_PROTOCOL
+                )
+                file.flush()
+                os.fsync(file.fileno())
+            os.replace(tmp_path, self.path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+
+
+class IncrementalReduce(Operation):
+    """
+    Reduce with CombinableReducer merging rows into states of groups stored by previous runs.
+    Groups of all runs are emitted in order of keys, as HashReduce does; all states are kept in memory,
+    so values of keys must be hashable or lists
+    """
+
+    def __init__(self, reducer: CombinableReducer, keys: tp.Sequence[str], name: str, store: StateStore) -> None:
+        """
+        :param reducer: reducer to use
+        :param keys: keys for grouping
+        :param name: name of states of reduce in store, stable between runs of the same graph
+        :param store: store of states
+        """
+        self._reducer = reducer
+        self._keys = tuple(keys)
+        self._name = name
+        self._store = store
+
+    @property
+    def reducer(self) -> CombinableReducer:
+        return self._reducer
+
+    @property
+    def keys(self) -> tuple[str, ...]:
+        return self._keys
+
+    @property
+    def name(self) -> str:
+        return self._name
+
+    def output_order(self, input_order: tuple[str, ...]) -> tuple[str, ...]:
+        return self._keys
+
+    def __call__(self, rows: TRowsIterable, *args: tp.Any, **kwargs: tp.Any) -> TRowsGenerator:
+        keys = self._keys
+        reducer = self._reducer
+        # adding rows to stored state is the same as merging state of new rows into it
+        table = self._store.load(self._name)
+        for row in rows:
+            key = group_key(row, keys)
+            entry = table.get(key)
+            if entry is None:
+                entry = table[key] = [select_columns(row, keys), reducer.start()]
+            entry[1] = reducer.add(entry[1], row)
+        self._store.save(self._name, table)
+        for key in sorted(table):
+            yield from reducer.finish(*table[key])
+
+
+def _mergeable_reduce(step: Operation) -> tuple[CombinableReducer, tuple[str, ...]] | None:
+    """Reducer and keys of reduce which may be made incremental"""
+    if isinstance(step, (Reduce, HashReduce)) and isinstance(step.reducer, CombinableReducer):
+        return step.reducer, step.keys
+    if (
+        isinstance(step, ParallelReduce)
+        and isinstance(step.reducer, CombinableReducer)
+        and step.sort_keys == step.keys
+    ):
+        return step.reducer, step.keys
+    return None
+
+
+def incremental_graph(graph: "Graph", store: StateStore) -> "Graph":
+    """Return graph where the first reduce with CombinableReducer on every path from data source
+    is replaced by IncrementalReduce keeping states in store, and open store; passed graph is not changed
+    """
+    reduces: dict[int, IncrementalReduce] = {}
+    result = _rewrite(graph, store, reduces)
+    store.open([reduce.name for reduce in reduces.values()])
+    return result
+
+
+def _rewrite(graph: "Graph", store: StateStore, reduces: dict[int, IncrementalReduce]) -> "Graph":
+    if not graph._operations:
+        raise ValueError("graph has no data source")
+
+    steps = graph._operations[::-1]
+    result_steps = steps[:1]
+    order = steps[0].output_order(())
+    for index, step in enumerate(steps[1:], 1):
+        mergeable = _mergeable_reduce(step)
+        if mergeable is not None:
+            reducer, keys = mergeable
+            if isinstance(step, Reduce) and order[: len(keys)] != keys:
+                raise ValueError(f"rows of {type(reducer).__name__} reduce by {list(keys)} are not sorted by keys")
+            previous = result_steps[-1]
+            if isinstance(previous, ExternalSort) and previous.keys == keys:
+                # sort by exactly the same keys keeps order of rows inside groups, as hash aggregation does
+                result_steps.pop()
+            if id(step) not in reduces:
+                name = f"{len(reduces)}:{type(reducer).__name__}({','.join(keys)})"
+                reduces[id(step)] = IncrementalReduce(reducer, keys, name, store)
+            result_steps.append(reduces[id(step)])
+            result_steps.extend(steps[index + 1:])
+            break
+        if not isinstance(step, (Map, FusedMap, ParallelMap, ExternalSort, Cache)):
+            raise ValueError(f"{type(step).__name__} reads rows of data source before any mergeable reduce")
+        result_steps.append(step)
+        order = step.output_order(order)
+    else:
+        raise ValueError("rows of data source reach result without mergeable reduce")
+
+    result = copy(graph)
+    result._operations = result_steps[::-1]
+    # joins come after incremental reduce of main graph, their subgraphs read data sources too
+    result._join_params = [_rewrite(join, store, reduces) for join in graph._join_params[::-1]][::-1]
+    return result
@@ -7,6 +7,14 @@ from compgraph.misc import TRow
 from compgraph.misc import TRowsGenerator
 from compgraph.misc import TRowsIterable
 from compgraph.operation import Operation
+from compgraph.record import make_row
+from compgraph.record import Record
+from compgraph.record import Schema
+from compgraph.spill import SpillBuffer
+
+DEFAULT_MAX_GROUP_ROWS = 2**16
+# layouts of joined records kept by joiner, the cache is cleared when it grows over that
+_MAX_LAYOUTS = 2**10
 
 
 def validate_suffix(
@@ -24,9 +32,28 @@ def validate_suffix(
 class Joiner(ABC):
     """Base class for joiners"""
 
-    def __init__(self, suffix_a: str = "_1", suffix_b: str = "_2") -> None:
+    def __init__(
+        self,
+        suffix_a: str = "_1",
+        suffix_b: str = "_2",
+        max_rows: int = DEFAULT_MAX_GROUP_ROWS,
+        tmp_dir: str | None = None,
+    ) -> None:
+        """
+        :param suffix_a: suffix of left table columns met in both tables
+        :param suffix_b: suffix of right table columns met in both tables
+        :param max_rows: number of rows of a group kept in memory, bigger groups of a single key
+            are spilled to disk and read back for every row of the other table
+        :param tmp_dir: directory for spilled groups, system temp dir by default
+        """
         self._a_suffix = suffix_a
         self._b_suffix = suffix_b
+        self._max_rows = max_rows
+        self._tmp_dir = tmp_dir
+        # columns of joined records by schemas of both sides and duplicates met before, see _pair_record
+        self._layouts: dict[tuple[tp.Any, ...], tuple[Schema, list[int], list[int], frozenset[str]]] = {}
+        # duplicates set of the last pair and its contents, duplicates of a join only grow
+        self._dups: tuple[set[str] | None, int, frozenset[str] | None] = (None, -1, None)
 
     @abc.abstractmethod
     def __call__(
@@ -43,6 +70,10 @@ class Joiner(ABC):
         """
         pass
 
+    def _buffer(self, rows: TRowsIterable) -> SpillBuffer:
+        """Rows of a group to be read once per row of the other table"""
+        return SpillBuffer(rows, self._max_rows, self._tmp_dir)
+
     def _common_generator(
         self,
         keys: tp.Sequence[str],
@@ -54,6 +85,9 @@ class Joiner(ABC):
         for row_a in rows_a:
             a_is_empty = False
             for row_b in rows_b:
+                if isinstance(row_a, Record):
+                    yield self._pair_record(keys, row_a, row_b, dups)
+                    continue
                 result = {key: row_a[key] for key in keys}
                 result.update(
                     {
@@ -72,12 +106,74 @@ class Joiner(ABC):
                 yield result
         return a_is_empty
 
+    def _pair_record(
+        self, keys: tp.Sequence[str], row_a: Record, row_b: TRow, dups: set[str] | None
+    ) -> TRow:
+        """Same row as _common_generator makes for dicts, built as Record.
+        Columns of result and duplicates they add depend only on schemas of both rows and duplicates met before
+        """
+        if not isinstance(row_b, Record):
+            row_b = Record.from_mapping(row_b)
+        state = None
+        if dups is not None:
+            last_dups, last_size, state = self._dups
+            if last_dups is not dups or last_size != len(dups):
+                state = frozenset(dups)
+                self._dups = (dups, len(dups), state)
+        layout_key = (row_a.schema, row_b.schema, tuple(keys), state)
+        layout = self._layouts.get(layout_key)
+        if layout is None:
+            if len(self._layouts) >= _MAX_LAYOUTS:
+                self._layouts.clear()
+            names = list(keys)
+            positions_a = [row_a.schema.positions[key] for key in keys]
+            positions_b = []
+            for key, position in row_a.schema.positions.items():
+                if key not in keys:
+                    names.append(validate_suffix(key, self._a_suffix, row_b, dups))
+                    positions_a.append(position)
+            for key, position in row_b.schema.positions.items():
+                if key not in keys:
+                    names.append(validate_suffix(key, self._b_suffix, row_a, dups))
+                    positions_b.append(position)
+            try:
+                schema = Schema.of(names)
+            except ValueError:  # suffixed column clashes with another one
+                values_a, values_b = row_a.values_list, row_b.values_list
+                values = [values_a[p] for p in positions_a] + [values_b[p] for p in positions_b]
+                return make_row(row_a, names, values)
+            added = frozenset() if state is None or dups is None else frozenset(dups.difference(state))
+            layout = (schema, positions_a, positions_b, added)
+            self._layouts[layout_key] = layout
+            if state is not None and added:
+                # columns met in both rows are suffixed either way, so duplicates they added don't change result
+                self._layouts[layout_key[:3] + (state | added,)] = layout
+        schema, positions_a, positions_b, added = layout
+        if added and dups is not None:
+            dups.update(added)
+        values_a, values_b = row_a.values_list, row_b.values_list
+        values = [values_a[p] for p in positions_a]
+        values.extend([values_b[p] for p in positions_b])
+        return tp.cast(TRow, Record(schema, values))
+
 
 class Join(Operation):
     def __init__(self, joiner: Joiner, keys: tp.Sequence[str]):
         self._keys = tuple(keys)
         self._joiner = joiner
 
+    @property
+    def joiner(self) -> Joiner:
+        return self._joiner
+
+    @property
+    def keys(self) -> tuple[str, ...]:
+        return self._keys
+
+    def output_order(self, input_order: tuple[str, ...]) -> tuple[str, ...]:
+        # both sides are merged in order of join keys which are never renamed
+        return self._keys
+
     def __call__(
         self, rows: TRowsIterable, *args: tp.Any, **kwargs: tp.Any
     ) -> TRowsGenerator:
@@ -118,29 +214,38 @@ class Join(Operation):
 
             left_key_prev = left_key
             right_key_prev = right_key
-        print(duplicates, duplicates)
 
         while left_row is not None and left_key is not None:  # use right suffix
-            suffix = self._joiner._b_suffix
-            for row in self._joiner(self._keys, left_row, iter([]), duplicates):
-                yield {
-                    key + suffix if key in duplicates else key: value
-                    for key, value in row.items()
-                }
+            yield from self._rename(
+                self._joiner(self._keys, left_row, iter([]), duplicates),
+                self._joiner._b_suffix,
+                duplicates,
+            )
             left_key, left_row = next(group_left, (None, None))
 
         while right_row is not None and right_key is not None:  # use left suffix
-            suffix = self._joiner._a_suffix
-            for row in self._joiner(self._keys, iter([]), right_row, duplicates):
-                yield {
-                    key + suffix if key in duplicates else key: value
-                    for key, value in row.items()
-                }
+            yield from self._rename(
+                self._joiner(self._keys, iter([]), right_row, duplicates),
+                self._joiner._a_suffix,
+                duplicates,
+            )
             right_key, right_row = next(group_right, (None, None))
 
-        print(duplicates)
         return None
 
+    @staticmethod
+    def _rename(rows: TRowsIterable, suffix: str, duplicates: set[str]) -> TRowsGenerator:
+        """Add suffix to columns met in both tables"""
+        for row in rows:
+            if isinstance(row, Record):
+                names = [key + suffix if key in duplicates else key for key in row]
+                yield make_row(row, names, list(row.values()))
+                continue
+            yield {
+                key + suffix if key in duplicates else key: value
+                for key, value in row.items()
+            }
+
 
 class InnerJoiner(Joiner):
     """Join with inner strategy"""
@@ -152,10 +257,14 @@ class InnerJoiner(Joiner):
         rows_b: TRowsIterable,
         dups: set[str] | None = None,
     ) -> TRowsGenerator:
-        if unpacked_b := list(rows_b):
-            yield from self._common_generator(
-                keys, rows_a=rows_a, rows_b=unpacked_b, dups=dups
-            )
+        buffer_b = self._buffer(rows_b)
+        try:
+            if buffer_b:
+                yield from self._common_generator(
+                    keys, rows_a=rows_a, rows_b=buffer_b, dups=dups
+                )
+        finally:
+            buffer_b.remove()
 
 
 class OuterJoiner(Joiner):
@@ -168,8 +277,19 @@ class OuterJoiner(Joiner):
         rows_b: TRowsIterable,
         dups: set[str] | None = None,
     ) -> TRowsGenerator:
-        rows_b = [row for row in rows_b]
+        buffer_b = self._buffer(rows_b)
+        try:
+            yield from self._outer(keys, rows_a, buffer_b, dups)
+        finally:
+            buffer_b.remove()
 
+    def _outer(
+        self,
+        keys: tp.Sequence[str],
+        rows_a: TRowsIterable,
+        rows_b: SpillBuffer,
+        dups: set[str] | None,
+    ) -> TRowsGenerator:
         #
         # outer part
         #
@@ -187,11 +307,11 @@ class OuterJoiner(Joiner):
                 for row in rows_b:
                     res: TRow = {}
                     for key, value in row.items():
-                        print(f"{key =}, {value=}")
-                        print(dups)
                         if key in dups:
                             key += self._b_suffix
                         res[key] = value
+                    if isinstance(row, Record):
+                        res = make_row(row, list(res), list(res.values()))
                     yield res
 
 
@@ -205,17 +325,19 @@ class LeftJoiner(Joiner):
         rows_b: TRowsIterable,
         dups: set[str] | None = None,
     ) -> TRowsGenerator:
-        rows_b = [row for row in rows_b]
-
-        #
-        # left part
-        #
-        if not rows_b:
-            yield from rows_a
-        else:
-            yield from self._common_generator(
-                keys=keys, rows_a=rows_a, rows_b=rows_b, dups=dups
-            )
+        buffer_b = self._buffer(rows_b)
+        try:
+            #
+            # left part
+            #
+            if not buffer_b:
+                yield from rows_a
+            else:
+                yield from self._common_generator(
+                    keys=keys, rows_a=rows_a, rows_b=buffer_b, dups=dups
+                )
+        finally:
+            buffer_b.remove()
 
 
 class RightJoiner(Joiner):
@@ -228,15 +350,16 @@ class RightJoiner(Joiner):
         rows_b: TRowsIterable,
         dups: set[str] | None = None,
     ) -> TRowsGenerator:
-        rows_a = [row for row in rows_a]
-
-        #
-        # right  part
-        #
-
-        if not rows_a:
-            yield from rows_b
-        else:
-            yield from self._common_generator(
-                keys=keys, rows_a=rows_b, rows_b=rows_a, dups=dups
-            )
+        buffer_a = self._buffer(rows_a)
+        try:
+            #
+            # right  part
+            #
+            if not buffer_a:
+                yield from rows_b
+            else:
+                yield from self._common_generator(
+                    keys=keys, rows_a=rows_b, rows_b=buffer_a, dups=dups
+                )
+        finally:
+            buffer_a.remove()
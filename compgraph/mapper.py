@@ -3,16 +3,27 @@ import calendar
 import re
 import string
 import typing as tp
+import unicodedata
 
 import math
 
-from compgraph.misc import get_valid_date
+from compgraph.columnar import BatchMapper
+from compgraph.columnar import MICROSECONDS_IN_DAY
+from compgraph.columnar import np
+from compgraph.columnar import parse_times
+from compgraph.columnar import RecordBatch
+from compgraph.misc import order_prefix
 from compgraph.misc import TRow
 from compgraph.misc import TRowsGenerator
 from compgraph.operation import Mapper
+from compgraph.operation import RowMapper
+from compgraph.record import make_row
+from compgraph.timestamp import EPOCH
+from compgraph.timestamp import MICROSECOND
+from compgraph.timestamp import TimeParser
 
 
-class FilterPunctuation(Mapper):
+class FilterPunctuation(RowMapper):
     """Left only non-punctuation symbols"""
 
     def __init__(self, column: str):
@@ -21,14 +32,20 @@ class FilterPunctuation(Mapper):
         """
         self._column = column
 
-    def __call__(self, row: TRow) -> TRowsGenerator:
+    def apply(self, row: TRow) -> TRow | None:
         row[self._column] = "".join(
             char for char in row[self._column] if char not in string.punctuation
         )
-        yield row
+        return row
+
+    def columns_read(self) -> tp.Collection[str] | None:
+        return (self._column,)
+
+    def columns_written(self) -> tp.Collection[str] | None:
+        return (self._column,)
 
 
-class LowerCase(Mapper):
+class LowerCase(RowMapper):
     """Replace column value with value in lower case"""
 
     def __init__(self, column: str):
@@ -37,9 +54,15 @@ class LowerCase(Mapper):
         """
         self._column = column
 
-    def __call__(self, row: TRow) -> TRowsGenerator:
+    def apply(self, row: TRow) -> TRow | None:
         row[self._column] = row[self._column].lower()
-        yield row
+        return row
+
+    def columns_read(self) -> tp.Collection[str] | None:
+        return (self._column,)
+
+    def columns_written(self) -> tp.Collection[str] | None:
+        return (self._column,)
 
 
 class Split(Mapper):
@@ -66,8 +89,92 @@ class Split(Mapper):
             yield row_copy
             start = match.end()
 
+    def columns_read(self) -> tp.Collection[str] | None:
+        return (self._column,)
+
+    def columns_written(self) -> tp.Collection[str] | None:
+        return (self._column,)
+
+
+class _UnicodePunctuation(dict):  # type: ignore[type-arg]
+    """Translation table deleting Unicode punctuation and symbols, filled as characters are met"""
+
+    def __missing__(self, code: int) -> int | None:
+        value = None if unicodedata.category(chr(code))[0] in "PS" else code
+        self[code] = value
+        return value
+
+
+class Tokenize(Mapper):
+    """
+    Split text of column into words on multiple rows in a single pass: the same as FilterPunctuation,
+    LowerCase and Split applied one after another, including empty word for text starting with separator.
+    Punctuation is deleted with translation table, default separator splits by str.split
+    """
+
+    _PUNCTUATION = str.maketrans("", "", string.punctuation)
+
+    def __init__(
+        self,
+        column: str,
+        separator: str | None = None,
+        unicode: bool = False,
+        batch: bool = False,
+    ) -> None:
+        """
+        :param column: name of column to split
+        :param separator: regular expression to separate by, whitespace by default
+        :param unicode: delete all Unicode punctuation and symbols, not only ASCII ones,
+            and fold case with str.casefold
+        :param batch: yield single row for every row with list of its words in column
+            instead of row for every word
+        """
+        self._column = column
+        self._separator = separator
+        self._unicode = unicode
+        self._batch = batch
+        self._table = _UnicodePunctuation() if unicode else self._PUNCTUATION
+
+    def tokens(self, text: str) -> list[str]:
+        """Words of text"""
+        text = text.translate(self._table)
+        text = text.casefold() if self._unicode else text.lower()
+        if self._separator is None:
+            words = text.split()
+            # Split gives empty word before leading whitespace and for empty text
+            if not text or text[0].isspace():
+                words.insert(0, "")
+            return words
+
+        text += self._separator
+        words = []
+        start = 0
+        for match in re.finditer(self._separator, text):
+            words.append(text[start: match.start()])
+            start = match.end()
+        return words
+
+    def __call__(self, row: TRow) -> TRowsGenerator:
+        column = self._column
+        words = self.tokens(row[column])
+        if self._batch:
+            row[column] = words
+            yield row
+            return
 
-class Product(Mapper):
+        for word in words:
+            row_copy = row.copy()
+            row_copy[column] = word
+            yield row_copy
+
+    def columns_read(self) -> tp.Collection[str] | None:
+        return (self._column,)
+
+    def columns_written(self) -> tp.Collection[str] | None:
+        return (self._column,)
+
+
+class Product(BatchMapper):
     """Calculates product of multiple columns"""
 
     def __init__(
@@ -80,15 +187,28 @@ class Product(Mapper):
         self._columns = columns
         self._result_column = result_column
 
-    def __call__(self, row: TRow) -> TRowsGenerator:
+    def apply(self, row: TRow) -> TRow | None:
         result = 1
         for column in self._columns:
             result *= row[column]
         row[self._result_column] = result
-        yield row
+        return row
+
+    def apply_batch(self, batch: RecordBatch) -> RecordBatch:
+        result = 1
+        for column in self._columns:
+            result = result * batch[column]
+        batch[self._result_column] = result
+        return batch
+
+    def columns_read(self) -> tp.Collection[str] | None:
+        return tuple(self._columns)
 
+    def columns_written(self) -> tp.Collection[str] | None:
+        return (self._result_column,)
 
-class NaturalLog(Mapper):
+
+class NaturalLog(BatchMapper):
     """Calculates NaturalLog of column"""
 
     def __init__(self, column: str, result_column: str = "product") -> None:
@@ -99,12 +219,22 @@ class NaturalLog(Mapper):
         self._column = column
         self._result_column = result_column
 
-    def __call__(self, row: TRow) -> TRowsGenerator:
+    def apply(self, row: TRow) -> TRow | None:
         row[self._result_column] = math.log(row[self._column])
-        yield row
+        return row
 
+    def apply_batch(self, batch: RecordBatch) -> RecordBatch:
+        batch[self._result_column] = np.log(batch[self._column])
+        return batch
 
-class Divide(Mapper):
+    def columns_read(self) -> tp.Collection[str] | None:
+        return (self._column,)
+
+    def columns_written(self) -> tp.Collection[str] | None:
+        return (self._result_column,)
+
+
+class Divide(BatchMapper):
     """Calculates division one column by another"""
 
     def __init__(
@@ -119,26 +249,60 @@ class Divide(Mapper):
         self._denominator = denominator
         self._result_column = result_column
 
-    def __call__(self, row: TRow) -> TRowsGenerator:
+    def apply(self, row: TRow) -> TRow | None:
         row[self._result_column] = row[self._nominator] / row[self._denominator]
-        yield row
+        return row
 
+    def apply_batch(self, batch: RecordBatch) -> RecordBatch:
+        batch[self._result_column] = batch[self._nominator] / batch[self._denominator]
+        return batch
 
-class Filter(Mapper):
+    def columns_read(self) -> tp.Collection[str] | None:
+        return self._nominator, self._denominator
+
+    def columns_written(self) -> tp.Collection[str] | None:
+        return (self._result_column,)
+
+
+class Filter(BatchMapper):
     """Remove records that don't satisfy some condition"""
 
-    def __init__(self, condition: tp.Callable[[TRow], bool]) -> None:
+    def __init__(
+        self,
+        condition: tp.Callable[[TRow], bool],
+        columns: tp.Sequence[str] | None = None,
+        batch_condition: tp.Callable[[RecordBatch], tp.Any] | None = None,
+    ) -> None:
         """
         :param condition: if condition is not true - remove record
+        :param columns: columns condition depends on, lets optimizer move filter closer to source
+        :param batch_condition: condition computed for record batch at once, gives boolean array;
+            filter is applied to batches only if it is set
         """
         self._condition = condition
+        self._columns = None if columns is None else tuple(columns)
+        self._batch_condition = batch_condition
 
-    def __call__(self, row: TRow) -> TRowsGenerator:
+    def apply(self, row: TRow) -> TRow | None:
         if self._condition(row):
-            yield row
+            return row
+        return None
 
+    def apply_batch(self, batch: RecordBatch) -> RecordBatch:
+        assert self._batch_condition is not None, "filter has no batch condition"
+        return batch.filter(self._batch_condition(batch))
 
-class Project(Mapper):
+    def supports_batches(self) -> bool:
+        return self._batch_condition is not None
+
+    def columns_read(self) -> tp.Collection[str] | None:
+        return self._columns
+
+    def columns_written(self) -> tp.Collection[str] | None:
+        return ()
+
+
+class Project(BatchMapper):
     """Leave only mentioned columns"""
 
     def __init__(self, columns: tp.Sequence[str]) -> None:
@@ -147,14 +311,20 @@ class Project(Mapper):
         """
         self._columns = columns
 
-    def __call__(self, row: TRow) -> TRowsGenerator:
-        result: TRow = {}
-        for column in self._columns:
-            result[column] = row[column]
-        yield result
+    def apply(self, row: TRow) -> TRow | None:
+        return make_row(row, self._columns, [row[column] for column in self._columns])
+
+    def apply_batch(self, batch: RecordBatch) -> RecordBatch:
+        return batch.select(self._columns)
+
+    def columns_read(self) -> tp.Collection[str] | None:
+        return tuple(self._columns)
+
+    def output_order(self, input_order: tuple[str, ...]) -> tuple[str, ...]:
+        return order_prefix(input_order, self._columns)
 
 
-class ParseTime(Mapper):
+class ParseTime(BatchMapper):
     """Parse column and save weekday and hour in results columns"""
 
     WEEKDAYS = list(calendar.day_abbr)
@@ -165,26 +335,51 @@ class ParseTime(Mapper):
         time_format: str,
         weekday_result_column: str,
         hour_result_column: str,
+        micros_result_column: str | None = None,
     ) -> None:
         """
         :param time_column: time to parse
         :param time_format:
         :param weekday_result_column: result columns for weekday
         :param hour_result_column: result columns for hour
+        :param micros_result_column: result column for time in microseconds since 1970-01-01,
+            lets Speed use parsed time instead of parsing it again
         """
         self._time_column = time_column
         self._time_format = time_format
         self._weekday_result = weekday_result_column
         self._hour_result = hour_result_column
+        self._micros_result = micros_result_column
+        self._parser = TimeParser(time_format)
 
-    def __call__(self, row: TRow) -> TRowsGenerator:
-        dt = get_valid_date(row[self._time_column], self._time_format)
+    def apply(self, row: TRow) -> TRow | None:
+        dt = self._parser(row[self._time_column])
         row[self._weekday_result] = self.WEEKDAYS[dt.weekday()]
         row[self._hour_result] = dt.hour
-        yield row
-
-
-class CalcHaversine(Mapper):
+        if self._micros_result is not None:
+            row[self._micros_result] = (dt - EPOCH) // MICROSECOND
+        return row
+
+    def apply_batch(self, batch: RecordBatch) -> RecordBatch:
+        micros = parse_times(batch[self._time_column], self._time_format, self._parser)
+        days = micros // MICROSECONDS_IN_DAY
+        # 1970-01-01 is Thursday
+        batch[self._weekday_result] = np.asarray(self.WEEKDAYS)[(days + 3) % 7]
+        batch[self._hour_result] = micros % MICROSECONDS_IN_DAY // 3_600_000_000
+        if self._micros_result is not None:
+            batch[self._micros_result] = micros
+        return batch
+
+    def columns_read(self) -> tp.Collection[str] | None:
+        return (self._time_column,)
+
+    def columns_written(self) -> tp.Collection[str] | None:
+        if self._micros_result is not None:
+            return self._weekday_result, self._hour_result, self._micros_result
+        return self._weekday_result, self._hour_result
+
+
+class CalcHaversine(BatchMapper):
     """Parse column and save weekday and hour in results columns"""
 
     EARTH_RADIUS_KM = 6371.0
@@ -199,11 +394,27 @@ class CalcHaversine(Mapper):
         self._end = end
         self._result = result
 
-    def __call__(self, row: TRow) -> TRowsGenerator:
+    def apply(self, row: TRow) -> TRow | None:
         lon1, lat1 = row[self._start]
         lon2, lat2 = row[self._end]
         row[self._result] = self.haversine(lon1, lat1, lon2, lat2)
-        yield row
+        return row
+
+    def apply_batch(self, batch: RecordBatch) -> RecordBatch:
+        start = np.radians(np.asarray(batch[self._start], dtype=float))
+        end = np.radians(np.asarray(batch[self._end], dtype=float))
+        lon1, lat1 = start[:, 0], start[:, 1]
+        lon2, lat2 = end[:, 0], end[:, 1]
+
+        a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+        batch[self._result] = 2 * np.arcsin(np.sqrt(a)) * self.EARTH_RADIUS_KM
+        return batch
+
+    def columns_read(self) -> tp.Collection[str] | None:
+        return self._start, self._end
+
+    def columns_written(self) -> tp.Collection[str] | None:
+        return (self._result,)
 
     @staticmethod
     def haversine(lon1: float, lat1: float, lon2: float, lat2: float) -> float:
@@ -18,6 +18,42 @@ class StringEnum(str, enum.Enum):
     __repr__ = __str__
 
 
+def order_prefix(order: tuple[str, ...], columns: tp.Container[str], inside: bool = True) -> tuple[str, ...]:
+    """Longest prefix of sort order which consists of columns from container (or not from it if inside is False)"""
+    for index, column in enumerate(order):
+        if (column in columns) != inside:
+            return order[:index]
+    return order
+
+
+class FrozenList(tuple):  # type: ignore[type-arg]
+    """Hashable stand-in of list value of key: equal only to stand-ins of equal lists, ordered as lists are"""
+
+    __slots__ = ()
+
+    def __eq__(self, other: object) -> bool:
+        return type(other) is FrozenList and tuple.__eq__(self, other)
+
+    def __ne__(self, other: object) -> bool:
+        return not self == other
+
+    def __hash__(self) -> int:
+        return hash((FrozenList, tuple(self)))
+
+
+def _freeze(value: tp.Any) -> tp.Any:
+    if isinstance(value, list):
+        return FrozenList(map(_freeze, value))
+    return value
+
+
+def group_key(row: TRow, keys: tp.Sequence[str]) -> tuple[tp.Any, ...]:
+    """Values of keys of row to group rows in hash tables by, lists are replaced with FrozenList;
+    values of other unhashable types are left as is, so hashing of such key raises TypeError
+    """
+    return tuple([_freeze(value) if isinstance(value, list) else value for value in map(row.__getitem__, keys)])
+
+
 def get_valid_date(time: tp.Any, time_format: str) -> datetime:
     try:
         return datetime.strptime(time, time_format)
@@ -27,6 +63,7 @@ def get_valid_date(time: tp.Any, time_format: str) -> datetime:
 
 class Columns(StringEnum):
     count = "count"  # type: ignore
+    enter_micros = "enter_micros"
     fraction = "fraction"
     frequency = "frequency"
     frequency_all = "frequency_all"
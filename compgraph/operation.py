@@ -1,11 +1,17 @@
 import abc
+import mmap
+import os
 import typing as tp
 from abc import ABC
 from itertools import groupby
 
+from compgraph.misc import order_prefix
 from compgraph.misc import TRow
 from compgraph.misc import TRowsGenerator
 from compgraph.misc import TRowsIterable
+from compgraph.record import select_columns
+
+RELEASE_BYTES = 4 * 2**20
 
 
 class Operation(ABC):
@@ -15,21 +21,64 @@ class Operation(ABC):
     ) -> TRowsGenerator:
         pass
 
+    def output_order(self, input_order: tuple[str, ...]) -> tuple[str, ...]:
+        """Columns output rows are known to be sorted by
+        :param input_order: columns input rows are known to be sorted by
+        """
+        return ()
+
 
 class Read(Operation):
     def __init__(
-        self, filename: str, parser: tp.Callable[[str], TRowsGenerator]
+        self,
+        filename: str,
+        parser: tp.Callable[[tp.Any], TRowsGenerator],
+        binary: bool = False,
     ) -> None:
+        """
+        :param filename: filename to read from
+        :param parser: parser from line to rows
+        :param binary: pass lines to parser as memoryview slices of memory-mapped file instead of decoded
+            strings; slice is valid only until parser returns, so parser must copy what it keeps
+        """
         self._filename = filename
         self._parser = parser
+        self._binary = binary
 
     def __call__(self, *args: tp.Any, **kwargs: tp.Any) -> TRowsGenerator:
+        if self._binary:
+            yield from self._read_binary()
+            return
         with open(self._filename) as f:
             for line in f:
                 row = self._parser(line)
                 # stupid mypy thinks that it's never gonna happen
                 yield from row
 
+    def _read_binary(self) -> TRowsGenerator:
+        with open(self._filename, "rb") as f:
+            if os.fstat(f.fileno()).st_size == 0:  # empty file can't be mapped
+                return
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                if hasattr(mmap, "MADV_SEQUENTIAL"):
+                    mapped.madvise(mmap.MADV_SEQUENTIAL)
+                parser = self._parser
+                size = len(mapped)
+                released = position = 0
+                with memoryview(mapped) as view:
+                    while position < size:
+                        end = mapped.find(b"\n", position)
+                        end = size if end < 0 else end + 1
+                        # slice shares memory of map, it is released before map is closed
+                        with view[position:end] as line:
+                            yield from parser(line)
+                        position = end
+                        # pages of file which are read already stay in page cache but leave process memory
+                        if position - released >= RELEASE_BYTES and hasattr(mmap, "MADV_DONTNEED"):
+                            page_start = position // mmap.PAGESIZE * mmap.PAGESIZE
+                            mapped.madvise(mmap.MADV_DONTNEED, released, page_start - released)
+                            released = page_start
+
 
 class ReadIterFactory(Operation):
     def __init__(self, name: str) -> None:
@@ -53,11 +102,52 @@ class Mapper(ABC):
         """
         pass
 
+    def columns_read(self) -> tp.Collection[str] | None:
+        """Columns the mapper reads, None if unknown"""
+        return None
+
+    def columns_written(self) -> tp.Collection[str] | None:
+        """Columns the mapper adds or changes, other columns are passed as is. None if unknown"""
+        return None
+
+    def output_order(self, input_order: tuple[str, ...]) -> tuple[str, ...]:
+        """Columns output rows are known to be sorted by; mappers keep order of columns they don't change
+        :param input_order: columns input rows are known to be sorted by
+        """
+        written = self.columns_written()
+        if written is None:
+            return ()
+        return order_prefix(input_order, written, inside=False)
+
+
+class RowMapper(Mapper):
+    """Base class for mappers which yield at most one row for every row passed"""
+
+    @abc.abstractmethod
+    def apply(self, row: TRow) -> TRow | None:
+        """
+        :param row: one table row
+        :return: resulting row or None to drop it
+        """
+        pass
+
+    def __call__(self, row: TRow) -> TRowsGenerator:
+        result = self.apply(row)
+        if result is not None:
+            yield result
+
 
 class Map(Operation):
     def __init__(self, mapper: Mapper) -> None:
         self._mapper = mapper
 
+    @property
+    def mapper(self) -> Mapper:
+        return self._mapper
+
+    def output_order(self, input_order: tuple[str, ...]) -> tuple[str, ...]:
+        return self._mapper.output_order(input_order)
+
     def __call__(
         self, rows: TRowsIterable, *args: tp.Any, **kwargs: tp.Any
     ) -> TRowsGenerator:
@@ -65,6 +155,66 @@ class Map(Operation):
             yield from self._mapper(row)
 
 
+class FusedMap(Operation):
+    """Apply a chain of mappers in a single pass, row mappers are called without generators"""
+
+    def __init__(self, mappers: tp.Sequence[Mapper]) -> None:
+        self._mappers = tuple(mappers)
+        head = 0
+        while head < len(self._mappers) and isinstance(self._mappers[head], RowMapper):
+            head += 1
+        self._head = [tp.cast(RowMapper, mapper).apply for mapper in self._mappers[:head]]
+        self._tail = head
+
+    @property
+    def mappers(self) -> tuple[Mapper, ...]:
+        return self._mappers
+
+    def output_order(self, input_order: tuple[str, ...]) -> tuple[str, ...]:
+        for mapper in self._mappers:
+            input_order = mapper.output_order(input_order)
+        return input_order
+
+    def __call__(
+        self, rows: TRowsIterable, *args: tp.Any, **kwargs: tp.Any
+    ) -> TRowsGenerator:
+        head = self._head
+        if self._tail == len(self._mappers):
+            for row in rows:
+                for apply in head:
+                    row = apply(row)
+                    if row is None:
+                        break
+                else:
+                    yield row
+            return
+
+        for row in rows:
+            for apply in head:
+                row = apply(row)
+                if row is None:
+                    break
+            else:
+                yield from self._apply(row, self._tail)
+
+    def _apply(self, row: TRow, start: int) -> TRowsGenerator:
+        for index in range(start, len(self._mappers)):
+            mapper = self._mappers[index]
+            if isinstance(mapper, RowMapper):
+                result = mapper.apply(row)
+                if result is None:
+                    return
+                row = result
+            elif index + 1 == len(self._mappers):
+                yield from mapper(row)
+                return
+            else:
+                for result in mapper(row):
+                    yield from self._apply(result, index + 1)
+                return
+        yield row
+
+
 class Reducer(ABC):
     """Base class for reducers"""
 
@@ -77,12 +227,73 @@ class Reducer(ABC):
         """
         pass
 
+    def columns_read(self) -> tp.Collection[str] | None:
+        """Columns besides group keys the reducer reads.
+        None if unknown or if input columns may be passed to output
+        """
+        return None
+
+
+class CombinableReducer(Reducer):
+    """
+    Base class for reducers which accumulate rows of a group into a state.
+    States of parts of a group may be merged, so such reducers don't need sorted input
+    and may aggregate a group piece by piece.
+    """
+
+    @abc.abstractmethod
+    def start(self) -> tp.Any:
+        """Return state of empty group"""
+        pass
+
+    @abc.abstractmethod
+    def add(self, state: tp.Any, row: TRow) -> tp.Any:
+        """Return state with row accounted, state may be changed in place"""
+        pass
+
+    @abc.abstractmethod
+    def merge(self, state: tp.Any, other: tp.Any) -> tp.Any:
+        """Return state of rows of both states, other state goes after rows of state"""
+        pass
+
+    @abc.abstractmethod
+    def finish(self, key_values: TRow, state: tp.Any) -> TRowsGenerator:
+        """
+        :param key_values: values of group keys
+        :param state: state of all group rows
+        """
+        pass
+
+    def __call__(
+        self, group_key: tuple[str, ...], rows: TRowsIterable
+    ) -> TRowsGenerator:
+        state = self.start()
+        key_values: TRow | None = None
+        for row in rows:
+            if key_values is None:
+                key_values = select_columns(row, group_key)
+            state = self.add(state, row)
+        if key_values is not None:
+            yield from self.finish(key_values, state)
+
 
 class Reduce(Operation):
     def __init__(self, reducer: Reducer, keys: tp.Sequence[str]) -> None:
         self._reducer = reducer
         self._keys = tuple(keys)
 
+    @property
+    def reducer(self) -> Reducer:
+        return self._reducer
+
+    @property
+    def keys(self) -> tuple[str, ...]:
+        return self._keys
+
+    def output_order(self, input_order: tuple[str, ...]) -> tuple[str, ...]:
+        # groups go in input order and keep values of group keys
+        return order_prefix(input_order, self._keys)
+
     def __call__(
         self, rows: TRowsIterable, *args: tp.Any, **kwargs: tp.Any
     ) -> TRowsGenerator:
@@ -93,11 +304,17 @@ class Reduce(Operation):
 # Dummy operators
 
 
-class DummyMapper(Mapper):
+class DummyMapper(RowMapper):
     """Yield exactly the row passed"""
 
-    def __call__(self, row: TRow) -> TRowsGenerator:
-        yield row
+    def apply(self, row: TRow) -> TRow | None:
+        return row
+
+    def columns_read(self) -> tp.Collection[str] | None:
+        return ()
+
+    def columns_written(self) -> tp.Collection[str] | None:
+        return ()
 
 
 class FirstReducer(Reducer):
@@ -1,3 +1,10 @@
+from compgraph.async_source import ReadAsyncIter
+from compgraph.cache import Cache
+from compgraph.cache import CacheLevel
+from compgraph.hash_aggregate import HashReduce
+from compgraph.hash_aggregate import ReduceStrategy
+from compgraph.hash_join import HashJoin
+from compgraph.hash_join import JoinStrategy
 from compgraph.joiner import InnerJoiner
 from compgraph.joiner import Join
 from compgraph.joiner import Joiner
@@ -10,11 +17,14 @@ from compgraph.mapper import LowerCase
 from compgraph.mapper import Product
 from compgraph.mapper import Project
 from compgraph.mapper import Split
+from compgraph.mapper import Tokenize
 from compgraph.misc import TRow
 from compgraph.misc import TRowsGenerator
 from compgraph.misc import TRowsIterable
+from compgraph.operation import CombinableReducer
 from compgraph.operation import DummyMapper
 from compgraph.operation import FirstReducer
+from compgraph.operation import FusedMap
 from compgraph.operation import Map
 from compgraph.operation import Mapper
 from compgraph.operation import Operation
@@ -22,12 +32,21 @@ from compgraph.operation import Read
 from compgraph.operation import ReadIterFactory
 from compgraph.operation import Reduce
 from compgraph.operation import Reducer
+from compgraph.operation import RowMapper
+from compgraph.parallel import ParallelMap
 from compgraph.reducer import Count
 from compgraph.reducer import Sum
 from compgraph.reducer import TermFrequency
 from compgraph.reducer import TopN
 
 __all__ = [
+    "ReadAsyncIter",
+    "Cache",
+    "CacheLevel",
+    "HashReduce",
+    "ReduceStrategy",
+    "HashJoin",
+    "JoinStrategy",
     "InnerJoiner",
     "Join",
     "Joiner",
@@ -40,11 +59,14 @@ __all__ = [
     "Product",
     "Project",
     "Split",
+    "Tokenize",
     "TRow",
     "TRowsGenerator",
     "TRowsIterable",
+    "CombinableReducer",
     "DummyMapper",
     "FirstReducer",
+    "FusedMap",
     "Map",
     "Mapper",
     "Operation",
@@ -52,6 +74,8 @@ __all__ = [
     "ReadIterFactory",
     "Reduce",
     "Reducer",
+    "RowMapper",
+    "ParallelMap",
     "Count",
     "Sum",
     "TermFrequency",
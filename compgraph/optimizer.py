@@ -0,0 +1,362 @@
+"""
+Rule-based rewriting of graph operations before execution.
+
+Operations are handled in execution order (source first). Rules:
+    * filters move ahead of sorts, of mappers not touching their columns and of joins on their columns;
+      projections move ahead of sorts by their columns
+    * sorts right before parallel reduce by prefix of their keys are done by reduce workers
+    * automatically chosen hash aggregation and parallel reduce are replaced with streaming reduce
+      for rows sorted by keys
+    * sorts of rows which are already sorted by the same keys are removed
+    * rows of combinable reducers are pre-aggregated before sorting
+    * columns which are not read downstream are dropped before rows are sent to sorting or reducing processes
+      and are not decoded by columnar sources
+    * in batch mode consecutive maps supporting record batches are applied to batches
+    * consecutive maps are fused into a single pass
+Filters are moved only if they declare columns they read.
+"""
+import typing as tp
+from copy import copy
+
+from compgraph.columnar import BatchMap
+from compgraph.columnar import BatchMapper
+from compgraph.columnar import supports_batches
+from compgraph.columnar_format import ReadColumnar
+from compgraph.external_sort import ExternalSort
+from compgraph.hash_aggregate import Combine
+from compgraph.hash_aggregate import HashReduce
+from compgraph.hash_aggregate import MergeStates
+from compgraph.incremental import IncrementalReduce
+from compgraph.joiner import Join
+from compgraph.mapper import Filter
+from compgraph.mapper import Project
+from compgraph.misc import order_prefix
+from compgraph.misc import TRow
+from compgraph.operation import CombinableReducer
+from compgraph.operation import FusedMap
+from compgraph.operation import Map
+from compgraph.operation import Mapper
+from compgraph.operation import Operation
+from compgraph.operation import Reduce
+from compgraph.operation import RowMapper
+from compgraph.parallel import ParallelMap
+from compgraph.parallel import ParallelReduce
+from compgraph.pipeline import Pipelined
+from compgraph.record import select_columns
+
+if tp.TYPE_CHECKING:
+    from compgraph.graph import Graph
+
+
+class PruneColumns(RowMapper):
+    """Leave only mentioned columns which are present in row, keeps columns order"""
+
+    def __init__(self, columns: tp.Collection[str]) -> None:
+        """
+        :param columns: names of columns to keep
+        """
+        self._columns = frozenset(columns)
+
+    def apply(self, row: TRow) -> TRow | None:
+        return select_columns(row, self._columns)
+
+    def columns_read(self) -> tp.Collection[str] | None:
+        return self._columns
+
+    def output_order(self, input_order: tuple[str, ...]) -> tuple[str, ...]:
+        return order_prefix(input_order, self._columns)
+
+
+def optimize(graph: "Graph", notes: list[str] | None = None, batch_size: int | None = None) -> "Graph":
+    """Return graph equivalent to passed one with rewritten operations, passed graph is not changed
+    :param graph: graph to optimize
+    :param notes: list to append descriptions of removed operations to
+    :param batch_size: number of rows in record batches, None to map rows one by one
+    """
+    if not graph._operations:
+        return graph
+
+    steps = graph._operations[::-1]
+    joins = graph._join_params[::-1]
+    steps, joins = push_down_filters(steps, joins)
+    steps = absorb_sorts(steps)
+    steps = choose_reduce_strategies(steps)
+    steps = remove_redundant_sorts(steps, notes)
+    steps = add_combiners(steps)
+    steps = prune_columns(steps)
+    if batch_size is not None:
+        steps = vectorize_maps(steps, batch_size)
+    steps = fuse_maps(steps)
+
+    result = copy(graph)
+    result._operations = steps[::-1]
+    result._join_params = [optimize(join, notes, batch_size) for join in joins][::-1]
+    return result
+
+
+def describe(step: Operation) -> str:
+    """Short human-readable description of operation"""
+    if isinstance(step, BatchMap):
+        return "BatchMap(" + ", ".join(type(mapper).__name__ for mapper in step.mappers) + ")"
+    if isinstance(step, FusedMap):
+        return "Map(" + ", ".join(type(mapper).__name__ for mapper in step.mappers) + ")"
+    if isinstance(step, Map):
+        return f"Map({type(step.mapper).__name__})"
+    if isinstance(step, ParallelMap):
+        return f"ParallelMap({type(step.mapper).__name__}, workers={step.workers}, ordered={step.ordered})"
+    if isinstance(step, (Reduce, HashReduce, Combine, ParallelReduce, IncrementalReduce)):
+        return f"{type(step).__name__}({type(step.reducer).__name__}, keys={list(step.keys)})"
+    if isinstance(step, Join):
+        return f"{type(step).__name__}({type(step.joiner).__name__}, keys={list(step.keys)})"
+    if isinstance(step, ExternalSort):
+        return f"ExternalSort(keys={list(step.keys)})"
+    if isinstance(step, Pipelined):
+        return "Pipelined(" + " | ".join(", ".join(map(describe, stage)) for stage in step.stages) + ")"
+    return type(step).__name__
+
+
+def explain(graph: "Graph", batch_size: int | None = None) -> str:
+    """Describe optimized graph: operations in execution order with the order their output is sorted by,
+    join subgraphs are indented under their joins, removed operations are listed at the end
+    """
+    notes: list[str] = []
+    lines: list[str] = []
+
+    def walk(plan: "Graph", indent: str) -> None:
+        joins = plan._join_params[::-1]
+        order: tuple[str, ...] = ()
+        for step in plan._operations[::-1]:
+            order = step.output_order(order)
+            sorted_by = f"  sorted by {list(order)}" if order else ""
+            lines.append(f"{indent}{describe(step)}{sorted_by}")
+            if isinstance(step, Join):
+                walk(joins.pop(0), indent + "    ")
+
+    walk(optimize(graph, notes, batch_size), "")
+    return "\n".join(lines + notes)
+
+
+def absorb_sorts(steps: list[Operation]) -> list[Operation]:
+    """Let ParallelReduce sort partitions by keys of sort right before it instead of sorting all rows"""
+    result: list[Operation] = []
+    for step in steps:
+        previous = result[-1] if result else None
+        if (
+            isinstance(step, ParallelReduce)
+            and isinstance(previous, ExternalSort)
+            and previous.keys[: len(step.keys)] == step.keys
+        ):
+            result[-1] = step.with_reducer(step.reducer, previous.keys)
+            continue
+        result.append(step)
+    return result
+
+
+def choose_reduce_strategies(steps: list[Operation]) -> list[Operation]:
+    """Use streaming Reduce instead of automatically chosen HashReduce or ParallelReduce when rows are
+    sorted by keys"""
+    result: list[Operation] = []
+    order: tuple[str, ...] = ()
+    for step in steps:
+        if isinstance(step, HashReduce) and step.auto and step.keys == order[: len(step.keys)]:
+            step = Reduce(step.reducer, step.keys)
+        if isinstance(step, ParallelReduce) and step.sort_keys == order[: len(step.sort_keys)]:
+            step = Reduce(step.reducer, step.keys)
+        order = step.output_order(order)
+        result.append(step)
+    return result
+
+
+def remove_redundant_sorts(steps: list[Operation], notes: list[str] | None = None) -> list[Operation]:
+    """Remove sorts by keys which are a prefix of order rows are already sorted by"""
+    result: list[Operation] = []
+    order: tuple[str, ...] = ()
+    for step in steps:
+        if isinstance(step, ExternalSort) and step.keys == order[: len(step.keys)]:
+            if notes is not None:
+                previous = describe(result[-1])
+                notes.append(f"removed {describe(step)} after {previous}: rows are sorted by {list(order)}")
+            continue
+        order = step.output_order(order)
+        result.append(step)
+    return result
+
+
+def _mapper(step: Operation) -> Mapper | None:
+    return step.mapper if isinstance(step, Map) else None
+
+
+def _can_swap(mapper: Mapper, previous: Operation) -> bool:
+    """Whether mapper may be applied before previous operation"""
+    if isinstance(previous, ExternalSort):
+        if isinstance(mapper, Filter):
+            # condition of filter without declared columns may depend on order of rows
+            return mapper.columns_read() is not None
+        return isinstance(mapper, Project) and set(previous.keys) <= set(mapper.columns_read() or ())
+
+    previous_mapper = _mapper(previous)
+    if not isinstance(mapper, Filter) or previous_mapper is None or isinstance(previous_mapper, Filter):
+        return False
+    columns = mapper.columns_read()
+    if columns is None:
+        return False
+    if isinstance(previous_mapper, Project):
+        return set(columns) <= set(previous_mapper.columns_read() or ())
+    written = previous_mapper.columns_written()
+    return written is not None and not set(columns) & set(written)
+
+
+def push_down_filters(
+    steps: list[Operation], joins: list["Graph"]
+) -> tuple[list[Operation], list["Graph"]]:
+    """Move filters and projections closer to source"""
+    steps = list(steps)
+    joins = list(joins)
+    changed = True
+    while changed:
+        changed = False
+        for index in range(2, len(steps)):
+            mapper = _mapper(steps[index])
+            if not isinstance(mapper, (Filter, Project)):
+                continue
+            previous = steps[index - 1]
+            if _can_swap(mapper, previous):
+                steps[index - 1], steps[index] = steps[index], previous
+                changed = True
+            elif (
+                isinstance(previous, Join)
+                and isinstance(mapper, Filter)
+                and mapper.columns_read()
+                and set(mapper.columns_read() or ()) <= set(previous.keys)
+            ):
+                # join keys are never renamed, so rows of both sides may be filtered by them
+                join_index = sum(isinstance(step, Join) for step in steps[: index - 1])
+                joins[join_index] = copy(joins[join_index]).map(mapper)
+                steps[index - 1], steps[index] = steps[index], previous
+                changed = True
+    return steps, joins
+
+
+def _required_before(step: Operation, required: set[str] | None) -> set[str] | None:
+    """Columns of input rows that step needs to produce required columns, None means all columns"""
+    mapper = _mapper(step)
+    if isinstance(mapper, (Project, PruneColumns)):
+        return set(mapper.columns_read() or ())
+    if mapper is not None:
+        read = mapper.columns_read()
+        written = mapper.columns_written()
+        if required is None or read is None or written is None:
+            return None
+        return (required - set(written)) | set(read)
+    if isinstance(step, (Reduce, HashReduce, Combine, ParallelReduce, IncrementalReduce)):
+        read = step.reducer.columns_read()
+        if read is None:
+            return None
+        if isinstance(step, ParallelReduce):
+            return set(step.sort_keys) | set(read)
+        return set(step.keys) | set(read)
+    if isinstance(step, ExternalSort) and required is not None:
+        return required | set(step.keys)
+    return None
+
+
+def add_combiners(steps: list[Operation]) -> list[Operation]:
+    """Pre-aggregate rows with Combine before sort followed by reduce with CombinableReducer by the same keys
+    and before ParallelReduce with CombinableReducer"""
+    steps = list(steps)
+    result: list[Operation] = []
+    for index, step in enumerate(steps):
+        following = steps[index + 1] if index + 1 < len(steps) else None
+        if (
+            isinstance(step, ExternalSort)
+            and isinstance(following, Reduce)
+            and isinstance(following.reducer, CombinableReducer)
+            and following.keys == step.keys
+            and step.keys
+        ):
+            result.append(Combine(following.reducer, following.keys))
+            result.append(step)
+            steps[index + 1] = Reduce(MergeStates(following.reducer), following.keys)
+            continue
+        if (
+            isinstance(step, ParallelReduce)
+            and isinstance(step.reducer, CombinableReducer)
+            and step.sort_keys == step.keys
+        ):
+            result.append(Combine(step.reducer, step.keys))
+            result.append(step.with_reducer(MergeStates(step.reducer)))
+            continue
+        result.append(step)
+    return result
+
+
+def prune_columns(steps: list[Operation]) -> list[Operation]:
+    """Drop columns which are not read downstream before rows are sent to other processes"""
+    result: list[Operation] = []
+    required: set[str] | None = None
+    for index in range(len(steps) - 1, 0, -1):
+        step = steps[index]
+        result.append(step)
+        required = _required_before(step, required)
+        # rows of Combine have only keys and state
+        if (
+            isinstance(step, (ExternalSort, ParallelReduce))
+            and required is not None
+            and not isinstance(steps[index - 1], Combine)
+        ):
+            previous = _mapper(steps[index - 1])
+            if not (
+                isinstance(previous, (Project, PruneColumns))
+                and set(previous.columns_read() or ()) <= required
+            ):
+                result.append(Map(PruneColumns(required)))
+    source = steps[0]
+    if isinstance(source, ReadColumnar) and required is not None:
+        source = source.with_columns(required)
+    result.append(source)
+    return result[::-1]
+
+
+def vectorize_maps(steps: list[Operation], batch_size: int) -> list[Operation]:
+    """Replace runs of consecutive maps supporting record batches with single BatchMap"""
+    result: list[Operation] = []
+    chain: list[BatchMapper] = []
+
+    def flush() -> None:
+        if chain:
+            result.append(BatchMap(chain, batch_size))
+        chain.clear()
+
+    for step in steps:
+        mapper = _mapper(step)
+        if mapper is not None and supports_batches(mapper):
+            chain.append(tp.cast(BatchMapper, mapper))
+        else:
+            flush()
+            result.append(step)
+    flush()
+    return result
+
+
+def fuse_maps(steps: list[Operation]) -> list[Operation]:
+    """Replace runs of consecutive maps with single FusedMap"""
+    result: list[Operation] = []
+    chain: list[Mapper] = []
+
+    def flush() -> None:
+        if len(chain) == 1 and not isinstance(chain[0], RowMapper):
+            result.append(Map(chain[0]))
+        elif chain:
+            result.append(FusedMap(chain))
+        chain.clear()
+
+    for step in steps:
+        if isinstance(step, Map):
+            chain.append(step.mapper)
+        elif isinstance(step, FusedMap):
+            chain.extend(step.mappers)
+        else:
+            flush()
+            result.append(step)
+    flush()
+    return result
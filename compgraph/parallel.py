@@ -0,0 +1,388 @@
+import heapq
+import locale
+import os
+import shutil
+import tempfile
+import typing as tp
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED
+from concurrent.futures import Future
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures import wait
+from itertools import groupby
+from itertools import islice
+from multiprocessing import connection
+from multiprocessing import Pipe
+from multiprocessing import Process
+from operator import itemgetter
+
+from compgraph.misc import group_key
+from compgraph.misc import order_prefix
+from compgraph.misc import TRow
+from compgraph.misc import TRowsGenerator
+from compgraph.misc import TRowsIterable
+from compgraph.operation import Mapper
+from compgraph.operation import Operation
+from compgraph.operation import Reducer
+from compgraph.transport import BatchSender
+from compgraph.transport import DEFAULT_BATCH_SIZE
+from compgraph.transport import recv_rows
+
+DEFAULT_CHUNK_SIZE = 1024
+DEFAULT_RANGE_BYTES = 8 * 2**20
+CHUNKS_PER_WORKER = 2
+
+# mapper or parser of worker process
+_worker_function: tp.Callable[..., TRowsGenerator] | None = None
+
+
+def _init_worker(function: tp.Callable[..., TRowsGenerator]) -> None:
+    """Keep function in worker process, so that it is pickled once per worker instead of once per task"""
+    global _worker_function
+    _worker_function = function
+
+
+def _map_chunk(rows: list[TRow]) -> list[TRow]:
+    mapper = _worker_function
+    assert mapper is not None, "worker is not initialized"
+    return [result for row in rows for result in mapper(row)]
+
+
+def _read_range(filename: str, start: int, end: int, encoding: str | None) -> list[TRow]:
+    """Parse lines which start in byte range [start, end) of file, None encoding means parse bytes"""
+    parser = _worker_function
+    assert parser is not None, "worker is not initialized"
+    result: list[TRow] = []
+    with open(filename, "rb") as f:
+        if start > 0:
+            # skip the line started in previous range, if range starts right after newline it is empty
+            f.seek(start - 1)
+            f.readline()
+        position = f.tell()
+        while position < end:
+            line = f.readline()
+            if not line:
+                break
+            position += len(line)
+            if encoding is None:
+                result.extend(parser(line))
+                continue
+            text = line.decode(encoding)
+            if "\r" not in text:
+                result.extend(parser(text))
+                continue
+            for text_line in _universal_lines(text):
+                result.extend(parser(text_line))
+    return result
+
+
+def _universal_lines(text: str) -> list[str]:
+    """Split text ending with "\n" or at the end of file as text mode does with universal newlines:
+    "\r\n" and lone "\r" end lines too, all line endings are turned into "\n"
+    """
+    lines = text.replace("\r\n", "\n").replace("\r", "\n").split("\n")
+    last = lines.pop()
+    result = [line + "\n" for line in lines]
+    if last:
+        result.append(last)
+    return result
+
+
+def _run_in_pool(
+    workers: int,
+    function: tp.Callable[..., TRowsGenerator],
+    task: tp.Callable[..., list[TRow]],
+    arguments: tp.Iterator[tuple[tp.Any, ...]],
+    ordered: bool,
+) -> tp.Generator[list[TRow], None, None]:
+    """
+    Run task with every arguments in a pool of worker processes keeping function, yield results.
+    At most CHUNKS_PER_WORKER tasks per worker are in flight, so arguments are taken only as fast
+    as workers process them.
+    :param ordered: yield results in order of arguments, otherwise as soon as they are ready
+    """
+    max_pending = workers * CHUNKS_PER_WORKER
+    executor = ProcessPoolExecutor(workers, initializer=_init_worker, initargs=(function,))
+    pending: deque[Future[list[TRow]]] = deque()
+    try:
+        input_ended = False
+        while True:
+            while not input_ended and len(pending) < max_pending:
+                args = next(arguments, None)
+                if args is None:
+                    input_ended = True
+                else:
+                    pending.append(executor.submit(task, *args))
+            if not pending:
+                return
+            if ordered:
+                yield pending.popleft().result()
+                continue
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                pending.remove(future)
+                yield future.result()
+    finally:
+        executor.shutdown(wait=True, cancel_futures=True)
+
+
+def resolve_workers(workers: int | None) -> int:
+    """Number of worker processes to use, None means number of CPUs"""
+    if workers is None:
+        return os.cpu_count() or 1
+    if workers < 1:
+        raise ValueError(f"number of workers must be positive, got {workers}")
+    return workers
+
+
+class ParallelMap(Operation):
+    """
+    Map which applies mapper in a pool of worker processes. Rows are sent to workers by chunks,
+    at most CHUNKS_PER_WORKER chunks per worker are in flight, so input is read only as fast
+    as workers process it. Mapper must be picklable.
+    """
+
+    def __init__(
+        self,
+        mapper: Mapper,
+        workers: int | None = None,
+        chunk_size: int = DEFAULT_CHUNK_SIZE,
+        ordered: bool = True,
+    ) -> None:
+        """
+        :param mapper: mapper to use
+        :param workers: number of worker processes, number of CPUs by default
+        :param chunk_size: number of rows sent to worker at once
+        :param ordered: yield rows in input order, otherwise chunks are yielded as soon as they are ready
+        """
+        if chunk_size < 1:
+            raise ValueError(f"chunk size must be positive, got {chunk_size}")
+        self._mapper = mapper
+        self._workers = resolve_workers(workers)
+        self._chunk_size = chunk_size
+        self._ordered = ordered
+
+    @property
+    def mapper(self) -> Mapper:
+        return self._mapper
+
+    @property
+    def workers(self) -> int:
+        return self._workers
+
+    @property
+    def ordered(self) -> bool:
+        return self._ordered
+
+    def output_order(self, input_order: tuple[str, ...]) -> tuple[str, ...]:
+        if not self._ordered:
+            return ()
+        return self._mapper.output_order(input_order)
+
+    def __call__(
+        self, rows: TRowsIterable, *args: tp.Any, **kwargs: tp.Any
+    ) -> TRowsGenerator:
+        chunks = self._chunks(iter(rows))
+        for result in _run_in_pool(self._workers, self._mapper, _map_chunk, chunks, self._ordered):
+            yield from result
+
+    def _chunks(self, rows: tp.Iterator[TRow]) -> tp.Iterator[tuple[list[TRow]]]:
+        while chunk := list(islice(rows, self._chunk_size)):
+            yield (chunk,)
+
+
+class ParallelRead(Operation):
+    """
+    Read which parses file in a pool of worker processes. File is split into byte ranges, every line
+    belongs to the range it starts in, and worker parses all lines of range at once.
+    At most CHUNKS_PER_WORKER ranges per worker are in flight. Parser must be picklable.
+    Lines are decoded with locale encoding and split as in text mode with universal newlines: "\\r\\n"
+    and "\\r" end lines too and are turned into "\\n"; in binary mode parser gets lines ending with "\\n" as bytes.
+    """
+
+    def __init__(
+        self,
+        filename: str,
+        parser: tp.Callable[[tp.Any], TRowsGenerator],
+        workers: int | None = None,
+        ordered: bool = True,
+        range_bytes: int = DEFAULT_RANGE_BYTES,
+        binary: bool = False,
+    ) -> None:
+        """
+        :param filename: filename to read from
+        :param parser: parser from line to rows
+        :param workers: number of worker processes, number of CPUs by default
+        :param ordered: yield rows in file order, otherwise ranges are yielded as soon as they are parsed
+        :param range_bytes: size of byte range parsed by worker at once
+        :param binary: pass lines to parser as bytes instead of decoded strings
+        """
+        if range_bytes < 1:
+            raise ValueError(f"range size must be positive, got {range_bytes}")
+        self._filename = filename
+        self._parser = parser
+        self._workers = resolve_workers(workers)
+        self._ordered = ordered
+        self._range_bytes = range_bytes
+        self._binary = binary
+
+    @property
+    def workers(self) -> int:
+        return self._workers
+
+    def __call__(self, *args: tp.Any, **kwargs: tp.Any) -> TRowsGenerator:
+        size = os.path.getsize(self._filename)
+        encoding = None if self._binary else locale.getpreferredencoding(False)
+        ranges = (
+            (self._filename, start, min(start + self._range_bytes, size), encoding)
+            for start in range(0, size, self._range_bytes)
+        )
+        for result in _run_in_pool(self._workers, self._parser, _read_range, ranges, self._ordered):
+            yield from result
+
+
+def do_sort_reduce(
+    endpoint: connection.Connection,
+    reducer: Reducer,
+    keys: tuple[str, ...],
+    sort_keys: tuple[str, ...],
+    memory_limit: int,
+    tmp_dir: str,
+    batch_size: int = DEFAULT_BATCH_SIZE,
+) -> None:
+    """Sort partition received from endpoint, reduce it and send back pairs of group key and result row"""
+    # external_sort imports operations, which import this module
+    from compgraph.external_sort import sort_received
+
+    get_key = itemgetter(*keys)
+    sender = BatchSender(endpoint, batch_size)
+    for key, group in groupby(sort_received(endpoint, sort_keys, memory_limit, tmp_dir), key=get_key):
+        for row in reducer(keys, group):
+            sender.send((key, row))  # type: ignore[arg-type]
+    sender.close()
+
+
+class ParallelReduce(Operation):
+    """
+    Sort and reduce in a pool of worker processes. Rows are distributed between workers by hash of keys,
+    so every group is reduced by a single worker, every worker sorts its partition by sort keys
+    and reduces it, and sorted results of workers are merged by keys.
+    Input needn't be sorted, result is the same as of sorting by sort keys followed by Reduce.
+    Lists in keys are hashed as FrozenList, rows of keys which can't be hashed are reduced by the first worker.
+    """
+
+    def __init__(
+        self,
+        reducer: Reducer,
+        keys: tp.Sequence[str],
+        workers: int | None = None,
+        sort_keys: tp.Sequence[str] | None = None,
+        memory_limit: int | None = None,
+        tmp_dir: str | None = None,
+        batch_size: int = DEFAULT_BATCH_SIZE,
+    ) -> None:
+        """
+        :param reducer: reducer to use
+        :param keys: keys for grouping, at least one
+        :param workers: number of worker processes, number of CPUs by default
+        :param sort_keys: keys to sort partitions by, keys should be their prefix; keys by default
+        :param memory_limit: approximate budget in bytes of serialized rows held by each worker,
+            the same as of ExternalSort by default
+        :param tmp_dir: directory for sorted runs, system temp dir by default
+        :param batch_size: maximal number of rows sent between processes in one message
+        """
+        self._keys = tuple(keys)
+        self._sort_keys = self._keys if sort_keys is None else tuple(sort_keys)
+        if not self._keys or self._sort_keys[: len(self._keys)] != self._keys:
+            raise ValueError(f"keys {list(self._keys)} must be a non-empty prefix of {list(self._sort_keys)}")
+        self._reducer = reducer
+        self._workers = resolve_workers(workers)
+        if memory_limit is None:
+            from compgraph.external_sort import DEFAULT_MEMORY_LIMIT
+
+            memory_limit = DEFAULT_MEMORY_LIMIT
+        self._memory_limit = memory_limit
+        self._tmp_dir = tmp_dir
+        self._batch_size = batch_size
+
+    @property
+    def reducer(self) -> Reducer:
+        return self._reducer
+
+    @property
+    def keys(self) -> tuple[str, ...]:
+        return self._keys
+
+    @property
+    def sort_keys(self) -> tuple[str, ...]:
+        return self._sort_keys
+
+    @property
+    def workers(self) -> int:
+        return self._workers
+
+    def with_reducer(self, reducer: Reducer, sort_keys: tp.Sequence[str] | None = None) -> "ParallelReduce":
+        """Same operation with another reducer and sort keys"""
+        return ParallelReduce(
+            reducer,
+            self._keys,
+            self._workers,
+            self._sort_keys if sort_keys is None else sort_keys,
+            self._memory_limit,
+            self._tmp_dir,
+            self._batch_size,
+        )
+
+    def output_order(self, input_order: tuple[str, ...]) -> tuple[str, ...]:
+        return order_prefix(self._sort_keys, self._keys)
+
+    def __call__(
+        self, rows: TRowsIterable, *args: tp.Any, **kwargs: tp.Any
+    ) -> TRowsGenerator:
+        run_dir = tempfile.mkdtemp(prefix="compgraph-reduce-", dir=self._tmp_dir)
+        endpoints: list[connection.Connection] = []
+        processes: list[Process] = []
+        try:
+            for _ in range(self._workers):
+                local_endpoint, remote_endpoint = Pipe()
+                endpoints.append(local_endpoint)
+                process = Process(
+                    target=do_sort_reduce,
+                    args=(
+                        remote_endpoint,
+                        self._reducer,
+                        self._keys,
+                        self._sort_keys,
+                        self._memory_limit,
+                        run_dir,
+                        self._batch_size,
+                    ),
+                )
+                processes.append(process)
+                process.start()
+                remote_endpoint.close()
+
+            senders = [BatchSender(endpoint, self._batch_size) for endpoint in endpoints]
+            for row in rows:
+                try:
+                    index = hash(group_key(row, self._keys)) % len(senders)
+                except TypeError:
+                    # key can't be hashed, all such rows are reduced by the first worker
+                    index = 0
+                senders[index].send(row)
+            for sender in senders:
+                sender.close()
+
+            # groups of different workers never have equal keys
+            for _, row in heapq.merge(*map(recv_rows, endpoints), key=itemgetter(0)):
+                yield row
+            for process in processes:
+                process.join()
+        finally:
+            for endpoint in endpoints:
+                endpoint.close()
+            for process in processes:
+                if process.is_alive():
+                    process.terminate()
+                    process.join()
+            shutil.rmtree(run_dir, ignore_errors=True)
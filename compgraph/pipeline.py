@@ -0,0 +1,435 @@
+"""
+Pipelined execution. Consecutive operations between a data source and the next join or cache
+are split into stages at sorts: every ExternalSort is a stage of its own, and operations between sorts
+make one stage. Every stage runs in a worker process, stages are connected by queues holding
+at most queue_size pickled batches of rows, so all stages work at the same time. Data source stays
+in the calling process and is read in a thread feeding the first queue. Graph.run starts processes
+of all stages of the run before any queue is fed, so no process is forked while feeding threads run.
+Producers and consumers of every queue measure how long they wait for it and how full it is:
+a queue which is mostly full is read by the bottleneck stage, a mostly empty one is fed by it.
+"""
+import pickle
+import queue as queues
+import shutil
+import tempfile
+import threading
+import time
+import typing as tp
+from copy import copy
+from functools import partial
+from multiprocessing import Process
+from multiprocessing import Queue
+
+from compgraph.cache import Cache
+from compgraph.context import RunContext
+from compgraph.external_sort import ExternalSort
+from compgraph.external_sort import sort_batches
+from compgraph.incremental import IncrementalReduce
+from compgraph.joiner import Join
+from compgraph.misc import TRow
+from compgraph.misc import TRowsGenerator
+from compgraph.misc import TRowsIterable
+from compgraph.operation import Operation
+from compgraph.record import pack_rows
+from compgraph.record import unpack_rows
+from compgraph.transport import DEFAULT_BATCH_SIZE
+
+if tp.TYPE_CHECKING:
+    from compgraph.graph import Graph
+
+DEFAULT_QUEUE_SIZE = 8
+# feeding thread checks this often whether the pipeline is stopped while queue is full
+_PUT_TIMEOUT = 0.1
+
+TStages = list[list[Operation]]
+
+
+class QueueStats:
+    """Statistics of a queue between two stages"""
+
+    def __init__(self, producer: str, consumer: str, capacity: int) -> None:
+        """
+        :param producer: description of stage writing to queue
+        :param consumer: description of stage reading from queue
+        :param capacity: number of batches queue holds
+        """
+        self.producer = producer
+        self.consumer = consumer
+        self.capacity = capacity
+        self.batches = 0
+        self.rows = 0
+        self.bytes = 0
+        self.put_wait = 0.0
+        self.get_wait = 0.0
+        self.occupancy_sum = 0
+        self.max_occupancy = 0
+
+    @property
+    def mean_occupancy(self) -> float:
+        """Average number of batches waiting in queue when consumer takes one"""
+        return self.occupancy_sum / self.batches if self.batches else 0.0
+
+    def to_dict(self) -> dict[str, tp.Any]:
+        return {
+            "producer": self.producer,
+            "consumer": self.consumer,
+            "capacity": self.capacity,
+            "batches": self.batches,
+            "rows": self.rows,
+            "bytes": self.bytes,
+            "put_wait": self.put_wait,
+            "get_wait": self.get_wait,
+            "mean_occupancy": self.mean_occupancy,
+            "max_occupancy": self.max_occupancy,
+        }
+
+    def __repr__(self) -> str:
+        return f"QueueStats({self.to_dict()!r})"
+
+
+class Pipeline:
+    """Settings of pipelined execution and statistics of queues of the last run"""
+
+    def __init__(self, queue_size: int = DEFAULT_QUEUE_SIZE, batch_size: int = DEFAULT_BATCH_SIZE) -> None:
+        """
+        :param queue_size: number of batches queue between stages holds
+        :param batch_size: number of rows sent between stages in one batch
+        """
+        self.queue_size = queue_size
+        self.batch_size = batch_size
+        self.queues: list[QueueStats] = []
+
+    def explain(self) -> str:
+        """Describe queues: how full they are and how long their producers and consumers waited"""
+        return "\n".join(
+            f"{stats.producer} -> {stats.consumer}: {stats.rows} rows in {stats.batches} batches,"
+            f" occupancy {stats.mean_occupancy:.1f}/{stats.capacity} (max {stats.max_occupancy}),"
+            f" put wait {stats.put_wait:.3f}s, get wait {stats.get_wait:.3f}s"
+            for stats in self.queues
+        )
+
+    def to_dict(self) -> dict[str, tp.Any]:
+        return {
+            "queue_size": self.queue_size,
+            "batch_size": self.batch_size,
+            "queues": [stats.to_dict() for stats in self.queues],
+        }
+
+    def __str__(self) -> str:
+        return self.explain()
+
+
+class _Failure:
+    """Error of a stage passed down the pipeline"""
+
+    def __init__(self, error: BaseException) -> None:
+        try:
+            pickle.dumps(error)
+        except Exception:
+            error = RuntimeError(f"{type(error).__name__}: {error}")
+        self.error = error
+
+
+class _End:
+    """End of rows, carries statistics of queues before the one it is sent to and producer side of that one"""
+
+    def __init__(self, queues: list[QueueStats], producer: QueueStats) -> None:
+        self.queues = queues
+        self.producer = producer
+
+
+class _Writer:
+    """Producer side of queue: sends rows by pickled batches"""
+
+    def __init__(
+        self, queue: "Queue[tp.Any]", stats: QueueStats, batch_size: int, stop: threading.Event | None = None
+    ) -> None:
+        self._queue = queue
+        self._stats = stats
+        self._batch_size = batch_size
+        self._stop = stop
+
+    def write_all(self, rows: TRowsIterable) -> None:
+        batch: list[TRow] = []
+        for row in rows:
+            batch.append(row)
+            if len(batch) >= self._batch_size:
+                self._send_batch(batch)
+                batch = []
+        if batch:
+            self._send_batch(batch)
+
+    def end(self, queues: list[QueueStats]) -> None:
+        self._put(_End(queues, self._stats))
+
+    def fail(self, error: BaseException) -> None:
+        self._put(_Failure(error))
+
+    def _send_batch(self, batch: list[TRow]) -> None:
+        payload = pickle.dumps(pack_rows(batch), protocol=pickle.HIGHEST_PROTOCOL)
+        self._stats.batches += 1
+        self._stats.rows += len(batch)
+        self._stats.bytes += len(payload)
+        self._put(payload)
+
+    def _put(self, message: tp.Any) -> None:
+        start = time.perf_counter()
+        if self._stop is None:
+            self._queue.put(message)
+        else:
+            while True:
+                if self._stop.is_set():
+                    raise _Stopped()
+                try:
+                    self._queue.put(message, timeout=_PUT_TIMEOUT)
+                    break
+                except queues.Full:
+                    continue
+        self._stats.put_wait += time.perf_counter() - start
+
+
+class _Stopped(Exception):
+    """Pipeline is stopped by consumer"""
+
+
+class _Reader:
+    """Consumer side of queue: receives batches until end of rows, re-raises errors of stages before"""
+
+    def __init__(self, queue: "Queue[tp.Any]", stats: QueueStats) -> None:
+        self._queue = queue
+        self._stats = stats
+        self.queues: list[QueueStats] = []
+
+    def batches(self) -> tp.Iterator[tuple[list[TRow], int]]:
+        """Batches of rows along with their pickled size"""
+        while True:
+            try:
+                occupancy = self._queue.qsize()
+            except NotImplementedError:  # pragma: no cover, macOS
+                occupancy = 0
+            start = time.perf_counter()
+            message = self._queue.get()
+            self._stats.get_wait += time.perf_counter() - start
+            if isinstance(message, _End):
+                self._finish(message)
+                return
+            if isinstance(message, _Failure):
+                raise message.error
+            self._stats.occupancy_sum += occupancy
+            self._stats.max_occupancy = max(self._stats.max_occupancy, occupancy)
+            yield unpack_rows(pickle.loads(message)), len(message)
+
+    def rows(self) -> TRowsGenerator:
+        for batch, _ in self.batches():
+            yield from batch
+
+    def _finish(self, end: _End) -> None:
+        """Merge statistics of producer side into consumer side"""
+        for name in ("batches", "rows", "bytes", "put_wait"):
+            setattr(self._stats, name, getattr(end.producer, name))
+        self.queues = end.queues + [self._stats]
+
+
+def _run_stage(
+    operations: list[Operation],
+    input_queue: "Queue[tp.Any]",
+    output_queue: "Queue[tp.Any]",
+    input_stats: QueueStats,
+    output_stats: QueueStats,
+    batch_size: int,
+) -> None:
+    """Body of stage process"""
+    reader = _Reader(input_queue, input_stats)
+    writer = _Writer(output_queue, output_stats, batch_size)
+    try:
+        first = operations[0]
+        if isinstance(first, ExternalSort) and len(operations) == 1:
+            # stage process sorts itself instead of sending rows to yet another process
+            run_dir = tempfile.mkdtemp(prefix="compgraph-sort-", dir=first.tmp_dir)
+            try:
+                writer.write_all(sort_batches(reader.batches(), first.keys, first.memory_limit, run_dir))
+            finally:
+                shutil.rmtree(run_dir, ignore_errors=True)
+        else:
+            rows: TRowsIterable = reader.rows()
+            for operation in operations:
+                rows = operation(rows)
+            writer.write_all(rows)
+        writer.end(reader.queues)
+    except BaseException as error:
+        writer.fail(error)
+
+
+def _feed(rows: TRowsIterable, writer: _Writer, errors: list[BaseException]) -> None:
+    """Body of thread reading data source into the first queue"""
+    try:
+        writer.write_all(rows)
+        writer.end([])
+    except _Stopped:
+        pass
+    except BaseException as error:
+        errors.append(error)
+        try:
+            writer.fail(error)
+        except _Stopped:
+            pass
+
+
+def _drain(channel: "Queue[tp.Any]") -> None:
+    """Take messages left in queue"""
+    while True:
+        try:
+            channel.get(timeout=_PUT_TIMEOUT)
+        except (queues.Empty, OSError, EOFError):
+            return
+
+
+class _Processes:
+    """Queues and processes of stages of Pipelined in one run"""
+
+    def __init__(self, pipelined: "Pipelined") -> None:
+        from compgraph.optimizer import describe
+
+        stages = pipelined.stages
+        names = ["input"] + [", ".join(describe(operation) for operation in stage) for stage in stages]
+        names.append("output")
+        size = pipelined.pipeline.queue_size
+        batch_size = pipelined.pipeline.batch_size
+        self.channels: list[Queue[tp.Any]] = [Queue(size) for _ in range(len(stages) + 1)]
+        self.stats = [QueueStats(names[index], names[index + 1], size) for index in range(len(self.channels))]
+        channels, stats = self.channels, self.stats
+        self.processes = [
+            Process(
+                target=_run_stage,
+                args=(stage, channels[index], channels[index + 1], stats[index], stats[index + 1], batch_size),
+            )
+            for index, stage in enumerate(stages)
+        ]
+        self._stopped = False
+
+    def start(self) -> None:
+        for process in self.processes:
+            process.start()
+
+    def stop(self, drain: bool) -> None:
+        """Terminate processes left, batches in pipe of the first queue would block its feeder thread forever
+        unless drained
+        """
+        if self._stopped:
+            return
+        self._stopped = True
+        for process in self.processes:
+            if process.is_alive():
+                process.terminate()
+                process.join()
+        if drain:
+            _drain(self.channels[0])
+        for channel in self.channels:
+            channel.cancel_join_thread()
+            channel.close()
+
+
+def start_processes(graph: "Graph", context: RunContext) -> None:
+    """Start processes of all Pipelined of graph and its join subgraphs before any of them is fed.
+    Processes are forked, and a fork made while a thread feeding another Pipelined holds a lock
+    would inherit that lock locked, so no Pipelined starts its processes after feeding begins
+    """
+    for step in graph._operations:
+        if isinstance(step, Pipelined) and context.get(step) is None:
+            processes = _Processes(step)
+            context.set(step, processes)
+            context.on_close(partial(processes.stop, drain=True))
+            processes.start()
+    for join in graph._join_params:
+        start_processes(join, context)
+
+
+class Pipelined(Operation):
+    """Run stages of operations in worker processes connected by bounded queues"""
+
+    def __init__(self, stages: TStages, pipeline: Pipeline) -> None:
+        """
+        :param stages: groups of consecutive operations, each runs in its own process
+        :param pipeline: settings of queues, statistics of queues are added to it
+        """
+        self.stages = stages
+        self.pipeline = pipeline
+
+    def __call__(self, rows: TRowsIterable, *args: tp.Any, **kwargs: tp.Any) -> TRowsGenerator:
+        """
+        :param rows: rows of data source
+        :param args: RunContext of run whose processes are already started by start_processes, if any
+        """
+        context: RunContext | None = args[0] if args else None
+        processes = context.get(self) if context is not None else None
+        if processes is None:
+            processes = _Processes(self)
+            processes.start()
+        channels, stats = processes.channels, processes.stats
+        stop = threading.Event()
+        errors: list[BaseException] = []
+        finished = False
+        feeder = threading.Thread(
+            target=_feed,
+            args=(rows, _Writer(channels[0], stats[0], self.pipeline.batch_size, stop), errors),
+            daemon=True,
+        )
+        try:
+            feeder.start()
+            reader = _Reader(channels[-1], stats[-1])
+            try:
+                yield from reader.rows()
+            except BaseException:
+                if errors:  # error of data source travelled through stages
+                    raise errors[0]
+                raise
+            self.pipeline.queues.extend(reader.queues)
+            feeder.join()
+            for process in processes.processes:
+                process.join()
+            finished = True
+        finally:
+            stop.set()
+            if not finished:
+                for process in processes.processes:
+                    if process.is_alive():
+                        process.terminate()
+                feeder.join(_PUT_TIMEOUT * 2)
+            processes.stop(drain=not finished)
+
+
+def split_stages(steps: list[Operation]) -> TStages:
+    """Group operations into stages: sorts go alone, operations between them together"""
+    stages: TStages = []
+    for step in steps:
+        if isinstance(step, ExternalSort) or not stages or isinstance(stages[-1][0], ExternalSort):
+            stages.append([step])
+        else:
+            stages[-1].append(step)
+    return stages
+
+
+def pipeline_graph(graph: "Graph", pipeline: Pipeline) -> "Graph":
+    """Return graph where runs of operations after source, join, cache or incremental reduce are replaced
+    by Pipelined, passed graph is not changed; incremental reduces stay in the calling process with their store
+    """
+    if not graph._operations:
+        return graph
+
+    steps = graph._operations[::-1]
+    result_steps = steps[:1]
+    segment: list[Operation] = []
+    for step in steps[1:] + [None]:
+        if step is not None and not isinstance(step, (Join, Cache, IncrementalReduce)):
+            segment.append(step)
+            continue
+        if segment:
+            result_steps.append(Pipelined(split_stages(segment), pipeline))
+            segment = []
+        if step is not None:
+            result_steps.append(step)
+
+    result = copy(graph)
+    result._operations = result_steps[::-1]
+    result._join_params = [pipeline_graph(join, pipeline) for join in graph._join_params]
+    return result
@@ -0,0 +1,284 @@
+"""
+Profiling of graph runs. Every operation's output is wrapped into a generator which switches the
+operation being charged while rows are pulled from it, so time spent in operation itself is
+separated from time spent in operations it reads from. Time spent by worker processes
+of parallel operations is not seen, only time of waiting for them is. Operations pulled by other threads,
+as data sources of pipelined stages are, are charged with time of those threads.
+Profiled runs are about twice as slow, as operations are switched for every row.
+"""
+import json
+import sys
+import threading
+import time
+import tracemalloc
+import typing as tp
+from contextlib import contextmanager
+
+from compgraph.misc import TRowsGenerator
+from compgraph.misc import TRowsIterable
+from compgraph.operation import Operation
+from compgraph.optimizer import describe
+
+try:
+    import resource
+except ImportError:  # pragma: no cover
+    resource = None  # type: ignore[assignment]
+
+MEMORY_RSS = "rss"
+MEMORY_TRACEMALLOC = "tracemalloc"
+_RSS_UNIT = 1 if sys.platform == "darwin" else 1024
+
+
+def peak_rss() -> int:
+    """Peak resident set size of process in bytes, 0 where it is unknown"""
+    if resource is None:  # pragma: no cover
+        return 0
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * _RSS_UNIT
+
+
+class OperationProfile:
+    """Statistics of a single operation of a run"""
+
+    def __init__(
+        self,
+        operation: str,
+        depth: int = 0,
+        rows_in: int = 0,
+        rows_out: int = 0,
+        wall_time: float = 0.0,
+        cpu_time: float = 0.0,
+        peak_memory: int = 0,
+    ) -> None:
+        """
+        :param operation: description of operation
+        :param depth: nesting of join subgraph operation is in, 0 for main graph
+        :param rows_in: number of rows operation read from operations before it
+        :param rows_out: number of rows operation produced
+        :param wall_time: seconds spent in operation itself
+        :param cpu_time: CPU seconds of thread spent in operation itself
+        :param peak_memory: growth in bytes of peak memory of run reached while operation was running
+        """
+        self.operation = operation
+        self.depth = depth
+        self.rows_in = rows_in
+        self.rows_out = rows_out
+        self.wall_time = wall_time
+        self.cpu_time = cpu_time
+        self.peak_memory = peak_memory
+        self.inputs: list[OperationProfile] = []
+
+    def to_dict(self) -> dict[str, tp.Any]:
+        return {
+            "operation": self.operation,
+            "depth": self.depth,
+            "rows_in": self.rows_in,
+            "rows_out": self.rows_out,
+            "wall_time": self.wall_time,
+            "cpu_time": self.cpu_time,
+            "peak_memory": self.peak_memory,
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict[str, tp.Any]) -> "OperationProfile":
+        return cls(**data)
+
+    def __repr__(self) -> str:
+        return f"OperationProfile({self.to_dict()!r})"
+
+
+class _ThreadState:
+    """Operations being pulled by a thread, innermost last, and times of its last switch"""
+
+    def __init__(self) -> None:
+        self.running: list[OperationProfile] = []
+        self.wall = time.perf_counter()
+        self.cpu = time.thread_time()
+
+
+class Profile:
+    """
+    Per-operation statistics of Graph.run in order Graph.explain lists operations,
+    join subgraphs follow their joins with greater depth.
+    Peak memory is measured by peak resident set size of process, or by tracemalloc
+    with trace_memory which is more precise and much slower
+    """
+
+    def __init__(self, trace_memory: bool = False) -> None:
+        """
+        :param trace_memory: measure memory of Python objects with tracemalloc instead of resident set size
+        """
+        self.trace_memory = trace_memory
+        self.operations: list[OperationProfile] = []
+        self.wall_time = 0.0
+        self.cpu_time = 0.0
+        self.peak_memory = 0
+        self._depth = 0
+        self._threads = threading.local()
+        self._started_tracing = False
+        self._start_wall = self._start_cpu = 0.0
+        self._base_memory = 0
+
+    @property
+    def memory(self) -> str:
+        return MEMORY_TRACEMALLOC if self.trace_memory else MEMORY_RSS
+
+    def add(self, operation: Operation) -> OperationProfile:
+        """Register operation at current depth"""
+        stats = OperationProfile(describe(operation), self._depth)
+        self.operations.append(stats)
+        return stats
+
+    @contextmanager
+    def subgraph(self, join: OperationProfile) -> tp.Iterator[None]:
+        """Operations added inside are of join subgraph, its last operation becomes input of join"""
+        start = len(self.operations)
+        self._depth += 1
+        try:
+            yield
+        finally:
+            self._depth -= 1
+        children = [stats for stats in self.operations[start:] if stats.depth == join.depth + 1]
+        if children:
+            join.inputs.append(children[-1])
+
+    def track(self, stats: OperationProfile, rows: TRowsIterable) -> TRowsGenerator:
+        """Count rows of operation and charge it with time spent while they are pulled"""
+        iterator = iter(rows)
+        state = self._thread_state()
+        switch, running = self._switch, state.running
+        while True:
+            switch(state)
+            running.append(stats)
+            try:
+                row = next(iterator)
+            except StopIteration:
+                return
+            finally:
+                switch(state)
+                running.pop()
+            stats.rows_out += 1
+            yield row
+
+    def start(self) -> None:
+        """Start collecting statistics of a new run"""
+        self.operations = []
+        self._depth = 0
+        self._threads = threading.local()
+        if self.trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._started_tracing = True
+        self._base_memory = self._memory_peak()
+        self.peak_memory = 0
+        self._start_wall = time.perf_counter()
+        self._start_cpu = time.process_time()
+
+    def finish(self) -> None:
+        self._switch(self._thread_state())
+        self.wall_time = time.perf_counter() - self._start_wall
+        self.cpu_time = time.process_time() - self._start_cpu
+        for stats in self.operations:
+            stats.rows_in = sum(source.rows_out for source in stats.inputs)
+        if self._started_tracing:
+            tracemalloc.stop()
+            self._started_tracing = False
+
+    def _memory_peak(self) -> int:
+        if self.trace_memory:
+            return tracemalloc.get_traced_memory()[1]
+        return peak_rss()
+
+    def _thread_state(self) -> _ThreadState:
+        state = getattr(self._threads, "state", None)
+        if state is None:
+            state = self._threads.state = _ThreadState()
+        return tp.cast(_ThreadState, state)
+
+    def _switch(self, state: _ThreadState) -> None:
+        """Charge operation the thread runs since its last switch"""
+        wall, cpu = time.perf_counter(), time.thread_time()
+        peak = self._memory_peak() - self._base_memory
+        if peak > self.peak_memory:
+            self.peak_memory = peak
+        if self.trace_memory:
+            # next peak belongs to whatever runs next
+            tracemalloc.reset_peak()
+        if state.running:
+            stats = state.running[-1]
+            stats.wall_time += wall - state.wall
+            stats.cpu_time += cpu - state.cpu
+            if peak > stats.peak_memory:
+                stats.peak_memory = peak
+        state.wall, state.cpu = wall, cpu
+
+    def to_dict(self) -> dict[str, tp.Any]:
+        return {
+            "memory": self.memory,
+            "wall_time": self.wall_time,
+            "cpu_time": self.cpu_time,
+            "peak_memory": self.peak_memory,
+            "operations": [stats.to_dict() for stats in self.operations],
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict[str, tp.Any]) -> "Profile":
+        profile = cls(data["memory"] == MEMORY_TRACEMALLOC)
+        profile.wall_time = data["wall_time"]
+        profile.cpu_time = data["cpu_time"]
+        profile.peak_memory = data["peak_memory"]
+        profile.operations = [OperationProfile.from_dict(stats) for stats in data["operations"]]
+        return profile
+
+    def save(self, path: str) -> None:
+        """Write profile to JSON file"""
+        with open(path, "w") as file:
+            json.dump(self.to_dict(), file, indent=2)
+
+    @classmethod
+    def load(cls, path: str) -> "Profile":
+        """Read profile written by save"""
+        with open(path) as file:
+            return cls.from_dict(json.load(file))
+
+    def explain(self) -> str:
+        """Describe operations as Graph.explain does along with their statistics"""
+        lines = [
+            f"{'    ' * stats.depth}{stats.operation}  rows {stats.rows_in} -> {stats.rows_out}"
+            f"  wall {stats.wall_time:.3f}s  cpu {stats.cpu_time:.3f}s"
+            f"  peak {_format_bytes(stats.peak_memory)}"
+            for stats in self.operations
+        ]
+        lines.append(
+            f"total  wall {self.wall_time:.3f}s  cpu {self.cpu_time:.3f}s"
+            f"  peak {_format_bytes(self.peak_memory)}  ({self.memory})"
+        )
+        return "\n".join(lines)
+
+    def compare(self, baseline: "Profile") -> str:
+        """Describe changes of statistics from baseline profile of the same graph, operations are matched
+        by position
+        """
+        if [stats.operation for stats in self.operations] != [stats.operation for stats in baseline.operations]:
+            raise ValueError("profiles are of different graphs")
+        lines = [
+            f"{'    ' * stats.depth}{stats.operation}  rows {_change(old.rows_out, stats.rows_out, 'd')}"
+            f"  wall {_change(old.wall_time, stats.wall_time, '.3f')}"
+            f"  peak {_change(old.peak_memory, stats.peak_memory, 'd')}"
+            for old, stats in zip(baseline.operations, self.operations)
+        ]
+        lines.append(
+            f"total  wall {_change(baseline.wall_time, self.wall_time, '.3f')}"
+            f"  peak {_change(baseline.peak_memory, self.peak_memory, 'd')}"
+        )
+        return "\n".join(lines)
+
+    def __str__(self) -> str:
+        return self.explain()
+
+
+def _format_bytes(size: int) -> str:
+    return f"{size / 2**20:.1f}MiB"
+
+
+def _change(old: float, new: float, spec: str) -> str:
+    ratio = f" x{new / old:.2f}" if old else ""
+    return f"{old:{spec}} -> {new:{spec}}{ratio}"
@@ -0,0 +1,289 @@
+"""
+Compact rows. Record keeps values of a row in a list and shares names of columns with all records
+of the same columns through Schema, so a row costs a list of values instead of a hash table of its own.
+Records are mutable mappings and may be used wherever rows are: columns are read, set and deleted
+by name, new columns are appended to the end as in dicts.
+Records are produced only when Graph.run is called with compact=True, they are turned back
+into dicts when they leave the graph.
+"""
+import pickle
+import typing as tp
+import weakref
+from collections.abc import ItemsView
+from collections.abc import MutableMapping
+from collections.abc import ValuesView
+from itertools import repeat
+
+from compgraph.misc import TRow
+from compgraph.misc import TRowsGenerator
+from compgraph.misc import TRowsIterable
+
+
+class Schema:
+    """
+    Ordered names of columns. Schemas are interned by names, so records of the same columns share
+    a single schema and schemas obtained by adding or removing a column are cached.
+    Interned schemas are referenced weakly and are forgotten when no record or schema uses them.
+    """
+
+    __slots__ = ("names", "positions", "_added", "_removed", "_selected", "__weakref__")
+
+    # plain dict of weak references is read faster than WeakValueDictionary, Schema.of is called per row
+    _interned: tp.ClassVar[dict[tuple[str, ...], "weakref.ref[Schema]"]] = {}
+
+    def __init__(self, names: tuple[str, ...]) -> None:
+        """Use Schema.of to get schema"""
+        self.names = names
+        self.positions = {name: position for position, name in enumerate(names)}
+        if len(self.positions) != len(names):
+            raise ValueError(f"duplicate columns in {list(names)}")
+        self._added: dict[str, Schema] = {}
+        self._removed: dict[str, Schema] = {}
+        self._selected: dict[tp.Any, tuple[Schema, tuple[int, ...]]] = {}
+
+    @classmethod
+    def of(cls, names: tp.Iterable[str]) -> "Schema":
+        """Schema of columns with names in that order"""
+        names = tuple(names)
+        ref = cls._interned.get(names)
+        schema = ref() if ref is not None else None
+        if schema is None:
+            schema = cls(names)
+            cls._interned[names] = weakref.ref(schema, cls._forget(names))
+        return schema
+
+    @classmethod
+    def _forget(cls, names: tuple[str, ...]) -> tp.Callable[["weakref.ref[Schema]"], None]:
+        """Callback removing reference to dead schema unless names are interned again"""
+
+        def forget(ref: "weakref.ref[Schema]") -> None:
+            if cls._interned.get(names) is ref:
+                cls._interned.pop(names, None)
+
+        return forget
+
+    def add(self, name: str) -> "Schema":
+        """Schema with column appended"""
+        schema = self._added.get(name)
+        if schema is None:
+            schema = self._added[name] = Schema.of(self.names + (name,))
+        return schema
+
+    def remove(self, name: str) -> "Schema":
+        """Schema without column"""
+        schema = self._removed.get(name)
+        if schema is None:
+            schema = self._removed[name] = Schema.of(n for n in self.names if n != name)
+        return schema
+
+    def select(self, columns: tp.Collection[str]) -> tuple["Schema", tuple[int, ...]]:
+        """Schema of columns present in columns keeping their order, and their positions in this schema
+        :param columns: names of columns
+        """
+        if not isinstance(columns, (tuple, frozenset)):
+            columns = tuple(columns)
+        selected = self._selected.get(columns)
+        if selected is None:
+            names = tuple(name for name in self.names if name in columns)
+            selected = self._selected[columns] = (
+                Schema.of(names),
+                tuple(self.positions[name] for name in names),
+            )
+        return selected
+
+    def __reduce__(self) -> tuple[tp.Any, ...]:
+        return Schema.of, (self.names,)
+
+    def __repr__(self) -> str:
+        return f"Schema({list(self.names)})"
+
+
+class _RecordItems(ItemsView):  # type: ignore[type-arg]
+    def __iter__(self) -> tp.Iterator[tuple[str, tp.Any]]:
+        record = tp.cast(Record, self._mapping)
+        return zip(record.schema.names, record.values_list)
+
+
+class _RecordValues(ValuesView):  # type: ignore[type-arg]
+    def __iter__(self) -> tp.Iterator[tp.Any]:
+        return iter(tp.cast(Record, self._mapping).values_list)
+
+
+class Record(MutableMapping):  # type: ignore[type-arg]
+    """Row stored as list of values with shared schema"""
+
+    __slots__ = ("schema", "values_list")
+
+    def __init__(self, schema: Schema, values: list[tp.Any]) -> None:
+        """
+        :param schema: names of columns
+        :param values: values of columns in order of schema, list is owned by record
+        """
+        self.schema = schema
+        self.values_list = values
+
+    @classmethod
+    def from_mapping(cls, row: tp.Mapping[str, tp.Any]) -> "Record":
+        if isinstance(row, Record):
+            return row.copy()
+        return cls(Schema.of(row), list(row.values()))
+
+    def __getitem__(self, name: str) -> tp.Any:
+        return self.values_list[self.schema.positions[name]]
+
+    def get(self, name: str, default: tp.Any = None) -> tp.Any:
+        position = self.schema.positions.get(name)
+        return default if position is None else self.values_list[position]
+
+    def __setitem__(self, name: str, value: tp.Any) -> None:
+        position = self.schema.positions.get(name)
+        if position is None:
+            self.schema = self.schema.add(name)
+            self.values_list.append(value)
+        else:
+            self.values_list[position] = value
+
+    def __delitem__(self, name: str) -> None:
+        del self.values_list[self.schema.positions[name]]
+        self.schema = self.schema.remove(name)
+
+    def __contains__(self, name: object) -> bool:
+        return name in self.schema.positions
+
+    def __iter__(self) -> tp.Iterator[str]:
+        return iter(self.schema.names)
+
+    def __len__(self) -> int:
+        return len(self.values_list)
+
+    def keys(self) -> tp.KeysView[str]:
+        return tp.KeysView(self)
+
+    def items(self) -> tp.ItemsView[str, tp.Any]:
+        return _RecordItems(self)
+
+    def values(self) -> tp.ValuesView[tp.Any]:
+        return _RecordValues(self)
+
+    def copy(self) -> "Record":
+        return Record(self.schema, self.values_list.copy())
+
+    def to_dict(self) -> TRow:
+        return dict(zip(self.schema.names, self.values_list))
+
+    def __or__(self, other: tp.Mapping[str, tp.Any]) -> "Record":
+        row = self.to_dict()
+        row.update(other)
+        return Record(Schema.of(row), list(row.values()))
+
+    def __ror__(self, other: tp.Mapping[str, tp.Any]) -> "Record":
+        row = dict(other)
+        row.update(zip(self.schema.names, self.values_list))
+        return Record(Schema.of(row), list(row.values()))
+
+    def __ior__(self, other: tp.Mapping[str, tp.Any]) -> "Record":
+        self.update(other)
+        return self
+
+    def __eq__(self, other: object) -> bool:
+        if isinstance(other, Record) and self.schema is other.schema:
+            return self.values_list == other.values_list
+        if isinstance(other, tp.Mapping):
+            return self.to_dict() == dict(other)
+        return NotImplemented
+
+    __hash__ = None  # type: ignore[assignment]
+
+    def __reduce__(self) -> tuple[tp.Any, ...]:
+        # schema object is pickled once per batch of records thanks to pickle memo
+        return Record, (self.schema, self.values_list)
+
+    def __repr__(self) -> str:
+        return f"Record({self.to_dict()!r})"
+
+
+def make_row(like: TRow, names: tp.Sequence[str], values: list[tp.Any]) -> TRow:
+    """Row of columns with values, Record if like is Record and dict otherwise.
+    Repeated names keep the first position and the last value as in dict
+    """
+    if isinstance(like, Record):
+        try:
+            return tp.cast(TRow, Record(Schema.of(names), values))
+        except ValueError:
+            row = dict(zip(names, values))
+            return tp.cast(TRow, Record(Schema.of(row), list(row.values())))
+    return dict(zip(names, values))
+
+
+def select_columns(row: TRow, columns: tp.Collection[str]) -> TRow:
+    """Columns of row which are mentioned in columns, in order of row; Record for Record row"""
+    if isinstance(row, Record):
+        schema, positions = row.schema.select(columns)
+        values = row.values_list
+        return tp.cast(TRow, Record(schema, [values[position] for position in positions]))
+    return {key: value for key, value in row.items() if key in columns}
+
+
+def compact_rows(rows: TRowsIterable) -> TRowsGenerator:
+    """Turn rows into records, rows of the same columns share schema"""
+    for row in rows:
+        if isinstance(row, Record):
+            yield row
+        else:
+            yield tp.cast(TRow, Record(Schema.of(row), list(row.values())))
+
+
+def to_dicts(rows: TRowsIterable) -> TRowsGenerator:
+    """Turn records back into dicts, other rows are passed as is"""
+    for row in rows:
+        if isinstance(row, Record):
+            yield row.to_dict()
+        else:
+            yield row
+
+
+def _buffers(values: tp.Collection[tp.Any], buffer_bytes: int) -> list[tp.Any] | None:
+    """Values with bytes of at least buffer_bytes wrapped into PickleBuffer, None if there are no such bytes"""
+    if not any(type(value) is bytes and len(value) >= buffer_bytes for value in values):
+        return None
+    return [
+        pickle.PickleBuffer(value) if type(value) is bytes and len(value) >= buffer_bytes else value
+        for value in values
+    ]
+
+
+def pack_rows(rows: tp.Iterable[tp.Any], buffer_bytes: int | None = None) -> list[tuple[Schema | None, list[tp.Any]]]:
+    """
+    Split rows into runs for pickling: consecutive records of the same schema make a run of schema
+    and lists of their values, other items make runs with schema None.
+    Packed rows are pickled faster and smaller than records themselves
+    :param buffer_bytes: wrap bytes values of at least that size into pickle.PickleBuffer, so that
+        pickle protocol 5 with buffer_callback passes them out-of-band; rows are not changed
+    """
+    runs: list[tuple[Schema | None, list[tp.Any]]] = []
+    schema: Schema | None = None
+    items: list[tp.Any] | None = None
+    for row in rows:
+        row_schema = row.schema if isinstance(row, Record) else None
+        if items is None or row_schema is not schema:
+            schema, items = row_schema, []
+            runs.append((schema, items))
+        item = row if row_schema is None else row.values_list
+        if buffer_bytes is not None:
+            if row_schema is not None:
+                item = _buffers(item, buffer_bytes) or item
+            elif isinstance(row, dict) and (values := _buffers(row.values(), buffer_bytes)) is not None:
+                item = dict(zip(row, values))
+        items.append(item)
+    return runs
+
+
+def unpack_rows(runs: list[tuple[Schema | None, list[tp.Any]]]) -> list[tp.Any]:
+    """Rows packed by pack_rows"""
+    rows: list[tp.Any] = []
+    for schema, items in runs:
+        if schema is None:
+            rows.extend(items)
+        else:
+            rows.extend(map(Record, repeat(schema), items))
+    return rows
@@ -1,10 +1,18 @@
 import heapq
 import typing as tp
+from itertools import islice
 
-from compgraph.misc import get_valid_date
+from compgraph.columnar import DEFAULT_BATCH_SIZE
+from compgraph.columnar import np
+from compgraph.columnar import parse_times
 from compgraph.misc import TRowsGenerator
 from compgraph.misc import TRowsIterable
+from compgraph.misc import TRow
+from compgraph.operation import CombinableReducer
 from compgraph.operation import Reducer
+from compgraph.record import make_row
+from compgraph.record import select_columns
+from compgraph.timestamp import TimeParser
 
 
 class TopN(Reducer):
@@ -22,7 +30,9 @@ class TopN(Reducer):
         self, group_key: tuple[str, ...], rows: TRowsIterable
     ) -> TRowsGenerator:
         heap: tp.List[tp.Tuple[tp.Any, tp.List[tp.Tuple[str, tp.Any]]]] = []
+        like: TRow = {}
         for row in rows:
+            like = row
             row_values = [
                 (key, value) for key, value in row.items() if key != self._column_max
             ]
@@ -34,13 +44,15 @@ class TopN(Reducer):
         while len(heap) > 0:
             row_values = heap[0][1]
             max_value = heap[0][0]
-            yield {key: value for key, value in row_values} | {
-                self._column_max: max_value
-            }
+            yield make_row(
+                like,
+                [key for key, _ in row_values] + [self._column_max],
+                [value for _, value in row_values] + [max_value],
+            )
             heapq.heappop(heap)
 
 
-class TermFrequency(Reducer):
+class TermFrequency(CombinableReducer):
     """Calculate frequency of values in column"""
 
     def __init__(self, words_column: str, result_column: str = "tf") -> None:
@@ -60,9 +72,7 @@ class TermFrequency(Reducer):
         for row in rows:
             n += 1
             if len(map_key_values) == 0:
-                map_key_values = {
-                    key: value for key, value in row.items() if key in group_key
-                }
+                map_key_values = select_columns(row, group_key)
             counter[row[self._words_column]] = (
                 counter.get(row[self._words_column], 0) + 1
             )
@@ -78,8 +88,31 @@ class TermFrequency(Reducer):
 
         yield from result
 
+    def columns_read(self) -> tp.Collection[str] | None:
+        return (self._words_column,)
+
+    def start(self) -> tp.Any:
+        return {}, 0
+
+    def add(self, state: tp.Any, row: TRow) -> tp.Any:
+        counter, n = state
+        word = row[self._words_column]
+        counter[word] = counter.get(word, 0) + 1
+        return counter, n + 1
+
+    def merge(self, state: tp.Any, other: tp.Any) -> tp.Any:
+        counter, n = state
+        for word, count in other[0].items():
+            counter[word] = counter.get(word, 0) + count
+        return counter, n + other[1]
+
+    def finish(self, key_values: TRow, state: tp.Any) -> TRowsGenerator:
+        counter, n = state
+        for word, count in counter.items():
+            yield {self._words_column: word, self._result_column: count / n} | key_values
 
-class Count(Reducer):
+
+class Count(CombinableReducer):
     """
     Count records by key
     Example for group_key=('a',) and column='d'
@@ -103,13 +136,26 @@ class Count(Reducer):
         for row in rows:
             n += 1
             if len(map_key_values) == 0:
-                map_key_values = {
-                    key: value for key, value in row.items() if key in group_key
-                }
+                map_key_values = select_columns(row, group_key)
         yield {"count": n} | map_key_values
 
+    def columns_read(self) -> tp.Collection[str] | None:
+        return ()
+
+    def start(self) -> tp.Any:
+        return 0
+
+    def add(self, state: tp.Any, row: TRow) -> tp.Any:
+        return state + 1
+
+    def merge(self, state: tp.Any, other: tp.Any) -> tp.Any:
+        return state + other
 
-class Sum(Reducer):
+    def finish(self, key_values: TRow, state: tp.Any) -> TRowsGenerator:
+        yield {"count": state} | key_values
+
+
+class Sum(CombinableReducer):
     """
     Sum values aggregated by key
     Example for key=('a',) and column='b'
@@ -132,14 +178,27 @@ class Sum(Reducer):
         map_key_values: dict[str, tp.Any] = {}
         for row in rows:
             if not map_key_values:
-                map_key_values = {
-                    key: value for key, value in row.items() if key in group_key
-                }
+                map_key_values = select_columns(row, group_key)
             n += row[self._column]
         yield {self._column: n} | map_key_values
 
+    def columns_read(self) -> tp.Collection[str] | None:
+        return (self._column,)
+
+    def start(self) -> tp.Any:
+        return 0
+
+    def add(self, state: tp.Any, row: TRow) -> tp.Any:
+        return state + row[self._column]
 
-class NUnique(Reducer):
+    def merge(self, state: tp.Any, other: tp.Any) -> tp.Any:
+        return state + other
+
+    def finish(self, key_values: TRow, state: tp.Any) -> TRowsGenerator:
+        yield {self._column: state} | key_values
+
+
+class NUnique(CombinableReducer):
     """
     Count number of unique elements in specified column
     """
@@ -159,12 +218,27 @@ class NUnique(Reducer):
         map_key_values: tp.Dict[str, tp.Any] = {}
         for row in rows:
             if not map_key_values:
-                map_key_values = {
-                    key: value for key, value in row.items() if key in group_key
-                }
+                map_key_values = select_columns(row, group_key)
             unique_value.add(row[self._column])
         yield {self._result_column: len(unique_value)} | map_key_values
 
+    def columns_read(self) -> tp.Collection[str] | None:
+        return (self._column,)
+
+    def start(self) -> tp.Any:
+        return set()
+
+    def add(self, state: tp.Any, row: TRow) -> tp.Any:
+        state.add(row[self._column])
+        return state
+
+    def merge(self, state: tp.Any, other: tp.Any) -> tp.Any:
+        state |= other
+        return state
+
+    def finish(self, key_values: TRow, state: tp.Any) -> TRowsGenerator:
+        yield {self._result_column: len(state)} | key_values
+
 
 class Speed(Reducer):
     """
@@ -180,6 +254,7 @@ class Speed(Reducer):
         leave_time: str,
         time_format: str,
         result_column: str,
+        enter_micros: str | None = None,
     ) -> None:
         """
         :param length:  length of the road
@@ -187,33 +262,78 @@ class Speed(Reducer):
         :param leave_time: time of leaving the road
         :param time_format: time format
         :param result_column: result column name
+        :param enter_micros: column with time of entering the road already parsed by ParseTime
+            into microseconds since 1970-01-01, it is used instead of enter_time
         """
         self.length = length
         self.enter_time = enter_time
         self.leave_time = leave_time
+        self.enter_micros = enter_micros
         self._time_format = time_format
         self._result_column = result_column
+        self._parser = TimeParser(time_format)
 
     def __call__(
         self, group_key: tp.Tuple[str, ...], rows: TRowsIterable
     ) -> TRowsGenerator:
+        if np is not None:
+            yield from self._reduce_batches(group_key, rows)
+            return
+
         total_length: float = 0
         total_time: float = 0
 
         map_key_values: tp.Dict[str, tp.Any] = {}
         for row in rows:
             if not map_key_values:
-                map_key_values = {
-                    key: value for key, value in row.items() if key in group_key
-                }
+                map_key_values = select_columns(row, group_key)
 
-            dt_1 = get_valid_date(row[self.enter_time], self._time_format)
-            dt_2 = get_valid_date(row[self.leave_time], self._time_format)
-            time_delta = dt_2 - dt_1
+            if self.enter_micros is None:
+                time_delta = self._parser(row[self.leave_time]) - self._parser(row[self.enter_time])
+                seconds, microseconds = time_delta.seconds, time_delta.microseconds
+            else:
+                # timedelta.seconds and timedelta.microseconds of leave - enter
+                delta = self._parser.micros(row[self.leave_time]) - row[self.enter_micros]
+                seconds, microseconds = delta // 1_000_000 % 86400, delta % 1_000_000
 
             total_time += (
-                time_delta.seconds + time_delta.microseconds * 10 ** (-6)
+                seconds + microseconds * 10 ** (-6)
             ) / self.SECONDS_IN_HOUR
             total_length += row[self.length]
 
         yield map_key_values | {self._result_column: total_length / total_time}
+
+    def _reduce_batches(
+        self, group_key: tp.Tuple[str, ...], rows: TRowsIterable
+    ) -> TRowsGenerator:
+        """Same as row by row reduce, times are parsed by batches of rows"""
+        total_length: float = 0
+        total_time: float = 0
+
+        map_key_values: tp.Dict[str, tp.Any] = {}
+        rows = iter(rows)
+        while batch := list(islice(rows, DEFAULT_BATCH_SIZE)):
+            if not map_key_values:
+                map_key_values = select_columns(batch[0], group_key)
+            if self.enter_micros is None:
+                enter = parse_times([row[self.enter_time] for row in batch], self._time_format, self._parser)
+            else:
+                enter = np.asarray([row[self.enter_micros] for row in batch], dtype=np.int64)
+            leave = parse_times([row[self.leave_time] for row in batch], self._time_format, self._parser)
+            # timedelta.seconds and timedelta.microseconds of leave - enter
+            delta = leave - enter
+            seconds = delta // 1_000_000 % 86400
+            microseconds = delta % 1_000_000
+            times = (seconds + microseconds * 10 ** (-6)) / self.SECONDS_IN_HOUR
+
+            # cumulative sums add values one by one, so totals are the same as of the loop
+            total_time = float(np.cumsum(np.concatenate([[total_time], times]))[-1])
+            for row in batch:
+                total_length += row[self.length]
+
+        yield map_key_values | {self._result_column: total_length / total_time}
+
+    def columns_read(self) -> tp.Collection[str] | None:
+        if self.enter_micros is not None:
+            return self.length, self.enter_micros, self.leave_time
+        return self.length, self.enter_time, self.leave_time
@@ -0,0 +1,126 @@
+import bz2
+import csv
+import gzip
+import io
+import json
+import lzma
+import os
+import secrets
+import typing as tp
+
+from compgraph.columnar_format import write_columnar
+from compgraph.misc import StringEnum
+from compgraph.misc import TRowsIterable
+
+DEFAULT_BUFFER_SIZE = 2**20
+
+
+class SinkFormat(StringEnum):
+    jsonl = "jsonl"
+    tsv = "tsv"
+    columnar = "columnar"
+
+
+class Compression(StringEnum):
+    gzip = "gzip"
+    bz2 = "bz2"
+    xz = "xz"
+
+
+def _compress(file: tp.BinaryIO, compression: Compression | None) -> tp.BinaryIO:
+    if compression == Compression.gzip:
+        return tp.cast(tp.BinaryIO, gzip.GzipFile(fileobj=file, mode="wb"))
+    if compression == Compression.bz2:
+        return tp.cast(tp.BinaryIO, bz2.BZ2File(file, "wb"))
+    if compression == Compression.xz:
+        return tp.cast(tp.BinaryIO, lzma.LZMAFile(file, "wb"))
+    return file
+
+
+def _write_jsonl(out: tp.TextIO, rows: TRowsIterable) -> int:
+    count = 0
+    dumps = json.dumps
+    for row in rows:
+        out.write(dumps(row))
+        out.write("\n")
+        count += 1
+    return count
+
+
+def _write_tsv(out: tp.TextIO, rows: TRowsIterable) -> int:
+    """Header is taken from the first row, other rows must not have other columns"""
+    rows = iter(rows)
+    first = next(rows, None)
+    if first is None:
+        return 0
+    writer = csv.DictWriter(out, fieldnames=list(first), dialect="excel-tab", lineterminator="\n")
+    writer.writeheader()
+    writer.writerow(first)
+    count = 1
+    for row in rows:
+        writer.writerow(row)
+        count += 1
+    return count
+
+
+def _create_temp(path: str) -> str:
+    """Create empty file of unique name next to path. Unlike tempfile.mkstemp, file gets permissions
+    of usual new file, as umask is applied by os.open; reading umask would change it for all threads
+    """
+    directory, name = os.path.split(os.path.abspath(path))
+    while True:
+        target = os.path.join(directory, f".{name}.{secrets.token_hex(4)}.tmp")
+        try:
+            os.close(os.open(target, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o666))
+        except FileExistsError:
+            continue
+        return target
+
+
+def write_rows(
+    rows: TRowsIterable,
+    path: str,
+    fmt: str = SinkFormat.jsonl,
+    buffer_size: int = DEFAULT_BUFFER_SIZE,
+    compression: str | None = None,
+    atomic: bool = True,
+) -> int:
+    """
+    Write rows to file as they come
+    :param rows: rows to write
+    :param path: file to write to
+    :param fmt: "jsonl" for JSON object per line, "tsv" for tab separated values with header
+        or "columnar" for columnar file read by Graph.graph_from_columnar
+    :param buffer_size: size in bytes of write buffer
+    :param compression: None, "gzip", "bz2" or "xz"; columnar files are not compressed
+    :param atomic: write to temporary file in the same directory and rename it to path when all rows
+        are written, so path never has partial result
+    :return: number of rows written
+    """
+    fmt = SinkFormat(fmt)
+    codec = None if compression is None else Compression(compression)
+    if fmt == SinkFormat.columnar and codec is not None:
+        raise ValueError("columnar files are not compressed")
+    if atomic:
+        target = _create_temp(path)
+    else:
+        target = path
+
+    try:
+        with open(target, "wb", buffering=buffer_size) as file:
+            if fmt == SinkFormat.columnar:
+                count = write_columnar(file, rows)
+            else:
+                # closing wrapper finishes compressed stream, file itself is closed by with
+                with io.TextIOWrapper(_compress(file, codec), encoding="utf-8", newline="") as out:
+                    if fmt == SinkFormat.jsonl:
+                        count = _write_jsonl(out, rows)
+                    else:
+                        count = _write_tsv(out, rows)
+        if atomic:
+            os.replace(target, path)
+    except BaseException:
+        if atomic:
+            os.remove(target)
+        raise
+    return count
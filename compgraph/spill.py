@@ -0,0 +1,126 @@
+import os
+import pickle
+import tempfile
+import typing as tp
+from itertools import islice
+
+from compgraph.record import pack_rows
+from compgraph.record import unpack_rows
+
+SPILL_BATCH_SIZE = 1024
+
+
+def write_rows(
+    file: tp.BinaryIO, rows: tp.Iterable[tp.Any], batch_size: int = SPILL_BATCH_SIZE
+) -> int:
+    """Write rows (or any picklable items) to binary file as a sequence of pickled batches
+    :param file: file opened for binary writing
+    :param rows: rows to write
+    :param batch_size: number of rows pickled together
+    :return: number of rows written
+    """
+    count = 0
+    batch: list[tp.Any] = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= batch_size:
+            pickle.dump(pack_rows(batch), file, protocol=pickle.HIGHEST_PROTOCOL)
+            count += len(batch)
+            batch = []
+    if batch:
+        pickle.dump(pack_rows(batch), file, protocol=pickle.HIGHEST_PROTOCOL)
+        count += len(batch)
+    return count
+
+
+def read_rows(file: tp.BinaryIO) -> tp.Generator[tp.Any, None, None]:
+    """Read rows written by write_rows
+    :param file: file opened for binary reading
+    """
+    while True:
+        try:
+            runs = pickle.load(file)
+        except EOFError:
+            return
+        yield from unpack_rows(runs)
+
+
+class SpillFile:
+    """
+    Temporary file holding rows on disk. Rows are appended with `write` and may be read back
+    any number of times; the file is removed by `remove`.
+    """
+
+    def __init__(self, directory: str | None = None) -> None:
+        """
+        :param directory: directory to create file in, system temp dir by default
+        """
+        fd, self.path = tempfile.mkstemp(prefix="compgraph-", suffix=".spill", dir=directory)
+        self._file: tp.BinaryIO | None = os.fdopen(fd, "wb")
+        self.rows = 0
+
+    def write(self, rows: tp.Iterable[tp.Any]) -> None:
+        """Append rows to the end of file"""
+        assert self._file is not None, "spill file is already closed for writing"
+        self.rows += write_rows(self._file, rows)
+
+    def close(self) -> None:
+        """Finish writing, file becomes read-only"""
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def __iter__(self) -> tp.Generator[tp.Any, None, None]:
+        self.close()
+        with open(self.path, "rb") as f:
+            yield from read_rows(f)
+
+    def remove(self) -> None:
+        self.close()
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
+
+
+class SpillBuffer:
+    """
+    Rows which may be iterated any number of times. Up to max_rows rows are kept in memory,
+    when there are more, all of them go to a spill file and are read from it on every iteration.
+    Lists are in memory already and are used as is. Spill file is removed by `remove`.
+    """
+
+    def __init__(self, rows: tp.Iterable[tp.Any], max_rows: int, directory: str | None = None) -> None:
+        """
+        :param rows: rows to buffer
+        :param max_rows: number of rows kept in memory
+        :param directory: directory to create spill file in, system temp dir by default
+        """
+        self._spill: SpillFile | None = None
+        if isinstance(rows, list):
+            self._rows = rows
+            return
+        iterator = iter(rows)
+        self._rows = list(islice(iterator, max_rows + 1))
+        if len(self._rows) > max_rows:
+            self._spill = SpillFile(directory)
+            self._spill.write(self._rows)
+            self._rows = []
+            self._spill.write(iterator)
+            self._spill.close()
+
+    @property
+    def spilled(self) -> bool:
+        return self._spill is not None
+
+    def __len__(self) -> int:
+        return len(self._rows) if self._spill is None else self._spill.rows
+
+    def __iter__(self) -> tp.Iterator[tp.Any]:
+        if self._spill is None:
+            return iter(self._rows)
+        return iter(self._spill)
+
+    def remove(self) -> None:
+        if self._spill is not None:
+            self._spill.remove()
@@ -0,0 +1,156 @@
+"""
+Fast parsing of timestamps of fixed layout. Format made of %Y, %m, %d, %H, %M, %S, %f and literal
+characters is compiled into a regular expression, strings matching it with fields of full width
+are turned into datetime from their digits. Other strings are parsed by get_valid_date,
+so results and errors are the same as of get_valid_date.
+"""
+import re
+import typing as tp
+from datetime import datetime
+from datetime import timedelta
+from functools import lru_cache
+
+from compgraph.misc import get_valid_date
+
+FALLBACK_TIME_FORMAT = "%Y%m%dT%H%M%S"
+DEFAULT_CACHE_SIZE = 2**12
+
+EPOCH = datetime(1970, 1, 1)
+MICROSECOND = timedelta(microseconds=1)
+_FIELDS = {
+    "Y": r"(\d{4})",
+    "m": r"(\d{2})",
+    "d": r"(\d{2})",
+    "H": r"([01]\d|2[0-3])",
+    "M": r"(\d{2})",
+    "S": r"(\d{2})",
+}
+_DATETIME_FIELDS = "YmdHMS"
+# formats of strings datetime.fromisoformat parses the same way, it is faster than building datetime by hand
+_ISO_FORMAT = re.compile(r"%Y(-?)%m\1%d[^%\d\s]%H(:?)%M\2%S(?:\.%f)?")
+
+TLayout = tuple[re.Pattern[str], tuple[int, ...], bool, bool]
+
+
+def compile_layout(time_format: str) -> TLayout | None:
+    """
+    Regular expression of strings with all fields of format in full width, positions of groups
+    of year, month, day, hour, minute and second, whether the last group is fraction
+    and whether strings are in ISO 8601 format.
+    None if format has other directives, misses date or has whitespace which strptime treats loosely
+    """
+    pattern = []
+    fields: list[str] = []
+    index = 0
+    while index < len(time_format):
+        char = time_format[index]
+        if char != "%":
+            if char.isspace():
+                return None
+            pattern.append(re.escape(char))
+            index += 1
+            continue
+        directive = time_format[index + 1: index + 2]
+        index += 2
+        if directive == "%":
+            pattern.append("%")
+        elif directive in _FIELDS and directive not in fields:
+            pattern.append(_FIELDS[directive])
+            fields.append(directive)
+        elif directive == "f" and index == len(time_format):
+            # %f takes 1 to 6 digits, only the last field may be of variable width
+            pattern.append(r"(\d{1,6})")
+            fields.append(directive)
+        else:
+            return None
+    if not {"Y", "m", "d"} <= set(fields):
+        return None
+    positions = tuple(fields.index(field) if field in fields else -1 for field in _DATETIME_FIELDS)
+    iso = _ISO_FORMAT.fullmatch(time_format) is not None
+    return re.compile("".join(pattern), re.ASCII), positions, fields[-1] == "f", iso
+
+
+def _required_literals(time_format: str) -> str:
+    """Characters strptime needs to find in string to parse it with format, letters aside as their case is ignored"""
+    literals = re.sub(r"%.", "", time_format)
+    return "".join(sorted({char for char in literals if not char.isalpha() and not char.isspace()}))
+
+
+class TimeParser:
+    """
+    Parse times as get_valid_date does: with time format, and if it fails with FALLBACK_TIME_FORMAT.
+    Strings of fixed layout of formats are parsed without strptime, results are cached in LRU cache
+    of cache_size times, as timestamps often repeat.
+    """
+
+    def __init__(self, time_format: str, cache_size: int = DEFAULT_CACHE_SIZE) -> None:
+        """
+        :param time_format: format of times
+        :param cache_size: number of parsed times kept, 0 disables cache
+        """
+        self._time_format = time_format
+        self._cache_size = cache_size
+        self._layout = compile_layout(time_format)
+        self._fallback_layout = compile_layout(FALLBACK_TIME_FORMAT)
+        self._required = _required_literals(time_format)
+        self._parse = self._make_parse()
+
+    @property
+    def time_format(self) -> str:
+        return self._time_format
+
+    def _make_parse(self) -> tp.Callable[[tp.Any], datetime]:
+        if self._cache_size > 0:
+            return lru_cache(maxsize=self._cache_size)(self._parse_uncached)
+        return self._parse_uncached
+
+    def __getstate__(self) -> dict[str, tp.Any]:
+        # cache is not picklable and is not worth sending to other processes
+        state = self.__dict__.copy()
+        del state["_parse"]
+        return state
+
+    def __setstate__(self, state: dict[str, tp.Any]) -> None:
+        self.__dict__.update(state)
+        self._parse = self._make_parse()
+
+    def __call__(self, time: tp.Any) -> datetime:
+        """Parse time into datetime"""
+        return self._parse(time)
+
+    def micros(self, time: tp.Any) -> int:
+        """Parse time into microseconds since 1970-01-01"""
+        return (self._parse(time) - EPOCH) // MICROSECOND
+
+    def _parse_uncached(self, time: tp.Any) -> datetime:
+        if isinstance(time, str):
+            result = self._parse_layout(time, self._layout)
+            if result is not None:
+                return result
+            # strptime can't parse string with format if it lacks some of format's literals
+            if any(char not in time for char in self._required):
+                result = self._parse_layout(time, self._fallback_layout)
+                if result is not None:
+                    return result
+        return get_valid_date(time, self._time_format)
+
+    @staticmethod
+    def _parse_layout(time: str, layout: TLayout | None) -> datetime | None:
+        if layout is None:
+            return None
+        pattern, positions, fraction, iso = layout
+        match = pattern.fullmatch(time)
+        if match is None:
+            return None
+        if iso:
+            try:
+                return datetime.fromisoformat(time)
+            except ValueError:
+                return None
+        groups = match.groups()
+        values = [int(groups[position]) if position >= 0 else 0 for position in positions]
+        microsecond = int(groups[-1].ljust(6, "0")) if fraction else 0
+        try:
+            return datetime(*values, microsecond)
+        except ValueError:  # e.g. day 31 of 30-day month, strptime tells what is wrong
+            return None
@@ -0,0 +1,106 @@
+import pickle
+import struct
+import typing as tp
+from multiprocessing import connection
+
+from compgraph.misc import TRow
+from compgraph.misc import TRowsGenerator
+from compgraph.misc import TRowsIterable
+from compgraph.record import pack_rows
+from compgraph.record import unpack_rows
+
+DEFAULT_BATCH_SIZE = 4096
+DEFAULT_BATCH_BYTES = 2**20
+OUT_OF_BAND_BYTES = 2**16
+
+_HEADER = struct.Struct("<I")
+_END_OF_STREAM = 0xFFFFFFFF
+
+
+def send_batch(endpoint: connection.Connection, rows: list[TRow]) -> int:
+    """Send rows as a single message, bytes values of at least OUT_OF_BAND_BYTES travel as out-of-band
+    buffers and are not copied into pickled payload
+    :param endpoint: connection to send to
+    :param rows: batch of rows
+    :return: size in bytes of in-band payload
+    """
+    buffers: list[pickle.PickleBuffer] = []
+    payload = pickle.dumps(pack_rows(rows, OUT_OF_BAND_BYTES), protocol=5, buffer_callback=buffers.append)
+    endpoint.send_bytes(_HEADER.pack(len(buffers)) + payload)
+    for buffer in buffers:
+        endpoint.send_bytes(buffer.raw())
+    return len(payload)
+
+
+def send_end(endpoint: connection.Connection) -> None:
+    """Mark the end of rows stream"""
+    endpoint.send_bytes(_HEADER.pack(_END_OF_STREAM))
+
+
+def recv_batch(endpoint: connection.Connection) -> tuple[list[TRow], int] | None:
+    """Receive batch sent by send_batch
+    :return: rows and size of in-band payload or None at the end of stream
+    """
+    message = endpoint.recv_bytes()
+    (n_buffers,) = _HEADER.unpack_from(message)
+    if n_buffers == _END_OF_STREAM:
+        return None
+    buffers = [endpoint.recv_bytes() for _ in range(n_buffers)]
+    payload = memoryview(message)[_HEADER.size:]
+    return unpack_rows(pickle.loads(payload, buffers=buffers)), len(payload)
+
+
+class BatchSender:
+    """
+    Collect rows and send them by batches. Batch is limited by number of rows and adapts
+    that limit so that pickled batches stay around batch_bytes.
+    """
+
+    def __init__(
+        self,
+        endpoint: connection.Connection,
+        batch_size: int = DEFAULT_BATCH_SIZE,
+        batch_bytes: int = DEFAULT_BATCH_BYTES,
+    ) -> None:
+        """
+        :param endpoint: connection to send to
+        :param batch_size: maximal number of rows in batch
+        :param batch_bytes: desired size of pickled batch
+        """
+        self._endpoint = endpoint
+        self._max_rows = max(1, batch_size)
+        self._batch_bytes = batch_bytes
+        self._limit = self._max_rows
+        self._batch: list[TRow] = []
+        self.rows = 0
+
+    def send(self, row: TRow) -> None:
+        self._batch.append(row)
+        if len(self._batch) >= self._limit:
+            self.flush()
+
+    def send_all(self, rows: TRowsIterable) -> None:
+        for row in rows:
+            self.send(row)
+
+    def flush(self) -> None:
+        if not self._batch:
+            return
+        size = send_batch(self._endpoint, self._batch)
+        self.rows += len(self._batch)
+        if size > self._batch_bytes:
+            self._limit = max(1, self._limit * self._batch_bytes // size)
+        elif size < self._batch_bytes // 2:
+            self._limit = min(self._max_rows, self._limit * 2)
+        self._batch = []
+
+    def close(self) -> None:
+        """Send collected rows and end of stream mark"""
+        self.flush()
+        send_end(self._endpoint)
+
+
+def recv_rows(endpoint: connection.Connection) -> TRowsGenerator:
+    """Receive rows until the end of stream mark"""
+    while (batch := recv_batch(endpoint)) is not None:
+        yield from batch[0]
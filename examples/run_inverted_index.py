@@ -11,10 +11,7 @@ from compgraph.algorithms import inverted_index_graph
 def run_inverted_index(input_filepath: str, output_filepath: str) -> None:
     graph = inverted_index_graph(input_filepath, from_file=True)
 
-    result = graph.run()
-    print(result)
-    with open(output_filepath, "w") as out:
-        json.dump(list(result), out)
+    graph.write_to_file(output_filepath)
 
 
 if __name__ == "__main__":
@@ -35,7 +32,4 @@ if __name__ == "__main__":
 
     graph = inverted_index_graph(input_filename, from_file=True)
 
-    result = graph.run()
-    # print(list(result))
-    with open(output_filename, "w") as out:
-        json.dump(list(result), out)
+    graph.write_to_file(output_filename)
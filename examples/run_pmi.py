@@ -1,5 +1,3 @@
-import json
-
 import click
 
 from compgraph.algorithms import pmi_graph
@@ -11,9 +9,7 @@ from compgraph.algorithms import pmi_graph
 def run_pmi(input_filepath: str, output_filepath: str) -> None:
     graph = pmi_graph(input_filepath, from_file=True)
 
-    result = graph.run(input=lambda: input_filepath)
-    with open(output_filepath, "w") as out:
-        json.dump(list(result), out)
+    graph.write_to_file(output_filepath, input=lambda: input_filepath)
 
 
 if __name__ == "__main__":
@@ -1,5 +1,3 @@
-import json
-
 import click
 
 from compgraph.algorithms import word_count_graph
@@ -11,11 +9,7 @@ from compgraph.algorithms import word_count_graph
 def main(input_stream_name: str, output_filepath: str) -> None:
     graph = word_count_graph(input_stream_name=input_stream_name, from_file=True)
 
-    result = graph.run()
-    with open(output_filepath, "w") as out:
-        # for row in result:
-        #     print(row, file=out)
-        json.dump(list(result), out)
+    graph.write_to_file(output_filepath)
 
 
 if __name__ == "__main__":
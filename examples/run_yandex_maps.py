@@ -1,5 +1,3 @@
-import json
-
 import click
 
 from compgraph.algorithms import yandex_maps_graph
@@ -19,9 +17,7 @@ def run_yandex_maps(
         length_from_file=True,
     )
 
-    result = graph.run()
-    with open(output_filepath, "w") as out:
-        json.dump(list(result), out)
+    graph.write_to_file(output_filepath)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,60 @@
+"""Small seeded inputs of algorithms for tests, the same arguments always give the same rows"""
+import random
+import string
+import typing as tp
+from datetime import datetime
+from datetime import timedelta
+
+from compgraph.operations import TRow
+
+TIME_FORMAT = "%Y%m%dT%H%M%S.%f"
+
+
+def docs(count: int, vocabulary: int = 100, words_per_doc: int = 10, seed: int = 0) -> list[TRow]:
+    """Documents {"doc_id": ..., "text": ...} of words of vocabulary, some capitalized or with punctuation"""
+    rnd = random.Random(seed)
+    words = sorted({"".join(rnd.choices(string.ascii_lowercase, k=rnd.randint(2, 8))) for _ in range(vocabulary)})
+    rows = []
+    for doc_id in range(count):
+        # the first words are more frequent, as in ordinary text
+        chosen = [words[int(len(words) * rnd.random() ** 2)] for _ in range(rnd.randint(1, 2 * words_per_doc - 1))]
+        text = " ".join(
+            (word.capitalize() if rnd.random() < 0.1 else word) + rnd.choice(["", "", "", ",", ".", "!"])
+            for word in chosen
+        )
+        rows.append({"doc_id": doc_id, "text": text})
+    return rows
+
+
+def edges(count: int, seed: int = 0) -> list[TRow]:
+    """Edges {"edge_id": ..., "start": [lon, lat], "end": [lon, lat]} up to a couple of kilometers long"""
+    rnd = random.Random(seed)
+    rows = []
+    for edge_id in range(count):
+        start = [37.3 + rnd.random() * 0.6, 55.5 + rnd.random() * 0.4]
+        end = [start[0] + rnd.uniform(-0.02, 0.02), start[1] + rnd.uniform(-0.01, 0.01)]
+        rows.append({"edge_id": edge_id, "start": start, "end": end})
+    return rows
+
+
+def travels(count: int, edges: int, seed: int = 0) -> list[TRow]:
+    """Travels {"edge_id": ..., "enter_time": ..., "leave_time": ...} over edges during four weeks"""
+    rnd = random.Random(seed)
+    first = datetime(2017, 10, 1)
+    rows = []
+    for _ in range(count):
+        enter = first + timedelta(microseconds=rnd.randrange(28 * 86_400_000_000))
+        leave = enter + timedelta(microseconds=rnd.randrange(5_000_000, 600_000_000))
+        rows.append(
+            {
+                "edge_id": rnd.randrange(edges),
+                "enter_time": enter.strftime(TIME_FORMAT),
+                "leave_time": leave.strftime(TIME_FORMAT),
+            }
+        )
+    return rows
+
+
+def sources(rows: dict[str, list[TRow]]) -> dict[str, tp.Callable[[], tp.Iterator[TRow]]]:
+    """Keyword arguments of Graph.run reading copies of rows, as mappers may change rows in place"""
+    return {name: (lambda source=source: (dict(row) for row in source)) for name, source in rows.items()}
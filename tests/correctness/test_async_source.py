@@ -0,0 +1,140 @@
+import asyncio
+import typing as tp
+
+import pytest
+
+from benchmarks.data import text_corpus
+from compgraph.graph import Graph
+from compgraph.joiner import InnerJoiner
+from compgraph.mapper import Tokenize
+from compgraph.operations import Mapper
+from compgraph.operations import TRow
+from compgraph.operations import TRowsGenerator
+from compgraph.reducer import Count
+
+
+class Counted(Mapper):
+    """Pass rows as is counting them"""
+
+    def __init__(self, callback: tp.Callable[[TRow], None] = lambda row: None) -> None:
+        self.rows = 0
+        self._callback = callback
+
+    def __call__(self, row: TRow) -> TRowsGenerator:
+        self.rows += 1
+        self._callback(row)
+        yield row
+
+
+async def _aiter(rows: tp.Iterable[TRow], pause: float | None = None) -> tp.AsyncGenerator[TRow, None]:
+    for row in rows:
+        yield dict(row)
+        if pause is not None:
+            await asyncio.sleep(pause)
+
+
+def _word_count(graph: Graph) -> Graph:
+    return graph.map(Tokenize("text")).sort(["text"]).reduce(Count("count"), ["text"]).sort(["count", "text"])
+
+
+@pytest.mark.parametrize("buffer_size", [1, 7, 4096])
+def test_rows_are_the_same_as_of_run(buffer_size: int) -> None:
+    docs = text_corpus(200, vocabulary=50, words_per_doc=10, seed=1)
+    expected = list(_word_count(Graph.graph_from_iter("docs")).run(docs=lambda: (dict(doc) for doc in docs)))
+    graph = _word_count(Graph.graph_from_async_iter("docs", buffer_size))
+
+    assert asyncio.run(graph.arun(docs=_aiter(docs))) == expected
+    assert asyncio.run(graph.arun(docs=_aiter(docs, pause=0))) == expected
+
+
+def test_source_read_twice_must_be_function() -> None:
+    rows = [{"k": index % 5, "n": index} for index in range(50)]
+    graph = Graph.graph_from_async_iter("rows").sort(["k"])
+    graph = graph.join(InnerJoiner(), Graph.graph_from_async_iter("rows").sort(["k"]), ["k"])
+    expected = list(
+        Graph.graph_from_iter("rows").sort(["k"]).join(InnerJoiner(), Graph.graph_from_iter("rows").sort(["k"]), ["k"])
+        .run(rows=lambda: iter(rows))
+    )
+
+    assert asyncio.run(graph.arun(rows=lambda: _aiter(rows))) == expected
+    with pytest.raises(ValueError):
+        asyncio.run(graph.arun(rows=_aiter(rows)))
+
+
+def test_async_and_sync_sources_together() -> None:
+    left = [{"k": index, "a": index} for index in range(20)]
+    right = [{"k": index, "b": -index} for index in range(0, 20, 2)]
+    graph = Graph.graph_from_async_iter("left").join(InnerJoiner(), Graph.graph_from_iter("right"), ["k"])
+
+    result = asyncio.run(graph.arun(left=_aiter(left), right=lambda: iter(right)))
+
+    assert result == [{"k": index, "a": index, "b": -index} for index in range(0, 20, 2)]
+
+
+def test_source_is_read_ahead_by_about_buffer_size() -> None:
+    counted = Counted()
+    ahead = []
+
+    async def rows() -> tp.AsyncGenerator[TRow, None]:
+        for index in range(2000):
+            ahead.append(index - counted.rows)
+            yield {"n": index}
+            await asyncio.sleep(0)
+
+    graph = Graph.graph_from_async_iter("rows", buffer_size=40).map(counted)
+
+    assert len(asyncio.run(graph.arun(optimize=False, rows=rows()))) == 2000
+    assert max(ahead) <= 2 * 40
+
+
+def test_rows_of_slow_source_are_not_held_in_batch() -> None:
+    # every row is given only after the graph has got the previous one, rows must not wait for a full batch
+    async def main() -> list[TRow]:
+        loop = asyncio.get_running_loop()
+        taken = asyncio.Queue[int]()
+
+        async def rows() -> tp.AsyncGenerator[TRow, None]:
+            for index in range(5):
+                yield {"n": index}
+                assert await taken.get() == index
+
+        counted = Counted(lambda row: loop.call_soon_threadsafe(taken.put_nowait, row["n"]))
+        graph = Graph.graph_from_async_iter("rows").map(counted)
+        return await asyncio.wait_for(graph.arun(optimize=False, rows=rows()), timeout=10)
+
+    assert asyncio.run(main()) == [{"n": index} for index in range(5)]
+
+
+def test_error_of_source_is_raised_by_arun() -> None:
+    async def rows() -> tp.AsyncGenerator[TRow, None]:
+        yield {"n": 0}
+        raise KeyError("broken")
+
+    with pytest.raises(KeyError, match="broken"):
+        asyncio.run(Graph.graph_from_async_iter("rows").arun(rows=rows()))
+
+
+def test_cancelled_arun_stops_graph_thread() -> None:
+    counted = Counted()
+
+    async def rows() -> tp.AsyncGenerator[TRow, None]:
+        index = 0
+        while True:
+            yield {"n": index}
+            index += 1
+            await asyncio.sleep(0)
+
+    async def main() -> None:
+        task = asyncio.create_task(Graph.graph_from_async_iter("rows", 16).map(counted).arun(rows=rows()))
+        while counted.rows < 100:
+            await asyncio.sleep(0.01)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        await asyncio.sleep(0.1)
+
+    asyncio.run(main())
+    rows_read = counted.rows
+    assert rows_read >= 100
+    asyncio.run(asyncio.sleep(0.1))
+    assert counted.rows == rows_read
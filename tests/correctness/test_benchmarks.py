@@ -0,0 +1,96 @@
+import argparse
+import copy
+from collections import Counter
+from datetime import datetime
+
+import pytest
+
+from benchmarks.data import road_edges
+from benchmarks.data import sources
+from benchmarks.data import text_corpus
+from benchmarks.data import TIME_FORMAT
+from benchmarks.data import travel_log
+from benchmarks.data import zipf_weights
+from benchmarks.suite import CASES
+from benchmarks.suite import compare
+from benchmarks.suite import run_case
+
+
+def _args(**kwargs: object) -> argparse.Namespace:
+    defaults = {
+        "repeat": 1,
+        "seed": 0,
+        "vocabulary": 50,
+        "words_per_doc": 5,
+        "exponent": 1.1,
+        "edges": 10,
+        "skew": 0.0,
+    }
+    return argparse.Namespace(**(defaults | kwargs))
+
+
+def test_data_is_the_same_for_the_same_seed() -> None:
+    assert text_corpus(20, 50, seed=1) == text_corpus(20, 50, seed=1)
+    assert text_corpus(20, 50, seed=1) != text_corpus(20, 50, seed=2)
+    assert travel_log(20, 5, seed=1) == travel_log(20, 5, seed=1)
+    assert road_edges(5, seed=1) == road_edges(5, seed=1)
+
+
+def test_zipf_exponent_skews_frequencies() -> None:
+    def top_share(exponent: float) -> float:
+        docs = text_corpus(200, vocabulary=100, exponent=exponent, seed=3)
+        words = Counter(word.strip(",.!?;").lower() for doc in docs for word in doc["text"].split())
+        return words.most_common(1)[0][1] / sum(words.values())
+
+    assert top_share(2.0) > top_share(1.0) > top_share(0.0)
+    assert zipf_weights(4, 0.0) == [1.0, 2.0, 3.0, 4.0]
+
+
+@pytest.mark.parametrize("skew", [0.0, 1.5])
+def test_travels_are_over_known_edges(skew: float) -> None:
+    travels = travel_log(300, 7, skew=skew, seed=4)
+
+    assert {travel["edge_id"] for travel in travels} <= {edge["edge_id"] for edge in road_edges(7)}
+    for travel in travels:
+        enter_time = datetime.strptime(travel["enter_time"], TIME_FORMAT)
+        assert enter_time < datetime.strptime(travel["leave_time"], TIME_FORMAT)
+    if skew:
+        assert Counter(travel["edge_id"] for travel in travels).most_common(1)[0][1] > 300 / 7 * 2
+
+
+def test_sources_give_copies_of_rows() -> None:
+    rows = [{"a": 1}]
+    source = sources({"rows": rows})["rows"]
+    next(source())["a"] = 2
+    assert list(source()) == [{"a": 1}]
+
+
+@pytest.mark.parametrize("algorithm", list(CASES))
+def test_case_result(algorithm: str) -> None:
+    result = run_case(algorithm, 20, _args())
+
+    graph, rows = CASES[algorithm](20, _args())
+    assert result["output_rows"] == sum(1 for _ in graph.run(**sources(rows)))
+    assert result["input_rows"] == sum(len(source) for source in rows.values())
+    assert result["wall_time"] > 0
+    assert result["rows_per_second"] == pytest.approx(result["input_rows"] / result["wall_time"])
+    assert result["operations"][-1]["rows_out"] == result["output_rows"]
+
+
+def test_compare_finds_regressions() -> None:
+    baseline = {"results": [{"algorithm": "pmi", "size": 10, "output_rows": 5, "wall_time": 1.0, "peak_rss": 100}]}
+    results = copy.deepcopy(baseline)
+
+    assert compare(results, baseline, 0.25, 0.25) == []
+
+    result = results["results"][0]
+    result.update(wall_time=1.2, peak_rss=120)
+    assert compare(results, baseline, 0.25, 0.25) == []
+
+    result.update(output_rows=6, wall_time=1.5, peak_rss=200)
+    regressions = compare(results, baseline, 0.25, 0.25)
+    assert len(regressions) == 3
+    assert all(regression.startswith("pmi size=10: ") for regression in regressions)
+
+    result.update(size=20)
+    assert compare(results, baseline, 0.25, 0.25) == []
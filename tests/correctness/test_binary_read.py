@@ -0,0 +1,96 @@
+import json
+import os
+import typing as tp
+
+import pytest
+
+from compgraph import operation
+from compgraph.algorithms import json_line_parser
+from compgraph.graph import Graph
+from compgraph.operation import Read
+from compgraph.operations import TRowsGenerator
+from compgraph.parallel import ParallelRead
+
+
+def _write(tmp_path: tp.Any, content: bytes) -> str:
+    filename = os.path.join(str(tmp_path), "input.txt")
+    with open(filename, "wb") as f:
+        f.write(content)
+    return filename
+
+
+def _bytes_parser(line: tp.Any) -> TRowsGenerator:
+    yield {"line": bytes(line)}
+
+
+CONTENTS = [
+    b"",
+    b"\n",
+    b"no newline",
+    b"a\nb\n\nd\n",
+    b"a\r\nb\r\n",
+    b"".join(b"%d\n" % index for index in range(1000)),
+]
+
+
+@pytest.mark.parametrize("content", CONTENTS)
+def test_binary_lines_are_lines_of_file(tmp_path: str, content: bytes) -> None:
+    filename = _write(tmp_path, content)
+
+    result = [row["line"] for row in Read(filename, _bytes_parser, binary=True)()]
+
+    assert result == content.splitlines(keepends=True)
+
+
+def test_parser_gets_slices_of_map(tmp_path: str) -> None:
+    filename = _write(tmp_path, b"first\nsecond\n")
+    lines: list[tp.Any] = []
+
+    def parser(line: tp.Any) -> TRowsGenerator:
+        assert isinstance(line, memoryview)
+        assert line.readonly
+        lines.append(line)
+        yield {"line": line.tobytes()}
+
+    assert [row["line"] for row in Read(filename, parser, binary=True)()] == [b"first\n", b"second\n"]
+    # slices are released before map is closed
+    with pytest.raises(ValueError):
+        lines[0].tobytes()
+
+
+def test_pages_are_released_while_reading(tmp_path: str, monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(operation, "RELEASE_BYTES", 1)
+    content = b"".join(b"%06d\n" % index for index in range(5000))
+    filename = _write(tmp_path, content)
+
+    result = [row["line"] for row in Read(filename, _bytes_parser, binary=True)()]
+
+    assert result == content.splitlines(keepends=True)
+
+
+def test_binary_json_graph_equals_text_graph(tmp_path: str) -> None:
+    rows = [{"id": index, "text": f"строка {index}"} for index in range(100)]
+    filename = _write(tmp_path, "".join(json.dumps([row], ensure_ascii=False) + "\n" for row in rows).encode())
+
+    binary = Graph.graph_from_file(filename, json_line_parser, binary=True)
+    text = Graph.graph_from_file(filename, json_line_parser)
+
+    assert list(binary.run()) == list(text.run()) == rows
+
+
+@pytest.mark.parametrize("content", CONTENTS + [b"old mac\rline endings\r\n"])
+@pytest.mark.parametrize("range_bytes", [1, 7, 10**6])
+def test_binary_parallel_read_equals_binary_read(tmp_path: str, content: bytes, range_bytes: int) -> None:
+    filename = _write(tmp_path, content)
+
+    expected = list(Read(filename, _bytes_parser, binary=True)())
+    result = list(ParallelRead(filename, _bytes_parser, workers=2, range_bytes=range_bytes, binary=True)())
+
+    assert result == expected
+
+
+def test_binary_graph_from_file_with_workers(tmp_path: str) -> None:
+    rows = [{"id": index, "text": f"текст {index}"} for index in range(200)]
+    filename = _write(tmp_path, "".join(json.dumps([row]) + "\n" for row in rows).encode())
+
+    assert list(Graph.graph_from_file(filename, json_line_parser, workers=2, binary=True).run()) == rows
@@ -0,0 +1,75 @@
+import typing as tp
+from copy import copy
+
+import pytest
+
+from compgraph.graph import Graph
+from compgraph.joiner import InnerJoiner
+from compgraph.operation import RowMapper
+from compgraph.operations import Cache
+from compgraph.operations import CacheLevel
+from compgraph.operations import TRow
+
+
+class CountingMapper(RowMapper):
+    def __init__(self) -> None:
+        self.calls = 0
+
+    def apply(self, row: TRow) -> TRow | None:
+        self.calls += 1
+        return row | {"doubled": row["n"] * 2}
+
+    def columns_read(self) -> tp.Collection[str] | None:
+        return ("n",)
+
+    def columns_written(self) -> tp.Collection[str] | None:
+        return ("doubled",)
+
+
+class Overwrite(RowMapper):
+    def apply(self, row: TRow) -> TRow | None:
+        row["doubled"] = -1
+        return row
+
+
+def _branches(level: str) -> tuple[Graph, CountingMapper]:
+    mapper = CountingMapper()
+    shared = Graph.graph_from_iter("rows").map(mapper).cache(level)
+    left = copy(shared).map(Overwrite()).sort(["n"])
+    right = copy(shared).sort(["n"])
+    return left.join(InnerJoiner(), right, ["n"]), mapper
+
+
+@pytest.mark.parametrize("level", [CacheLevel.memory, CacheLevel.disk])
+def test_shared_subgraph_is_computed_once_per_run(level: str) -> None:
+    rows = [{"n": index} for index in range(20)]
+    graph, mapper = _branches(level)
+
+    result = list(graph.run(rows=lambda: iter(rows)))
+
+    assert mapper.calls == 20
+    assert [row["n"] for row in result] == list(range(20))
+    # rows changed by one consumer are not seen by another
+    assert all(row["doubled_1"] == -1 and row["doubled_2"] == row["n"] * 2 for row in result)
+
+    list(graph.run(rows=lambda: iter(rows)))
+    assert mapper.calls == 40
+
+
+def test_cached_graph_reads_source_once() -> None:
+    reads = []
+
+    def source() -> tp.Iterator[TRow]:
+        reads.append(1)
+        yield from ({"n": index} for index in range(5))
+
+    shared = Graph.graph_from_iter("rows").cache()
+    graph = copy(shared).join(InnerJoiner(), copy(shared), ["n"])
+
+    assert len(list(graph.run(rows=source))) == 5
+    assert len(reads) == 1
+
+
+def test_cache_is_exported() -> None:
+    assert CacheLevel("disk") == CacheLevel.disk
+    assert Cache(CacheLevel.memory).output_order(("a",)) == ("a",)
@@ -0,0 +1,100 @@
+import typing as tp
+
+import pytest
+
+from compgraph.graph import Graph
+from compgraph.mapper import Divide
+from compgraph.mapper import Filter
+from compgraph.mapper import NaturalLog
+from compgraph.mapper import Product
+from compgraph.mapper import Project
+from compgraph.operations import TRow
+from compgraph.optimizer import describe
+
+np = pytest.importorskip("numpy")
+
+from compgraph.columnar import RecordBatch  # noqa: E402
+
+
+def _rows(count: int) -> list[TRow]:
+    return [{"id": index, "a": index % 17 + 1, "b": (index * 7) % 5 + 0.5, "tag": [index]} for index in range(count)]
+
+
+def _graph() -> Graph:
+    return (
+        Graph.graph_from_iter("rows")
+        .map(Product(["a", "b"], "p"))
+        .map(Filter(lambda row: row["a"] > 3, ["a"], batch_condition=lambda batch: batch["a"] > 3))
+        .map(Divide("a", "b", "d"))
+        .map(NaturalLog("d", "l"))
+        .map(Project(["id", "p", "d", "l", "tag"]))
+    )
+
+
+def _assert_same_rows(result: list[TRow], expected: list[TRow]) -> None:
+    assert len(result) == len(expected)
+    for row, expected_row in zip(result, expected):
+        assert list(row) == list(expected_row)
+        assert {key: value for key, value in row.items() if key != "tag"} == pytest.approx(
+            {key: value for key, value in expected_row.items() if key != "tag"}, rel=1e-12
+        )
+        assert row["tag"] == expected_row["tag"]
+
+
+@pytest.mark.parametrize("batch_size", [1, 7, 1000])
+def test_batches_give_the_same_rows(batch_size: int) -> None:
+    rows = _rows(300)
+    graph = _graph()
+
+    expected = list(graph.run(optimize=False, rows=lambda: (dict(row) for row in rows)))
+    result = list(graph.run(batch_size=batch_size, rows=lambda: (dict(row) for row in rows)))
+
+    _assert_same_rows(result, expected)
+
+
+def test_consecutive_batch_mappers_become_one_batch_map() -> None:
+    steps = [describe(step) for step in _graph().optimize(batch_size=16)._operations[::-1]]
+    assert steps == ["ReadIterFactory", "BatchMap(Filter, Product, Divide, NaturalLog, Project)"]
+
+
+def test_filter_without_batch_condition_is_applied_to_rows() -> None:
+    rows = _rows(50)
+    graph = _graph().map(Filter(lambda row: row["id"] % 2 == 0))
+
+    steps = [describe(step) for step in graph.optimize(batch_size=16)._operations[::-1]]
+    assert steps[-1] == "Map(Filter)"
+    _assert_same_rows(
+        list(graph.run(batch_size=16, rows=lambda: (dict(row) for row in rows))),
+        list(graph.run(optimize=False, rows=lambda: (dict(row) for row in rows))),
+    )
+
+
+def test_division_by_zero_raises_as_in_rows() -> None:
+    rows: list[TRow] = [{"a": 1.0, "b": 2.0}, {"a": 1.0, "b": 0.0}]
+    graph = Graph.graph_from_iter("rows").map(Divide("a", "b", "d"))
+
+    with pytest.raises(ArithmeticError):
+        list(graph.run(optimize=False, rows=lambda: iter([dict(row) for row in rows])))
+    with pytest.raises(ArithmeticError):
+        list(graph.run(batch_size=8, rows=lambda: iter([dict(row) for row in rows])))
+
+
+def test_record_batch_keeps_untouched_columns() -> None:
+    rows: list[TRow] = [{"a": 1, "s": "x", "o": {"k": 1}}, {"a": 2, "s": "y", "o": {"k": 2}}]
+    objects = [row["o"] for row in rows]
+    batch = RecordBatch(rows)
+
+    batch["c"] = batch["a"] * 2
+    result = batch.filter(batch["a"] > 1).to_rows()
+
+    assert result == [{"a": 2, "s": "y", "o": {"k": 2}, "c": 4}]
+    assert result[0]["o"] is objects[1]
+    assert type(result[0]["c"]) is int
+
+
+def test_record_batch_select_builds_rows() -> None:
+    batch = RecordBatch([{"a": 1, "b": 2}, {"a": 3, "b": 4}])
+    batch["c"] = 0
+    rows: list[tp.Any] = batch.select(["c", "a"]).to_rows()
+    assert rows == [{"c": 0, "a": 1}, {"c": 0, "a": 3}]
+    assert [list(row) for row in rows] == [["c", "a"], ["c", "a"]]
@@ -0,0 +1,121 @@
+import math
+import os
+import typing as tp
+
+import pytest
+
+from compgraph import columnar_format
+from compgraph.algorithms import yandex_maps_graph
+from compgraph.columnar_format import COLUMNAR_SUFFIX
+from compgraph.columnar_format import ReadColumnar
+from compgraph.columnar_format import write_columnar
+from compgraph.graph import Graph
+from compgraph.mapper import Project
+from compgraph.operations import TRow
+from compgraph.sink import write_rows
+from tests.correctness.samples import edges
+from tests.correctness.samples import sources
+from tests.correctness.samples import travels
+
+ROWS: list[TRow] = [
+    {
+        "int": index,
+        "float": index / 3,
+        "bool": index % 2 == 0,
+        "str": f"value {index % 5}",
+        "mixed": [index] if index % 3 else None,
+        "big": 2**70 + index,
+    }
+    for index in range(50)
+]
+
+
+def _write(tmp_path: tp.Any, rows: list[TRow], row_group_size: int = 8) -> str:
+    path = os.path.join(str(tmp_path), "rows" + COLUMNAR_SUFFIX)
+    with open(path, "wb") as file:
+        assert write_columnar(file, rows, row_group_size) == len(rows)
+    return path
+
+
+def _track_decoding(monkeypatch: pytest.MonkeyPatch) -> list[str]:
+    """Encodings of decoded column chunks"""
+    decoded: list[str] = []
+    decode = columnar_format._decode
+
+    def tracked(encoding: str, data: bytes) -> list[tp.Any]:
+        decoded.append(encoding)
+        return decode(encoding, data)
+
+    monkeypatch.setattr(columnar_format, "_decode", tracked)
+    return decoded
+
+
+@pytest.mark.parametrize("row_group_size", [1, 8, 1000])
+def test_rows_are_read_back(tmp_path: str, row_group_size: int) -> None:
+    path = _write(tmp_path, ROWS, row_group_size)
+    result = list(ReadColumnar(path)())
+    assert result == ROWS
+    assert [type(value) for value in result[1].values()] == [type(value) for value in ROWS[1].values()]
+
+
+def test_rows_of_different_columns(tmp_path: str) -> None:
+    rows: list[TRow] = [{"a": 1}, {"b": "x"}, {"a": 2, "b": "y"}, {}, {"c": math.inf}]
+    assert list(ReadColumnar(_write(tmp_path, rows, 2))()) == rows
+
+
+def test_nan_is_kept(tmp_path: str) -> None:
+    rows: list[TRow] = [{"a": 1.0}, {"a": math.nan}]
+    result = list(ReadColumnar(_write(tmp_path, rows), ranges={"a": (None, None)})())
+    assert result[0] == {"a": 1.0}
+    assert math.isnan(result[1]["a"])
+
+
+def test_only_requested_columns_are_decoded(tmp_path: str, monkeypatch: pytest.MonkeyPatch) -> None:
+    path = _write(tmp_path, ROWS)
+    decoded = _track_decoding(monkeypatch)
+
+    result = list(ReadColumnar(path, columns=["str", "int"])())
+
+    assert result == [{"int": row["int"], "str": row["str"]} for row in ROWS]
+    assert set(decoded) == {"int64", "dict"}
+
+
+def test_row_groups_are_skipped_by_statistics(tmp_path: str, monkeypatch: pytest.MonkeyPatch) -> None:
+    path = _write(tmp_path, ROWS, row_group_size=10)
+    decoded = _track_decoding(monkeypatch)
+
+    result = list(ReadColumnar(path, columns=["int"], ranges={"int": (12, 17)})())
+
+    assert result == [{"int": index} for index in range(12, 18)]
+    assert decoded == ["int64"]
+
+
+def test_optimizer_reads_only_used_columns(tmp_path: str) -> None:
+    path = _write(tmp_path, ROWS)
+    graph = Graph.graph_from_columnar(path).map(Project(["str"]))
+
+    source = graph.optimize()._operations[-1]
+
+    assert isinstance(source, ReadColumnar)
+    assert source.columns == ("str",)
+    assert list(graph.run()) == [{"str": row["str"]} for row in ROWS]
+
+
+def test_not_columnar_file(tmp_path: str) -> None:
+    path = os.path.join(str(tmp_path), "rows.jsonl")
+    write_rows(ROWS, path)
+    with pytest.raises(ValueError):
+        list(ReadColumnar(path)())
+
+
+def test_yandex_maps_from_columnar_files(tmp_path: str) -> None:
+    data = {"travel_time": travels(300, 20, seed=3), "edge_length": edges(20, seed=3)}
+    paths = {}
+    for name, rows in data.items():
+        paths[name] = os.path.join(str(tmp_path), name + COLUMNAR_SUFFIX)
+        write_rows(rows, paths[name], fmt="columnar")
+
+    graph = yandex_maps_graph(paths["travel_time"], paths["edge_length"], time_from_file=True, length_from_file=True)
+    expected = yandex_maps_graph("travel_time", "edge_length").run(optimize=False, **sources(data))
+
+    assert list(graph.run()) == pytest.approx(list(expected))
@@ -0,0 +1,55 @@
+import os
+import random
+
+from compgraph.graph import Graph
+from compgraph.operations import TRow
+
+
+def _rows(count: int, seed: int = 0) -> list[TRow]:
+    rnd = random.Random(seed)
+    return [{"key": rnd.randrange(50), "order": index, "payload": "x" * rnd.randrange(20)} for index in range(count)]
+
+
+def test_sort_spills_runs_with_tiny_memory_limit(tmp_path: str) -> None:
+    rows = _rows(2000)
+    graph = Graph.graph_from_iter("rows").sort(["key"], memory_limit=256, tmp_dir=str(tmp_path))
+
+    result = list(graph.run(rows=lambda: iter(rows)))
+
+    assert result == sorted(rows, key=lambda row: row["key"])
+    assert os.listdir(tmp_path) == []
+
+
+def test_spilling_sort_is_stable(tmp_path: str) -> None:
+    rows = _rows(1000, seed=1)
+    graph = Graph.graph_from_iter("rows").sort(["key"], memory_limit=100, tmp_dir=str(tmp_path))
+
+    result = list(graph.run(rows=lambda: iter(rows)))
+
+    for previous, row in zip(result, result[1:]):
+        assert (previous["key"], previous["order"]) < (row["key"], row["order"])
+
+
+def test_sort_by_several_keys_matches_in_memory_sort(tmp_path: str) -> None:
+    rows = [{"a": index % 3, "b": -index, "c": index} for index in range(500)]
+    graph = Graph.graph_from_iter("rows").sort(["a", "b"], memory_limit=64, tmp_dir=str(tmp_path))
+
+    result = list(graph.run(rows=lambda: iter(rows)))
+
+    assert result == sorted(rows, key=lambda row: (row["a"], row["b"]))
+
+
+def test_sort_of_empty_input() -> None:
+    graph = Graph.graph_from_iter("rows").sort(["a"], memory_limit=1)
+    assert list(graph.run(rows=lambda: iter([]))) == []
+
+
+def test_tmp_dir_is_cleaned_when_result_is_closed_early(tmp_path: str) -> None:
+    rows = _rows(1000, seed=2)
+    graph = Graph.graph_from_iter("rows").sort(["key"], memory_limit=128, tmp_dir=str(tmp_path))
+
+    result = graph.run(rows=lambda: iter(rows))
+    next(iter(result))
+    result.close()  # type: ignore[attr-defined]
+
+    assert os.listdir(tmp_path) == []
@@ -0,0 +1,133 @@
+import os
+import random
+import typing as tp
+
+import pytest
+
+from compgraph import hash_aggregate
+from compgraph.graph import Graph
+from compgraph.hash_aggregate import HashReduce
+from compgraph.operations import TRow
+from compgraph.reducer import Count
+from compgraph.reducer import NUnique
+from compgraph.reducer import Sum
+
+
+class Key:
+    """Orderable key value, equal to keys of the same value whether they can be hashed or not"""
+
+    def __init__(self, value: int) -> None:
+        self.value = value
+
+    def __eq__(self, other: object) -> bool:
+        return isinstance(other, Key) and self.value == other.value
+
+    def __lt__(self, other: "Key") -> bool:
+        return self.value < other.value
+
+    def __hash__(self) -> int:
+        return hash(self.value)
+
+
+class Unhashable(Key):
+    __hash__ = None  # type: ignore[assignment]
+
+
+def _rows(count: int, groups: int, seed: int = 0) -> list[TRow]:
+    rnd = random.Random(seed)
+    return [{"key": rnd.randrange(groups), "value": rnd.randrange(100)} for _ in range(count)]
+
+
+def _sorted_reduce(rows: list[TRow], reducer: tp.Any, keys: list[str]) -> list[TRow]:
+    graph = Graph.graph_from_iter("rows").sort(keys).reduce(reducer, keys)
+    return list(graph.run(optimize=False, rows=lambda: iter(rows)))
+
+
+def test_hash_reduce_without_spilling_equals_sorted_reduce() -> None:
+    rows = _rows(500, 30)
+    result = list(HashReduce(Sum("value"), ["key"])(rows))
+    assert result == _sorted_reduce(rows, Sum("value"), ["key"])
+
+
+@pytest.mark.parametrize("max_groups, partitions", [(50, 4), (3, 2), (1, 2)])
+def test_spilled_partitions_are_partitioned_again(tmp_path: str, max_groups: int, partitions: int) -> None:
+    rows = _rows(3000, 400, seed=1)
+    reduce = HashReduce(Sum("value"), ["key"], max_groups=max_groups, partitions=partitions, tmp_dir=str(tmp_path))
+
+    assert list(reduce(rows)) == _sorted_reduce(rows, Sum("value"), ["key"])
+    assert os.listdir(tmp_path) == []
+
+
+@pytest.mark.parametrize("reducer", [Sum("value"), NUnique("value", "n")])
+def test_groups_are_spilled_by_estimated_bytes(tmp_path: str, monkeypatch: pytest.MonkeyPatch, reducer: tp.Any) -> None:
+    spills = []
+
+    class CountedSpillFile(hash_aggregate.SpillFile):
+        def __init__(self, directory: str | None = None) -> None:
+            super().__init__(directory)
+            spills.append(self.path)
+
+    monkeypatch.setattr(hash_aggregate, "SpillFile", CountedSpillFile)
+    monkeypatch.setattr(hash_aggregate, "_CHECK_ROWS", 100)
+    rows = _rows(3000, 60, seed=2)
+
+    assert list(HashReduce(reducer, ["key"], tmp_dir=str(tmp_path))(rows)) == _sorted_reduce(rows, reducer, ["key"])
+    assert not spills
+
+    # far fewer groups than max_groups, but pickled states of a few dozen groups are over the limit
+    reduce = HashReduce(reducer, ["key"], partitions=2, tmp_dir=str(tmp_path), memory_limit=500)
+    assert list(reduce(rows)) == _sorted_reduce(rows, reducer, ["key"])
+    assert spills
+    assert os.listdir(tmp_path) == []
+
+
+def test_hash_reduce_groups_list_keys_as_sort_does() -> None:
+    rows = [{"key": [index % 3, [index % 2]], "value": index} for index in range(40)]
+    reduce = HashReduce(Sum("value"), ["key"], max_groups=2, partitions=2)
+
+    result = list(reduce(rows))
+
+    assert result == _sorted_reduce(rows, Sum("value"), ["key"])
+    assert all(isinstance(row["key"], list) for row in result)
+
+
+@pytest.mark.parametrize("max_groups", [1000, 4])
+def test_unhashable_keys_are_reduced_by_sorting(tmp_path: str, max_groups: int) -> None:
+    # hashable keys come first, so states of the table and of spilled partitions are sorted along
+    rows = [{"key": Key(index % 10), "value": index} for index in range(30)]
+    rows += [{"key": Unhashable(index % 5), "value": index} for index in range(30)]
+    rows += [{"key": Key(index % 10), "value": index} for index in range(30)]
+    reduce = HashReduce(Sum("value"), ["key"], max_groups=max_groups, partitions=2, tmp_dir=str(tmp_path))
+
+    result = list(reduce(rows))
+
+    assert result == _sorted_reduce(rows, Sum("value"), ["key"])
+    assert [type(row["key"]) for row in result] == [Key] * 10
+    assert os.listdir(tmp_path) == []
+
+
+@pytest.mark.parametrize("optimize", [True, False])
+def test_combined_reduce_of_list_keys(optimize: bool) -> None:
+    rows = [{"k": [1, 2]}, {"k": [3]}, {"k": [1, 2]}, {"k": []}]
+    graph = Graph.graph_from_iter("r").sort(["k"]).reduce(Count("c"), ["k"])
+
+    assert list(graph.run(optimize=optimize, r=lambda: iter(rows))) == [
+        {"count": 1, "k": []},
+        {"count": 2, "k": [1, 2]},
+        {"count": 1, "k": [3]},
+    ]
+
+
+def test_combined_reduce_of_unhashable_keys() -> None:
+    rows = [{"k": Unhashable(index % 4), "v": index} for index in range(20)]
+    graph = Graph.graph_from_iter("r").sort(["k"]).reduce(Sum("v"), ["k"])
+
+    assert list(graph.run(r=lambda: iter(rows))) == list(graph.run(optimize=False, r=lambda: iter(rows)))
+
+
+@pytest.mark.parametrize("strategy", ["hash", "auto"])
+def test_hash_strategy_of_list_keys(strategy: str) -> None:
+    rows = [{"k": [index % 3], "v": index} for index in range(30)]
+    graph = Graph.graph_from_iter("r").reduce(Sum("v"), ["k"], strategy=strategy)
+
+    assert list(graph.run(r=lambda: iter(rows))) == _sorted_reduce(rows, Sum("v"), ["k"])
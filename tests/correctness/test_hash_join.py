@@ -0,0 +1,145 @@
+import os
+import random
+import typing as tp
+
+import pytest
+
+from compgraph import hash_join
+from compgraph.algorithms import yandex_maps_graph
+from compgraph.graph import Graph
+from compgraph.hash_join import HashJoin
+from compgraph.joiner import InnerJoiner
+from compgraph.joiner import Joiner
+from compgraph.joiner import LeftJoiner
+from compgraph.joiner import OuterJoiner
+from compgraph.joiner import RightJoiner
+from compgraph.operations import TRow
+from tests.correctness.samples import edges
+from tests.correctness.samples import sources
+from tests.correctness.samples import travels
+
+JOINERS = [InnerJoiner, LeftJoiner, RightJoiner, OuterJoiner]
+
+
+def _mixed_rows(count: int, keys: int, seed: int) -> list[TRow]:
+    """Rows of different schemas, so columns become duplicated at different keys"""
+    rnd = random.Random(seed)
+    rows = []
+    for index in range(count):
+        row: TRow = {"k": rnd.randrange(keys), "n": index}
+        for column in rnd.sample(["a", "b", "c"], rnd.randrange(3)):
+            row[column] = rnd.randrange(10)
+        rows.append(row)
+    return rows
+
+
+def _canonical(rows: tp.Iterable[TRow]) -> list[str]:
+    return sorted(repr(sorted(row.items())) for row in rows)
+
+
+def _merge_join(joiner: Joiner, left: list[TRow], right: list[TRow], keys: list[str]) -> list[TRow]:
+    graph = Graph.graph_from_iter("left").sort(keys).join(joiner, Graph.graph_from_iter("right").sort(keys), keys)
+    return list(graph.run(optimize=False, left=lambda: iter(left), right=lambda: iter(right)))
+
+
+def _rows(count: int, keys: int, seed: int, column: str) -> list[TRow]:
+    """Rows of the same columns, "n" and "x" are met in both sides"""
+    rnd = random.Random(seed)
+    return [{"k": rnd.randrange(keys), "n": index, "x": rnd.randrange(10), column: index} for index in range(count)]
+
+
+def _pairs(left: list[TRow], right: list[TRow]) -> list[TRow]:
+    """Pairs of rows of equal keys with columns of both rows of a pair suffixed"""
+    return [
+        {"k": row_a["k"]}
+        | {key + "_1" if key in row_b else key: value for key, value in row_a.items() if key != "k"}
+        | {key + "_2" if key in row_a else key: value for key, value in row_b.items() if key != "k"}
+        for row_a in left
+        for row_b in right
+        if row_a["k"] == row_b["k"]
+    ]
+
+
+@pytest.mark.parametrize("joiner_type", JOINERS)
+@pytest.mark.parametrize("max_rows", [10**6, 50])
+def test_rows_of_the_same_columns_are_joined_as_in_merge_join(
+    tmp_path: str, monkeypatch: pytest.MonkeyPatch, joiner_type: tp.Type[Joiner], max_rows: int
+) -> None:
+    # read sides in small chunks, so that both of them outgrow max_rows and are partitioned
+    monkeypatch.setattr(hash_join, "READ_CHUNK_SIZE", 16)
+    left = _rows(300, 40, seed=1, column="a")
+    right = _rows(200, 50, seed=2, column="b")
+    join = HashJoin(joiner_type(), ["k"], max_rows=max_rows, partitions=3, tmp_dir=str(tmp_path))
+
+    result = list(join(left, right))
+
+    assert _canonical(result) == _canonical(_merge_join(joiner_type(), left, right, ["k"]))
+    assert os.listdir(tmp_path) == []
+
+
+@pytest.mark.parametrize("joiner_type", JOINERS)
+@pytest.mark.parametrize("max_rows", [10**6, 50])
+def test_mixed_schemas(monkeypatch: pytest.MonkeyPatch, joiner_type: tp.Type[Joiner], max_rows: int) -> None:
+    monkeypatch.setattr(hash_join, "READ_CHUNK_SIZE", 16)
+    left = _mixed_rows(300, 40, seed=1)
+    right = _mixed_rows(200, 50, seed=2)
+
+    result = list(HashJoin(joiner_type(), ["k"], max_rows=max_rows, partitions=3)(left, right))
+
+    # "n" is in every row, so only pairs have both "n_1" and "n_2"
+    pairs = [row for row in result if "n_1" in row and "n_2" in row]
+    # right joiner puts right row first and suffixes its columns with the first suffix
+    assert _canonical(pairs) == _canonical(_pairs(right, left) if joiner_type is RightJoiner else _pairs(left, right))
+    # rows without a pair are suffixed by columns duplicated before their keys, as merge join does
+    expected = [row for row in _merge_join(joiner_type(), left, right, ["k"]) if not ("n_1" in row and "n_2" in row)]
+    assert _canonical(row for row in result if not ("n_1" in row and "n_2" in row)) == _canonical(expected)
+
+
+def test_pairs_are_yielded_while_probe_side_is_read() -> None:
+    read = []
+
+    def probe() -> tp.Iterator[TRow]:
+        for index in range(10**5):
+            read.append(index)
+            yield {"k": index % 10, "b": index}
+
+    result = HashJoin(InnerJoiner(), ["k"])([{"k": index, "a": index} for index in range(10)], probe())
+
+    assert next(result) == {"k": 0, "a": 0, "b": 0}
+    assert len(read) < 10**4
+
+
+@pytest.mark.parametrize("max_rows", [10**6, 5])
+def test_list_keys(monkeypatch: pytest.MonkeyPatch, max_rows: int) -> None:
+    monkeypatch.setattr(hash_join, "READ_CHUNK_SIZE", 4)
+    left = [{"k": [index % 4, [index % 2]], "a": index} for index in range(30)]
+    right = [{"k": [index % 5, [index % 2]], "a": -index} for index in range(20)]
+
+    result = list(HashJoin(OuterJoiner(), ["k"], max_rows=max_rows, partitions=2)(left, right))
+
+    assert _canonical(result) == _canonical(_merge_join(OuterJoiner(), left, right, ["k"]))
+
+
+def test_hash_strategy_of_graph_join() -> None:
+    left = _rows(100, 20, seed=3, column="a")
+    right = _rows(100, 20, seed=4, column="b")
+    graph = Graph.graph_from_iter("left").join(InnerJoiner(), Graph.graph_from_iter("right"), ["k"], strategy="hash")
+
+    result = list(graph.run(left=lambda: iter(left), right=lambda: iter(right)))
+
+    assert _canonical(result) == _canonical(_merge_join(InnerJoiner(), left, right, ["k"]))
+
+
+def test_yandex_maps_speeds_are_the_same_as_with_merge_join(monkeypatch: pytest.MonkeyPatch) -> None:
+    data = sources({"travel_time": travels(3000, 50, seed=3), "edge_length": edges(50, seed=3)})
+    result = list(yandex_maps_graph("travel_time", "edge_length").run(**data))
+
+    join = Graph.join
+
+    def merge_join(graph: Graph, joiner: Joiner, other: Graph, keys: tp.Sequence[str], **kwargs: tp.Any) -> Graph:
+        return join(graph.sort(keys), joiner, other.sort(keys), keys)
+
+    monkeypatch.setattr(Graph, "join", merge_join)
+
+    # speeds are equal exactly, rows of groups are summed in the same order
+    assert result == list(yandex_maps_graph("travel_time", "edge_length").run(**data))
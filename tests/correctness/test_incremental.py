@@ -0,0 +1,87 @@
+import os
+import typing as tp
+
+import pytest
+
+from benchmarks.data import sources
+from benchmarks.data import text_corpus
+from compgraph.algorithms import inverted_index_graph
+from compgraph.algorithms import word_count_graph
+from compgraph.graph import Graph
+from compgraph.incremental import StateStore
+from compgraph.mapper import Filter
+from compgraph.operations import TRow
+from compgraph.reducer import Count
+from compgraph.reducer import NUnique
+from compgraph.reducer import Sum
+from compgraph.reducer import TopN
+
+
+def _chunks(rows: list[TRow], count: int) -> list[list[TRow]]:
+    size = -(-len(rows) // count)
+    return [rows[start:start + size] for start in range(0, len(rows), size)]
+
+
+def _check_runs(tmp_path: str, graph: Graph, rows: list[TRow], runs: int, **kwargs: tp.Any) -> None:
+    """Every incremental run over the next chunk of rows gives the same result as a full recompute"""
+    path = os.path.join(str(tmp_path), "state")
+    seen: list[TRow] = []
+    for chunk in _chunks(rows, runs):
+        seen += chunk
+        result = list(graph.run(state=StateStore(path), **kwargs, **sources({"rows": chunk})))
+        assert result == pytest.approx(list(graph.run(**kwargs, **sources({"rows": seen}))))
+    assert sorted(os.listdir(str(tmp_path))) == ["state"]
+
+
+@pytest.mark.parametrize("make_graph", [word_count_graph, inverted_index_graph])
+def test_text_algorithms_match_full_recompute(tmp_path: str, make_graph: tp.Callable[[str], Graph]) -> None:
+    docs = text_corpus(90, vocabulary=40, words_per_doc=8, seed=11)
+    _check_runs(tmp_path, make_graph("rows"), docs, runs=4)
+
+
+@pytest.mark.parametrize("optimize", [True, False])
+@pytest.mark.parametrize("strategy", ["sort", "hash"])
+def test_reduces_of_list_keys(tmp_path: str, optimize: bool, strategy: str) -> None:
+    rows = [{"k": [index % 3, [index % 2]], "v": index} for index in range(60)]
+    graph = Graph.graph_from_iter("rows").map(Filter(lambda row: row["v"] % 5 != 0))
+    if strategy == "sort":
+        graph = graph.sort(["k"])
+    graph = graph.reduce(Sum("v"), ["k"], strategy=strategy).reduce(NUnique("v", "n"), [])
+
+    _check_runs(tmp_path, graph, rows, runs=3, optimize=optimize)
+
+
+def test_reduces_after_incremental_ones_see_all_groups(tmp_path: str) -> None:
+    rows = [{"k": index % 5, "v": 1} for index in range(40)]
+    graph = Graph.graph_from_iter("rows").sort(["k"]).reduce(Count("count"), ["k"]).reduce(TopN("count", 2), [])
+    _check_runs(tmp_path, graph, rows, runs=4)
+
+
+def test_states_are_saved_only_when_result_is_read(tmp_path: str) -> None:
+    path = os.path.join(str(tmp_path), "state")
+    graph = Graph.graph_from_iter("rows").sort(["k"]).reduce(Count("count"), ["k"])
+    first = [{"k": index % 3} for index in range(9)]
+    second = [{"k": index % 4} for index in range(8)]
+    list(graph.run(state=StateStore(path), **sources({"rows": first})))
+
+    rows = iter(graph.run(state=StateStore(path), **sources({"rows": second})))
+    next(rows)
+    rows.close()  # type: ignore[attr-defined]
+
+    result = list(graph.run(state=StateStore(path), **sources({"rows": second})))
+    assert result == list(graph.run(**sources({"rows": first + second})))
+
+
+def test_graphs_which_cannot_be_incremental(tmp_path: str) -> None:
+    path = os.path.join(str(tmp_path), "state")
+    rows = sources({"rows": [{"k": 1, "v": 2}]})
+
+    with pytest.raises(ValueError):
+        list(Graph.graph_from_iter("rows").sort(["k"]).reduce(TopN("v", 1), ["k"]).run(state=StateStore(path), **rows))
+    with pytest.raises(ValueError):
+        list(Graph.graph_from_iter("rows").map(Filter(lambda row: True)).run(state=StateStore(path), **rows))
+
+    list(Graph.graph_from_iter("rows").reduce(Sum("v"), ["k"], strategy="hash").run(state=StateStore(path), **rows))
+    other = Graph.graph_from_iter("rows").reduce(Count("n"), ["v"], strategy="hash")
+    with pytest.raises(ValueError, match="another graph"):
+        list(other.run(state=StateStore(path), **rows))
@@ -0,0 +1,75 @@
+import os
+import random
+import typing as tp
+
+import pytest
+
+from compgraph import spill
+from compgraph.graph import Graph
+from compgraph.joiner import InnerJoiner
+from compgraph.joiner import Joiner
+from compgraph.joiner import LeftJoiner
+from compgraph.joiner import OuterJoiner
+from compgraph.joiner import RightJoiner
+from compgraph.operations import TRow
+
+JOINERS = [InnerJoiner, LeftJoiner, RightJoiner, OuterJoiner]
+
+
+def _rows(count: int, keys: int, seed: int) -> list[TRow]:
+    """Groups of different sizes, rows of different schemas"""
+    rnd = random.Random(seed)
+    rows = []
+    for index in range(count):
+        row: TRow = {"k": int(rnd.paretovariate(1.0)) % keys, "n": index}
+        for column in rnd.sample(["a", "b"], rnd.randrange(3)):
+            row[column] = rnd.randrange(10)
+        rows.append(row)
+    return rows
+
+
+def _join(joiner: Joiner, left: list[TRow], right: list[TRow]) -> list[TRow]:
+    graph = Graph.graph_from_iter("left").sort(["k"]).join(joiner, Graph.graph_from_iter("right").sort(["k"]), ["k"])
+    return list(graph.run(optimize=False, left=lambda: iter(left), right=lambda: iter(right)))
+
+
+def _join_lazily(joiner: Joiner, rows: list[TRow]) -> tp.Iterator[TRow]:
+    graph = Graph.graph_from_iter("left").join(joiner, Graph.graph_from_iter("right"), ["k"])
+    return graph.run(optimize=False, left=lambda: iter(rows), right=lambda: iter(rows))
+
+
+@pytest.mark.parametrize("joiner_type", JOINERS)
+@pytest.mark.parametrize("sides", [(200, 150), (200, 0), (0, 150)])
+def test_spilled_groups_are_joined_as_in_memory(
+    tmp_path: str, monkeypatch: pytest.MonkeyPatch, joiner_type: tp.Type[Joiner], sides: tuple[int, int]
+) -> None:
+    spills = []
+
+    class CountedSpillFile(spill.SpillFile):
+        def __init__(self, directory: str | None = None) -> None:
+            super().__init__(directory)
+            spills.append(self.path)
+
+    monkeypatch.setattr(spill, "SpillFile", CountedSpillFile)
+    left = _rows(sides[0], 12, seed=1)
+    right = _rows(sides[1], 15, seed=2)
+
+    result = _join(joiner_type(max_rows=2, tmp_dir=str(tmp_path)), left, right)
+
+    expected = _join(joiner_type(), left, right)
+    assert result == expected
+    assert all(os.path.dirname(path) == str(tmp_path) for path in spills)
+    if all(sides):  # groups of the other side are buffered only when there is one
+        assert spills
+    assert os.listdir(tmp_path) == []
+
+
+def test_spill_is_removed_when_join_is_not_read_to_the_end(tmp_path: str) -> None:
+    rows = [{"k": 0, "n": index} for index in range(10)]
+    result = iter(_join_lazily(InnerJoiner(max_rows=2, tmp_dir=str(tmp_path)), rows))
+
+    next(result)
+    assert os.listdir(tmp_path)
+    result.close()  # type: ignore[attr-defined]
+
+    assert os.listdir(tmp_path) == []
@@ -0,0 +1,140 @@
+import json
+import os
+import typing as tp
+from copy import copy
+
+import pytest
+
+from compgraph.algorithms import inverted_index_graph
+from compgraph.algorithms import pmi_graph
+from compgraph.algorithms import word_count_graph
+from compgraph.algorithms import yandex_maps_graph
+from compgraph.graph import Graph
+from compgraph.joiner import InnerJoiner
+from compgraph.mapper import Divide
+from compgraph.mapper import Filter
+from compgraph.mapper import Project
+from compgraph.operations import TRow
+from compgraph.optimizer import describe
+from tests.correctness.samples import docs
+from tests.correctness.samples import edges
+from tests.correctness.samples import sources
+from tests.correctness.samples import travels
+
+
+def _write_lines(path: str, rows: list[TRow]) -> str:
+    with open(path, "w") as file:
+        for start in range(0, len(rows), 7):
+            file.write(json.dumps(rows[start:start + 7]) + "\n")
+    return path
+
+
+@pytest.mark.parametrize("from_file", [False, True])
+def test_optimized_algorithms_give_the_same_rows(tmp_path: str, from_file: bool) -> None:
+    # Graph.run optimizes by default, every graph of compgraph.algorithms must give exactly the same rows
+    rows = {
+        "docs": docs(60, vocabulary=40, words_per_doc=12, seed=3),
+        "travel_time": travels(500, 30, seed=3),
+        "edge_length": edges(30, seed=3),
+    }
+    if from_file:
+        names = {name: _write_lines(os.path.join(str(tmp_path), f"{name}.jsonl"), rows[name]) for name in rows}
+        data: dict[str, tp.Any] = {}
+    else:
+        names = {name: name for name in rows}
+        data = sources(rows)
+    graphs = [
+        word_count_graph(names["docs"], from_file=from_file),
+        inverted_index_graph(names["docs"], from_file=from_file),
+        pmi_graph(names["docs"], from_file=from_file),
+        yandex_maps_graph(
+            names["travel_time"], names["edge_length"], time_from_file=from_file, length_from_file=from_file
+        ),
+    ]
+
+    for graph in graphs:
+        result = list(graph.run(**data))
+        assert result
+        assert result == list(graph.run(optimize=False, **data))
+
+
+def _steps(graph: Graph) -> list[str]:
+    return [describe(step) for step in graph.optimize()._operations[::-1]]
+
+
+def test_filter_with_columns_moves_ahead_of_sort() -> None:
+    rows = [{"a": index % 7, "b": index} for index in range(50)]
+    graph = Graph.graph_from_iter("rows").sort(["a"]).map(Filter(lambda row: row["b"] % 2 == 0, ["b"]))
+
+    assert _steps(graph) == ["ReadIterFactory", "Map(Filter)", "ExternalSort(keys=['a'])"]
+    assert list(graph.run(rows=lambda: iter(rows))) == list(graph.run(optimize=False, rows=lambda: iter(rows)))
+
+
+def test_filter_without_columns_stays_after_sort() -> None:
+    seen: list[int] = []
+
+    def first_of_each_key(row: TRow) -> bool:
+        # depends on order of rows: keeps the first row of every run of equal keys
+        keep = not seen or seen[-1] != row["a"]
+        seen.append(row["a"])
+        return keep
+
+    rows = [{"a": index % 3, "b": index} for index in range(12)]
+    graph = Graph.graph_from_iter("rows").sort(["a"]).map(Filter(first_of_each_key))
+
+    assert _steps(graph) == ["ReadIterFactory", "ExternalSort(keys=['a'])", "Map(Filter)"]
+    result = list(graph.run(rows=lambda: iter(rows)))
+    assert result == [{"a": 0, "b": 0}, {"a": 1, "b": 1}, {"a": 2, "b": 2}]
+
+
+def test_filter_moves_ahead_of_mapper_not_writing_its_columns() -> None:
+    rows = [{"a": index, "b": index * 10} for index in range(20)]
+    graph = (
+        Graph.graph_from_iter("rows")
+        .map(Project(["a", "b"]))
+        .map(Filter(lambda row: row["a"] > 10, ["a"]))
+    )
+    assert list(graph.run(rows=lambda: iter(rows))) == [row for row in rows if row["a"] > 10]
+
+
+def test_filter_on_join_keys_is_applied_to_both_sides() -> None:
+    left_rows = [{"k": index % 5, "l": index} for index in range(20)]
+    right_rows = [{"k": index, "r": -index} for index in range(5)]
+    right = Graph.graph_from_iter("right").sort(["k"])
+    graph = (
+        Graph.graph_from_iter("left")
+        .sort(["k"])
+        .join(InnerJoiner(), right, ["k"])
+        .map(Filter(lambda row: row["k"] < 2, ["k"]))
+    )
+    kwargs = {"left": lambda: iter(left_rows), "right": lambda: iter(right_rows)}
+    optimized = graph.optimize()
+    assert "Map(Filter)" in [describe(step) for step in optimized._join_params[0]._operations]
+    assert list(graph.run(**kwargs)) == list(graph.run(optimize=False, **kwargs))
+
+
+def test_columns_are_pruned_before_sort_and_maps_are_fused() -> None:
+    rows = [{"a": index % 4, "unused": "x" * 10, "b": index + 1} for index in range(30)]
+    graph = (
+        Graph.graph_from_iter("rows")
+        .map(Filter(lambda row: row["b"] > 3, ["b"]))
+        .map(Filter(lambda row: row["b"] < 25, ["b"]))
+        .sort(["a"])
+        .map(Divide("a", "b", "c"))
+        .map(Project(["a", "c"]))
+    )
+    assert _steps(graph) == [
+        "ReadIterFactory",
+        "Map(Filter, Filter, PruneColumns)",
+        "ExternalSort(keys=['a'])",
+        "Map(Divide, Project)",
+    ]
+    assert list(graph.run(rows=lambda: iter(rows))) == list(graph.run(optimize=False, rows=lambda: iter(rows)))
+
+
+def test_optimize_does_not_change_graph() -> None:
+    graph = Graph.graph_from_iter("rows").sort(["a"]).map(Filter(lambda row: True, ["a"]))
+    operations = list(graph._operations)
+    copy(graph).optimize()
+    graph.optimize()
+    assert graph._operations == operations
@@ -0,0 +1,66 @@
+import typing as tp
+from operator import itemgetter
+
+import pytest
+
+from compgraph.graph import Graph
+from compgraph.mapper import LowerCase
+from compgraph.mapper import Split
+from compgraph.operations import TRow
+from compgraph.parallel import CHUNKS_PER_WORKER
+from compgraph.parallel import ParallelMap
+
+
+def _rows(count: int) -> list[TRow]:
+    return [{"id": index, "text": f"Word{index} Other{index % 7} LAST"} for index in range(count)]
+
+
+def _graph(workers: int | None, ordered: bool = True) -> Graph:
+    return (
+        Graph.graph_from_iter("rows")
+        .map(Split("text"), workers=workers, chunk_size=7, ordered=ordered)
+        .map(LowerCase("text"), workers=workers, chunk_size=5, ordered=ordered)
+    )
+
+
+def test_ordered_parallel_map_equals_serial_map() -> None:
+    rows = _rows(500)
+    expected = list(_graph(1).run(rows=lambda: iter(rows)))
+
+    assert list(_graph(2).run(rows=lambda: iter(rows))) == expected
+    assert list(_graph(2).run(optimize=False, rows=lambda: iter(rows))) == expected
+
+
+def test_unordered_parallel_map_gives_the_same_rows() -> None:
+    rows = _rows(500)
+    result = list(_graph(2, ordered=False).run(rows=lambda: iter(rows)))
+
+    key = itemgetter("id", "text")
+    assert sorted(result, key=key) == sorted(_graph(1).run(rows=lambda: iter(rows)), key=key)
+
+
+def test_input_is_read_only_as_fast_as_workers_process_it() -> None:
+    taken = 0
+
+    def rows() -> tp.Iterator[TRow]:
+        nonlocal taken
+        for row in _rows(10_000):
+            taken += 1
+            yield row
+
+    chunk_size = 10
+    result = ParallelMap(Split("text"), workers=2, chunk_size=chunk_size)(rows())
+    next(result)
+    result.close()
+
+    assert taken <= (2 * CHUNKS_PER_WORKER + 1) * chunk_size
+
+
+def test_empty_input() -> None:
+    assert list(ParallelMap(Split("text"), workers=2)([])) == []
+
+
+@pytest.mark.parametrize("workers, chunk_size", [(0, 10), (2, 0)])
+def test_invalid_parameters(workers: int, chunk_size: int) -> None:
+    with pytest.raises(ValueError):
+        ParallelMap(Split("text"), workers=workers, chunk_size=chunk_size)
@@ -0,0 +1,68 @@
+import json
+import os
+import typing as tp
+
+import pytest
+
+from compgraph.algorithms import json_line_parser
+from compgraph.graph import Graph
+from compgraph.operation import Read
+from compgraph.operations import TRowsGenerator
+from compgraph.parallel import ParallelRead
+
+
+def _line_parser(line: str) -> TRowsGenerator:
+    yield {"line": line}
+
+
+def _write(tmp_path: tp.Any, content: bytes) -> str:
+    filename = os.path.join(str(tmp_path), "input.txt")
+    with open(filename, "wb") as f:
+        f.write(content)
+    return filename
+
+
+CONTENTS = [
+    b"",
+    b"\n",
+    b"single line without newline",
+    b"first\nsecond\n\nfourth after empty one\n",
+    b"windows\r\nline endings\r\nmixed\nwith unix\r\n",
+    b"old mac\rline endings\r\rmixed\r\nwith others\nand\r",
+    b"\r\r\n\n\r",
+    "unicode ёжик\nи ещё строка\n".encode(),
+    b"".join(b"line number %d\n" % index for index in range(300)),
+]
+
+
+@pytest.mark.parametrize("content", CONTENTS)
+@pytest.mark.parametrize("range_bytes", [1, 7, 10**6])
+def test_parallel_read_equals_read(tmp_path: str, content: bytes, range_bytes: int) -> None:
+    filename = _write(tmp_path, content)
+
+    expected = list(Read(filename, _line_parser)())
+    result = list(ParallelRead(filename, _line_parser, workers=2, range_bytes=range_bytes)())
+
+    assert result == expected
+
+
+def test_unordered_parallel_read_gives_the_same_rows(tmp_path: str) -> None:
+    filename = _write(tmp_path, CONTENTS[-1])
+
+    result = list(ParallelRead(filename, _line_parser, workers=2, ordered=False, range_bytes=64)())
+
+    assert sorted(row["line"] for row in result) == sorted(row["line"] for row in Read(filename, _line_parser)())
+
+
+def test_graph_from_file_with_workers(tmp_path: str) -> None:
+    rows = [{"id": index, "text": f"текст {index}"} for index in range(200)]
+    filename = _write(tmp_path, "".join(json.dumps([row]) + "\n" for row in rows).encode())
+
+    graph = Graph.graph_from_file(filename, json_line_parser, workers=2)
+
+    assert list(graph.run()) == rows
+
+
+def test_invalid_range_size(tmp_path: str) -> None:
+    with pytest.raises(ValueError):
+        ParallelRead(_write(tmp_path, b""), _line_parser, workers=2, range_bytes=0)
@@ -0,0 +1,68 @@
+import os
+import subprocess
+import sys
+import typing as tp
+
+import pytest
+
+from compgraph.algorithms import pmi_graph
+from compgraph.algorithms import word_count_graph
+from compgraph.graph import Graph
+from compgraph.operation import FirstReducer
+from compgraph.operations import TRow
+from compgraph.parallel import ParallelReduce
+from compgraph.reducer import Sum
+from compgraph.reducer import TopN
+from tests.correctness.samples import docs
+from tests.correctness.samples import sources
+
+
+@pytest.mark.parametrize("make_graph", [word_count_graph, pmi_graph])
+@pytest.mark.parametrize("optimize", [True, False])
+def test_parallel_algorithms_give_the_same_rows(make_graph: tp.Callable[..., Graph], optimize: bool) -> None:
+    data = sources({"docs": docs(40, vocabulary=30, words_per_doc=10, seed=5)})
+
+    expected = list(make_graph("docs").run(optimize=False, **data))
+
+    assert list(make_graph("docs", workers=2).run(optimize=optimize, **data)) == expected
+
+
+def test_parallel_reduce_of_unsorted_rows(tmp_path: str) -> None:
+    rows = [{"k": index % 13, "v": index} for index in range(400)]
+    reduce = ParallelReduce(Sum("v"), ["k"], workers=3, memory_limit=64, tmp_dir=str(tmp_path))
+
+    result = list(reduce(rows))
+
+    serial = Graph.graph_from_iter("rows").sort(["k"]).reduce(Sum("v"), ["k"])
+    assert result == list(serial.run(optimize=False, rows=lambda: iter(rows)))
+    assert os.listdir(tmp_path) == []
+
+
+def test_partitions_are_sorted_by_sort_keys() -> None:
+    rows = [{"k": index % 5, "order": (index * 7) % 11, "v": index} for index in range(100)]
+    reduce = ParallelReduce(FirstReducer(), ["k"], workers=2, sort_keys=["k", "order"])
+
+    result = list(reduce(rows))
+
+    serial = Graph.graph_from_iter("rows").sort(["k", "order"]).reduce(FirstReducer(), ["k"])
+    assert result == list(serial.run(optimize=False, rows=lambda: iter(rows)))
+
+
+def test_list_keys() -> None:
+    rows: list[TRow] = [{"k": [index % 4, [index % 3]], "v": index} for index in range(60)]
+    graph = Graph.graph_from_iter("rows").reduce(TopN("v", 2), ["k"], workers=2)
+
+    serial = Graph.graph_from_iter("rows").sort(["k"]).reduce(TopN("v", 2), ["k"])
+    assert list(graph.run(rows=lambda: iter(rows))) == list(serial.run(optimize=False, rows=lambda: iter(rows)))
+
+
+@pytest.mark.parametrize("keys, sort_keys", [([], None), (["a"], ["b", "a"])])
+def test_keys_must_be_prefix_of_sort_keys(keys: list[str], sort_keys: list[str] | None) -> None:
+    with pytest.raises(ValueError):
+        ParallelReduce(Sum("v"), keys, workers=2, sort_keys=sort_keys)
+
+
+@pytest.mark.parametrize("module", ["compgraph.parallel", "compgraph.operations", "compgraph.external_sort"])
+def test_parallel_module_is_imported_without_cycle(module: str) -> None:
+    code = f"import {module}; from compgraph.operations import ParallelMap"
+    subprocess.run([sys.executable, "-c", code], check=True)
@@ -0,0 +1,157 @@
+import multiprocessing
+import threading
+import typing as tp
+
+import pytest
+
+from benchmarks.data import road_edges
+from benchmarks.data import sources
+from benchmarks.data import text_corpus
+from benchmarks.data import travel_log
+from compgraph.algorithms import inverted_index_graph
+from compgraph.algorithms import pmi_graph
+from compgraph.algorithms import word_count_graph
+from compgraph.algorithms import yandex_maps_graph
+from compgraph.external_sort import ExternalSort
+from compgraph.graph import Graph
+from compgraph.joiner import InnerJoiner
+from compgraph.joiner import Join
+from compgraph.mapper import Filter
+from compgraph.operations import Map
+from compgraph.operations import Mapper
+from compgraph.operations import ReadIterFactory
+from compgraph.operations import TRow
+from compgraph.operations import TRowsGenerator
+from compgraph import pipeline as pipelining
+from compgraph.pipeline import Pipeline
+from compgraph.pipeline import Pipelined
+from compgraph.pipeline import pipeline_graph
+from compgraph.pipeline import split_stages
+from compgraph.reducer import Count
+
+
+class Fail(Mapper):
+    """Raise on row with given value of column"""
+
+    def __init__(self, column: str, value: tp.Any) -> None:
+        self._column = column
+        self._value = value
+
+    def __call__(self, row: TRow) -> TRowsGenerator:
+        if row[self._column] == self._value:
+            raise ValueError(f"bad row {row}")
+        yield row
+
+
+def _rows(count: int) -> tp.Callable[[], tp.Iterator[TRow]]:
+    return lambda: ({"k": index % 7, "n": index} for index in range(count))
+
+
+@pytest.mark.parametrize("make_graph", [word_count_graph, inverted_index_graph, pmi_graph])
+def test_pipelined_text_algorithms(make_graph: tp.Callable[[str], Graph]) -> None:
+    docs = sources({"docs": text_corpus(60, vocabulary=40, words_per_doc=10, seed=5)})
+    graph = make_graph("docs")
+
+    assert list(graph.run(pipeline=Pipeline(queue_size=2, batch_size=16), **docs)) == list(graph.run(**docs))
+
+
+def test_pipelined_yandex_maps() -> None:
+    data = sources({"travel_time": travel_log(300, 20, seed=6), "edge_length": road_edges(20, seed=6)})
+    graph = yandex_maps_graph("travel_time", "edge_length")
+
+    assert list(graph.run(pipeline=True, **data)) == pytest.approx(list(graph.run(**data)))
+
+
+def test_statistics_of_queues() -> None:
+    graph = Graph.graph_from_iter("rows").map(Filter(lambda row: row["n"] % 2 == 0)).sort(["k"])
+    graph = graph.reduce(Count("count"), ["k"])
+    pipeline = Pipeline(queue_size=3, batch_size=10)
+
+    result = list(graph.run(optimize=False, pipeline=pipeline, rows=_rows(1000)))
+
+    assert graph.last_pipeline is pipeline
+    assert len(result) == 7
+    # filter | sort | count: input, two queues between stages, output
+    assert [stats.rows for stats in pipeline.queues] == [1000, 500, 500, 7]
+    assert [stats.batches for stats in pipeline.queues] == [100, 50, 50, 1]
+    assert pipeline.queues[0].producer == "input" and pipeline.queues[-1].consumer == "output"
+    assert all(stats.max_occupancy <= stats.capacity == 3 for stats in pipeline.queues)
+    assert len(pipeline.explain().splitlines()) == 4
+    assert pipeline.to_dict()["queues"][1]["rows"] == 500
+
+
+def test_stages_are_split_at_sorts() -> None:
+    first, second = Map(Filter(lambda row: True)), Map(Filter(lambda row: False))
+    sort = ExternalSort(["k"])
+
+    assert split_stages([first, second, sort, first]) == [[first, second], [sort], [first]]
+    assert split_stages([sort, sort]) == [[sort], [sort]]
+
+
+def test_error_of_stage_is_raised() -> None:
+    graph = Graph.graph_from_iter("rows").sort(["n"]).map(Fail("n", 500))
+
+    with pytest.raises(ValueError, match="bad row"):
+        list(graph.run(optimize=False, pipeline=Pipeline(batch_size=16), rows=_rows(1000)))
+
+
+def test_error_of_source_is_raised() -> None:
+    def rows() -> tp.Iterator[TRow]:
+        yield from _rows(100)()
+        raise KeyError("broken source")
+
+    graph = Graph.graph_from_iter("rows").map(Filter(lambda row: True)).sort(["k"])
+
+    with pytest.raises(KeyError, match="broken source"):
+        list(graph.run(optimize=False, pipeline=True, rows=rows))
+
+
+def test_stopped_pipeline_leaves_no_processes() -> None:
+    graph = Graph.graph_from_iter("rows").map(Filter(lambda row: True))
+    rows = graph.run(optimize=False, pipeline=Pipeline(queue_size=1, batch_size=4), rows=_rows(10**6))
+
+    assert next(iter(rows)) == {"k": 0, "n": 0}
+    rows.close()  # type: ignore[attr-defined]
+
+    assert multiprocessing.active_children() == []
+
+
+def test_pipelined_operations_are_between_sources_and_joins() -> None:
+    right = Graph.graph_from_iter("right").map(Filter(lambda row: row["n"] % 3 == 0)).sort(["k"])
+    graph = Graph.graph_from_iter("left").sort(["k"]).join(InnerJoiner(), right, ["k"]).map(Filter(lambda row: True))
+
+    pipelined = pipeline_graph(graph, Pipeline())
+
+    # operations are kept from the last one to the source
+    assert [type(step) for step in pipelined._operations] == [Pipelined, Join, Pipelined, ReadIterFactory]
+    assert [type(step) for step in pipelined._join_params[0]._operations] == [Pipelined, ReadIterFactory]
+    assert [type(step) for step in graph._operations] == [Map, Join, ExternalSort, ReadIterFactory]
+    data = {"left": _rows(200), "right": _rows(100)}
+    assert list(graph.run(optimize=False, pipeline=True, **data)) == list(graph.run(optimize=False, **data))
+
+
+def test_processes_of_all_segments_are_forked_before_feeding(monkeypatch: pytest.MonkeyPatch) -> None:
+    events = []
+    feed = pipelining._feed
+
+    class Process(multiprocessing.Process):
+        def start(self) -> None:
+            events.append(("fork", threading.active_count()))
+            super().start()
+
+    def traced_feed(*args: tp.Any) -> None:
+        events.append(("feed", 0))
+        feed(*args)
+
+    monkeypatch.setattr(pipelining, "Process", Process)
+    monkeypatch.setattr(pipelining, "_feed", traced_feed)
+    right = Graph.graph_from_iter("right").map(Filter(lambda row: row["n"] % 3 == 0)).sort(["k"])
+    graph = Graph.graph_from_iter("left").sort(["k"]).join(InnerJoiner(), right, ["k"]).map(Filter(lambda row: True))
+    data = {"left": _rows(200), "right": _rows(100)}
+
+    assert list(graph.run(optimize=False, pipeline=True, **data)) == list(graph.run(optimize=False, **data))
+
+    # three segments: left sort, right filter and sort, map after join
+    assert [event for event, _ in events] == ["fork"] * 4 + ["feed"] * 3
+    assert len({threads for event, threads in events if event == "fork"}) == 1
+    assert multiprocessing.active_children() == []
@@ -0,0 +1,122 @@
+import os
+import time
+import typing as tp
+
+import pytest
+
+from compgraph.algorithms import pmi_graph
+from compgraph.algorithms import word_count_graph
+from compgraph.graph import Graph
+from compgraph.joiner import InnerJoiner
+from compgraph.mapper import Filter
+from compgraph.operations import Mapper
+from compgraph.operations import TRow
+from compgraph.operations import TRowsGenerator
+from compgraph.profile import Profile
+from compgraph.reducer import Count
+from tests.correctness.samples import docs
+from tests.correctness.samples import sources
+
+
+class Sleep(Mapper):
+    """Pass rows as is sleeping for every row"""
+
+    def __init__(self, seconds: float) -> None:
+        self._seconds = seconds
+
+    def __call__(self, row: TRow) -> TRowsGenerator:
+        time.sleep(self._seconds)
+        yield row
+
+
+def test_profiled_run_gives_the_same_rows() -> None:
+    data = sources({"docs": docs(30, vocabulary=20, words_per_doc=8, seed=1)})
+    graph = pmi_graph("docs")
+
+    assert list(graph.run(profile=True, **data)) == list(graph.run(**data))
+    assert graph.last_profile is not None
+    assert len(graph.last_profile.operations) == len(graph.explain().splitlines())
+
+
+def test_rows_of_operations() -> None:
+    rows = [{"k": index % 3, "v": index} for index in range(30)]
+    graph = (
+        Graph.graph_from_iter("rows")
+        .map(Filter(lambda row: row["v"] % 2 == 0))
+        .sort(["k"])
+        .reduce(Count("count"), ["k"])
+    )
+    profile = Profile()
+
+    result = list(graph.run(optimize=False, profile=profile, rows=lambda: iter(rows)))
+
+    assert len(result) == 3
+    assert [(stats.rows_in, stats.rows_out) for stats in profile.operations] == [
+        (0, 30),
+        (30, 15),
+        (15, 15),
+        (15, 3),
+    ]
+    assert [stats.depth for stats in profile.operations] == [0, 0, 0, 0]
+
+
+def test_time_is_charged_to_operation_itself() -> None:
+    rows = [{"v": index} for index in range(20)]
+    graph = Graph.graph_from_iter("rows").map(Sleep(0.005)).map(Sleep(0))
+
+    list(graph.run(optimize=False, profile=True, rows=lambda: iter(rows)))
+
+    profile = graph.last_profile
+    assert profile is not None
+    source, slow, fast = profile.operations
+    assert slow.wall_time >= 0.09
+    assert fast.wall_time < slow.wall_time / 2
+    assert source.wall_time < slow.wall_time / 2
+    assert sum(stats.wall_time for stats in profile.operations) <= profile.wall_time * 1.01 + 0.001
+
+
+def test_join_subgraph_is_deeper() -> None:
+    rows = [{"k": index} for index in range(10)]
+    graph = Graph.graph_from_iter("left").join(InnerJoiner(), Graph.graph_from_iter("right").sort(["k"]), ["k"])
+    profile = Profile()
+
+    list(graph.run(optimize=False, profile=profile, left=lambda: iter(rows), right=lambda: iter(rows)))
+
+    assert [stats.depth for stats in profile.operations] == [0, 0, 1, 1]
+    join = profile.operations[1]
+    assert join.rows_in == 20
+    assert join.rows_out == 10
+
+
+@pytest.mark.parametrize("trace_memory", [False, True])
+def test_profile_is_saved_and_compared(tmp_path: str, trace_memory: bool) -> None:
+    data = sources({"docs": docs(20, vocabulary=10, words_per_doc=5, seed=2)})
+    graph = word_count_graph("docs")
+    baseline = Profile(trace_memory)
+    list(graph.run(profile=baseline, **data))
+    path = os.path.join(str(tmp_path), "profile.json")
+
+    baseline.save(path)
+    loaded = Profile.load(path)
+
+    assert loaded.to_dict() == baseline.to_dict()
+    assert len(baseline.explain().splitlines()) == len(baseline.operations) + 1
+    profile = Profile()
+    list(graph.run(profile=profile, **data))
+    assert len(profile.compare(loaded).splitlines()) == len(profile.operations) + 1
+    with pytest.raises(ValueError):
+        profile.compare(Profile())
+
+
+def _operations(profile: tp.Optional[Profile]) -> list[str]:
+    assert profile is not None
+    return [stats.operation for stats in profile.operations]
+
+
+def test_profile_lists_operations_of_optimized_graph() -> None:
+    rows = [{"k": index % 3} for index in range(10)]
+    graph = Graph.graph_from_iter("rows").sort(["k"]).reduce(Count("count"), ["k"])
+
+    list(graph.run(profile=True, rows=lambda: iter(rows)))
+
+    assert _operations(graph.last_profile) == [line.split("  ")[0].strip() for line in graph.explain().splitlines()]
@@ -0,0 +1,175 @@
+import gc
+import pickle
+import typing as tp
+from multiprocessing import Pipe
+
+import pytest
+
+from compgraph.algorithms import inverted_index_graph
+from compgraph.algorithms import pmi_graph
+from compgraph.algorithms import word_count_graph
+from compgraph.algorithms import yandex_maps_graph
+from compgraph.graph import Graph
+from compgraph.joiner import InnerJoiner
+from compgraph.joiner import OuterJoiner
+from compgraph.mapper import Divide
+from compgraph.mapper import Filter
+from compgraph.mapper import Product
+from compgraph.mapper import Project
+from compgraph.record import compact_rows
+from compgraph.record import pack_rows
+from compgraph.record import Record
+from compgraph.record import Schema
+from compgraph.record import unpack_rows
+from compgraph.transport import recv_rows
+from compgraph.transport import send_batch
+from compgraph.transport import send_end
+from tests.correctness.samples import docs
+from tests.correctness.samples import edges
+from tests.correctness.samples import sources
+from tests.correctness.samples import travels
+
+
+def test_record_behaves_as_dict() -> None:
+    row = Record.from_mapping({"a": 1, "b": 2})
+
+    row["c"] = 3
+    row["a"] = 0
+    del row["b"]
+
+    assert row == {"a": 0, "c": 3}
+    assert list(row) == ["a", "c"]
+    assert list(row.items()) == [("a", 0), ("c", 3)]
+    assert row.get("b", -1) == -1
+    assert "c" in row and "b" not in row
+    assert (row | {"d": 4}) == {"a": 0, "c": 3, "d": 4}
+    assert ({"d": 4} | row) == {"d": 4, "a": 0, "c": 3}
+    assert row.to_dict() == {"a": 0, "c": 3}
+
+
+def test_records_of_the_same_columns_share_schema() -> None:
+    first = Record.from_mapping({"a": 1, "b": 2})
+    second = Record.from_mapping({"a": 3, "b": 4})
+    copy = first.copy()
+    copy["a"] = 5
+
+    assert first.schema is second.schema is Schema.of(["a", "b"])
+    assert first["a"] == 1
+    with pytest.raises(ValueError):
+        Schema.of(["a", "a"])
+
+
+def test_unused_schemas_are_forgotten() -> None:
+    names = ("unused_a", "unused_b")
+    row = Record.from_mapping(dict.fromkeys(names, 0))
+    schema = row.schema
+    assert Schema.of(names) is schema
+
+    del row, schema
+    gc.collect()
+
+    assert names not in Schema._interned
+    assert Schema.of(names).names == names
+
+
+def test_records_are_pickled_by_runs_of_schema() -> None:
+    rows: list[tp.Any] = [Record.from_mapping({"a": index}) for index in range(3)] + [{"b": 1}]
+    rows.append(Record.from_mapping({"a": 3, "c": 4}))
+
+    result = unpack_rows(pickle.loads(pickle.dumps(pack_rows(rows))))
+
+    assert result == rows
+    assert [type(row) for row in result] == [type(row) for row in rows]
+    assert pickle.loads(pickle.dumps(rows[0])) == rows[0]
+
+
+def test_large_bytes_of_records_are_packed_as_buffers() -> None:
+    blob = b"x" * 1000
+    rows: list[tp.Any] = [Record.from_mapping({"a": 1, "blob": blob}), Record.from_mapping({"a": 2, "blob": b"y"})]
+    buffers: list[pickle.PickleBuffer] = []
+
+    payload = pickle.dumps(pack_rows(rows, buffer_bytes=1000), protocol=5, buffer_callback=buffers.append)
+
+    assert len(buffers) == 1
+    assert unpack_rows(pickle.loads(payload, buffers=[bytes(buffer.raw()) for buffer in buffers])) == rows
+    assert rows[0]["blob"] is blob
+
+
+def test_records_travel_as_records() -> None:
+    local, remote = Pipe()
+    rows = list(compact_rows([{"a": 1, "b": 2}, {"a": 3, "b": 4}, {"c": 5}]))
+    send_batch(local, rows)
+    send_end(local)
+
+    received = list(recv_rows(remote))
+    assert [dict(row) for row in received] == [{"a": 1, "b": 2}, {"a": 3, "b": 4}, {"c": 5}]
+    assert type(received[0]) is type(rows[0])
+
+
+@pytest.mark.parametrize("make_graph", [word_count_graph, inverted_index_graph, pmi_graph])
+@pytest.mark.parametrize("optimize", [True, False])
+def test_compact_text_algorithms(make_graph: tp.Callable[[str], Graph], optimize: bool) -> None:
+    data = sources({"docs": docs(40, vocabulary=30, words_per_doc=10, seed=7)})
+    graph = make_graph("docs")
+
+    result = list(graph.run(compact=True, optimize=optimize, **data))
+
+    assert result == list(graph.run(optimize=False, **data))
+    assert all(type(row) is dict for row in result)
+
+
+@pytest.mark.parametrize("batch_size", [1, 7, 1000])
+def test_records_in_batches(batch_size: int) -> None:
+    pytest.importorskip("numpy")
+    rows = [{"id": index, "a": index % 17 + 1, "b": (index * 7) % 5 + 0.5, "tag": [index]} for index in range(300)]
+    graph = (
+        Graph.graph_from_iter("rows")
+        .map(Product(["a", "b"], "p"))
+        .map(Filter(lambda row: row["a"] > 3, ["a"], batch_condition=lambda batch: batch["a"] > 3))
+        .map(Divide("a", "b", "d"))
+        .map(Project(["id", "p", "d", "tag"]))
+    )
+
+    result = list(graph.run(batch_size=batch_size, compact=True, rows=lambda: (dict(row) for row in rows)))
+
+    expected = list(graph.run(optimize=False, rows=lambda: (dict(row) for row in rows)))
+    assert result == pytest.approx(expected, rel=1e-12)
+    assert [list(row) for row in result] == [list(row) for row in expected]
+
+
+@pytest.mark.parametrize("batch_size", [None, 1, 64])
+def test_compact_yandex_maps(batch_size: int | None) -> None:
+    if batch_size is not None:
+        pytest.importorskip("numpy")
+    data = sources({"travel_time": travels(300, 20, seed=4), "edge_length": edges(20, seed=4)})
+    graph = yandex_maps_graph("travel_time", "edge_length")
+
+    result = list(graph.run(compact=True, batch_size=batch_size, **data))
+    assert result == pytest.approx(list(graph.run(optimize=False, **data)))
+
+
+@pytest.mark.parametrize("joiner_type", [InnerJoiner, OuterJoiner])
+def test_compact_join_of_mixed_schemas(joiner_type: tp.Callable[[], tp.Any]) -> None:
+    left = [{"k": index % 4, "a": index, **({"x": index} if index % 3 else {})} for index in range(20)]
+    right = [{"k": index % 5, "b": index, **({"x": -index} if index % 2 else {})} for index in range(15)]
+    graph = Graph.graph_from_iter("left").sort(["k"]).join(
+        joiner_type(), Graph.graph_from_iter("right").sort(["k"]), ["k"]
+    )
+    data = sources({"left": left, "right": right})
+
+    assert list(graph.run(compact=True, **data)) == list(graph.run(optimize=False, **data))
+
+
+def test_joiner_layouts_depend_on_duplicates_met_before() -> None:
+    # the same joiner joins groups with duplicates sets of the same contents
+    left = [{"k": 0, "a": 1, "x": 2}, {"k": 0, "a": 3}]
+    right = [{"k": 0, "b": 4}, {"k": 0, "b": 5, "a": 6}]
+    joiner = InnerJoiner()
+
+    for duplicates in [set(), {"x"}, set(), {"x"}, {"a"}]:
+        dict_dups, record_dups = set(duplicates), set(duplicates)
+        expected = list(InnerJoiner()(["k"], [dict(row) for row in left], [dict(row) for row in right], dict_dups))
+        result = list(joiner(["k"], list(compact_rows(left)), list(compact_rows(right)), record_dups))
+
+        assert result == expected
+        assert record_dups == dict_dups
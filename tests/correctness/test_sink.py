@@ -0,0 +1,96 @@
+import bz2
+import csv
+import gzip
+import json
+import lzma
+import os
+import typing as tp
+
+import pytest
+
+from compgraph.graph import Graph
+from compgraph.operations import TRow
+from compgraph.sink import write_rows
+
+ROWS: list[TRow] = [{"id": index, "text": f"строка\t{index}", "value": index / 4} for index in range(100)]
+OPENERS: dict[str | None, tp.Callable[..., tp.Any]] = {None: open, "gzip": gzip.open, "bz2": bz2.open, "xz": lzma.open}
+
+
+def _graph() -> Graph:
+    return Graph.graph_from_iter("rows")
+
+
+@pytest.mark.parametrize("compression", list(OPENERS))
+def test_jsonl_file_has_rows_of_run(tmp_path: str, compression: str | None) -> None:
+    path = os.path.join(str(tmp_path), "result.jsonl")
+
+    count = _graph().write_to_file(path, compression=compression, buffer_size=64, rows=lambda: iter(ROWS))
+
+    with OPENERS[compression](path, "rt", encoding="utf-8") as f:
+        assert [json.loads(line) for line in f] == ROWS
+    assert count == len(ROWS)
+    assert os.listdir(tmp_path) == ["result.jsonl"]
+
+
+def test_tsv_file_has_header_and_rows(tmp_path: str) -> None:
+    path = os.path.join(str(tmp_path), "result.tsv")
+
+    _graph().write_to_file(path, fmt="tsv", rows=lambda: iter(ROWS))
+
+    with open(path, encoding="utf-8", newline="") as f:
+        lines = list(csv.reader(f, dialect="excel-tab"))
+    assert lines[0] == ["id", "text", "value"]
+    assert lines[1:] == [[str(row["id"]), row["text"], str(row["value"])] for row in ROWS]
+
+
+def test_empty_result(tmp_path: str) -> None:
+    for fmt in ["jsonl", "tsv"]:
+        path = os.path.join(str(tmp_path), f"result.{fmt}")
+        assert _graph().write_to_file(path, fmt=fmt, rows=lambda: iter([])) == 0
+        assert os.path.getsize(path) == 0
+
+
+def _failing_rows() -> tp.Iterator[TRow]:
+    yield from ROWS[:10]
+    raise RuntimeError("source failed")
+
+
+@pytest.mark.parametrize("atomic", [True, False])
+def test_failed_run_leaves_previous_file_if_atomic(tmp_path: str, atomic: bool) -> None:
+    path = os.path.join(str(tmp_path), "result.jsonl")
+    with open(path, "w") as f:
+        f.write("previous\n")
+
+    with pytest.raises(RuntimeError):
+        _graph().write_to_file(path, atomic=atomic, rows=_failing_rows)
+
+    assert os.listdir(tmp_path) == ["result.jsonl"]
+    with open(path) as f:
+        content = f.read()
+    if atomic:
+        assert content == "previous\n"
+    else:
+        assert content != "previous\n"
+
+
+def test_invalid_parameters(tmp_path: str) -> None:
+    path = os.path.join(str(tmp_path), "result")
+    with pytest.raises(ValueError):
+        write_rows(ROWS, path, fmt="xml")
+    with pytest.raises(ValueError):
+        write_rows(ROWS, path, compression="zip")
+    with pytest.raises(ValueError):
+        write_rows(ROWS, path, fmt="columnar", compression="gzip")
+    assert os.listdir(tmp_path) == []
+
+
+def test_atomic_file_has_permissions_of_usual_new_file(tmp_path: str, monkeypatch: pytest.MonkeyPatch) -> None:
+    usual = os.path.join(str(tmp_path), "usual")
+    open(usual, "w").close()
+    path = os.path.join(str(tmp_path), "result.jsonl")
+
+    # umask is process-wide, changing it even for a moment races with other threads
+    monkeypatch.setattr(os, "umask", lambda mask: pytest.fail("umask is changed"))
+    _graph().write_to_file(path, rows=lambda: iter(ROWS))
+
+    assert os.stat(path).st_mode == os.stat(usual).st_mode
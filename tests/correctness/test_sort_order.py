@@ -0,0 +1,69 @@
+from compgraph.graph import Graph
+from compgraph.joiner import InnerJoiner
+from compgraph.mapper import LowerCase
+from compgraph.mapper import Project
+from compgraph.misc import order_prefix
+from compgraph.optimizer import describe
+from compgraph.reducer import Count
+from compgraph.reducer import Sum
+
+
+def _sorts(graph: Graph) -> list[str]:
+    return [describe(step) for step in graph.optimize()._operations[::-1] if "ExternalSort" in describe(step)]
+
+
+def test_order_prefix() -> None:
+    assert order_prefix(("a", "b", "c"), {"a", "b"}) == ("a", "b")
+    assert order_prefix(("a", "b"), {"b"}) == ()
+    assert order_prefix(("a", "b"), {"b"}, inside=False) == ("a",)
+
+
+def test_sort_by_prefix_of_known_order_is_removed() -> None:
+    rows = [{"a": index % 3, "b": index % 5, "c": index} for index in range(30)]
+    graph = Graph.graph_from_iter("rows").sort(["a", "b"]).sort(["a"])
+
+    assert _sorts(graph) == ["ExternalSort(keys=['a', 'b'])"]
+    assert "removed ExternalSort(keys=['a'])" in graph.explain()
+    assert list(graph.run(rows=lambda: iter(rows))) == list(graph.run(optimize=False, rows=lambda: iter(rows)))
+
+
+def test_sort_after_reduce_by_the_same_keys_is_removed() -> None:
+    rows = [{"a": index % 4, "n": index} for index in range(40)]
+    graph = Graph.graph_from_iter("rows").sort(["a"]).reduce(Sum("n"), ["a"]).sort(["a"])
+
+    assert _sorts(graph) == ["ExternalSort(keys=['a'])"]
+    assert list(graph.run(rows=lambda: iter(rows))) == list(graph.run(optimize=False, rows=lambda: iter(rows)))
+
+
+def test_sort_after_mapper_writing_sort_key_is_kept() -> None:
+    rows = [{"text": word} for word in ["b", "A", "a", "C", "B"]]
+    graph = Graph.graph_from_iter("rows").sort(["text"]).map(LowerCase("text")).sort(["text"])
+
+    assert len(_sorts(graph)) == 2
+    assert [row["text"] for row in graph.run(rows=lambda: iter(rows))] == ["a", "a", "b", "b", "c"]
+
+
+def test_sort_by_longer_keys_is_kept() -> None:
+    graph = Graph.graph_from_iter("rows").sort(["a"]).sort(["a", "b"])
+    assert len(_sorts(graph)) == 2
+
+
+def test_projection_keeps_order_of_kept_columns() -> None:
+    graph = Graph.graph_from_iter("rows").sort(["a", "b"]).map(Project(["a", "c"])).sort(["a"])
+    assert _sorts(graph) == ["ExternalSort(keys=['a', 'b'])"]
+
+
+def test_merge_join_keeps_order_of_keys() -> None:
+    left = [{"k": index % 4, "l": index} for index in range(8)]
+    right = [{"k": index, "r": index} for index in range(4)]
+    graph = (
+        Graph.graph_from_iter("left")
+        .sort(["k"])
+        .join(InnerJoiner(), Graph.graph_from_iter("right").sort(["k"]), ["k"])
+        .sort(["k"])
+        .reduce(Count("count"), ["k"])
+    )
+    kwargs = {"left": lambda: iter(left), "right": lambda: iter(right)}
+
+    assert len(_sorts(graph)) == 1
+    assert list(graph.run(**kwargs)) == [{"count": 2, "k": key} for key in range(4)]
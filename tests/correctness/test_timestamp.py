@@ -0,0 +1,125 @@
+import pickle
+import random
+import typing as tp
+from datetime import datetime
+
+import pytest
+
+from compgraph import reducer
+from compgraph.graph import Graph
+from compgraph.mapper import ParseTime
+from compgraph.misc import get_valid_date
+from compgraph.timestamp import compile_layout
+from compgraph.timestamp import TimeParser
+
+FORMATS = [
+    "%Y%m%dT%H%M%S.%f",
+    "%Y%m%dT%H%M%S",
+    "%Y-%m-%dT%H:%M:%S.%f",
+    "%Y-%m-%d %H:%M:%S",
+    "%d.%m.%Y",
+    "%Y%m%d",
+    "%Y%m%d%%%H",
+    "%H:%M %d/%m/%Y",
+    "%b %d %Y",
+]
+TIMES = [
+    "20171020T112238.723000",
+    "20171020T112238.7",
+    "20171020T112238",
+    "20171020T112238.",
+    "20171020T112238.1234567",
+    "20160229T235959.999999",
+    "20170229T000000",
+    "20171020T246000",
+    "2017102T11223",
+    "2017-10-20T11:22:38.5",
+    "2017-10-20T11:22:38",
+    "2017-10-20 11:22:38",
+    "2017-10-20 11:22",
+    "2017-1-2 3:4:5",
+    "20.10.2017",
+    "1.2.2017",
+    "20171020",
+    "20171020%11",
+    "11:22 20/10/2017",
+    "Oct 20 2017",
+    "",
+    " 20171020T112238",
+    "20171020T112238 ",
+    "２０１７1020T112238",
+]
+
+
+def _random_times(count: int, seed: int) -> list[str]:
+    rnd = random.Random(seed)
+    alphabet = "0123456789" * 3 + "T.-: %/"
+    return ["".join(rnd.choice(alphabet) for _ in range(rnd.randrange(8, 24))) for _ in range(count)]
+
+
+def _outcome(parse: tp.Callable[[tp.Any], datetime], time: tp.Any) -> tp.Any:
+    try:
+        return parse(time)
+    except (ValueError, TypeError) as error:
+        return type(error)
+
+
+@pytest.mark.parametrize("time_format", FORMATS)
+@pytest.mark.parametrize("cache_size", [0, 16])
+def test_times_are_parsed_as_by_get_valid_date(time_format: str, cache_size: int) -> None:
+    parser = TimeParser(time_format, cache_size)
+    times: list[tp.Any] = TIMES + _random_times(2000, seed=len(time_format)) + [None, 20171020]
+
+    for time in times + times[:50]:
+        assert _outcome(parser, time) == _outcome(lambda value: get_valid_date(value, time_format), time), time
+
+
+def test_micros_since_epoch() -> None:
+    parser = TimeParser("%Y%m%dT%H%M%S.%f")
+    assert parser.micros("19700101T000000.000001") == 1
+    assert parser.micros("19691231T235959") == -1_000_000
+    assert parser.micros("20171020T112238.5") == 1508498558_500000
+
+
+def test_parser_is_picklable() -> None:
+    parser = TimeParser("%Y%m%dT%H%M%S.%f")
+    parser("20171020T112238.5")
+
+    copy = pickle.loads(pickle.dumps(parser))
+
+    assert copy.time_format == parser.time_format
+    assert copy("20171020T112238.5") == datetime(2017, 10, 20, 11, 22, 38, 500000)
+
+
+@pytest.mark.parametrize("time_format", ["%Y-%m-%d %H:%M:%S", "%b %d %Y", "%Y%m", "%Y%m%d%f%H"])
+def test_formats_without_fixed_layout(time_format: str) -> None:
+    assert compile_layout(time_format) is None
+
+
+@pytest.mark.parametrize("batch_size", [None, 4])
+def test_parsed_micros_of_parse_time(batch_size: int | None) -> None:
+    if batch_size is not None:
+        pytest.importorskip("numpy")
+    times = ["20171020T112238.723", "19700101T000000", "19691231T235959.5", "2017-10-20"]
+    graph = Graph.graph_from_iter("rows").map(ParseTime("t", "%Y%m%dT%H%M%S.%f", "weekday", "hour", "micros"))
+
+    result = list(graph.run(batch_size=batch_size, rows=lambda: ({"t": time} for time in times[:3])))
+
+    parser = TimeParser("%Y%m%dT%H%M%S.%f")
+    assert [row["micros"] for row in result] == [parser.micros(time) for time in times[:3]]
+    with pytest.raises(ValueError):
+        list(graph.run(batch_size=batch_size, rows=lambda: ({"t": time} for time in times)))
+
+
+def test_times_left_by_arrays_are_parsed_by_cached_parser() -> None:
+    pytest.importorskip("numpy")
+    # with numpy times of other formats than FAST_TIME_FORMAT are parsed one by one by parser of Speed
+    leaves = ["2017-10-20T11:23:38", "2017-10-20T11:52:38"]
+    rows = [{"length": 1.0, "enter": "2017-10-20T11:22:38", "leave": leaves[index % 2]} for index in range(40)]
+    speed = reducer.Speed("length", "enter", "leave", "%Y-%m-%dT%H:%M:%S", "speed")
+
+    [result] = speed((), rows)
+
+    assert result["speed"] == pytest.approx(40 / (20 / 60 + 20 / 2))
+    info = speed._parser._parse.cache_info()  # type: ignore[attr-defined]
+    assert (info.misses, info.hits) == (3, 77)
@@ -0,0 +1,79 @@
+import random
+import typing as tp
+
+import pytest
+
+from compgraph.algorithms import word_count_graph
+from compgraph.graph import Graph
+from compgraph.mapper import FilterPunctuation
+from compgraph.mapper import LowerCase
+from compgraph.mapper import Split
+from compgraph.mapper import Tokenize
+from compgraph.operations import TRow
+from compgraph.reducer import Count
+
+TEXTS = [
+    "",
+    " ",
+    "word",
+    "Hello, World!",
+    "  leading and trailing  ",
+    "tabs\tand\nnew lines\r\nmixed \t here",
+    "...punctuation... only!?",
+    "!!!",
+    "ÜNICODE Ёжик «в тумане» — ok",
+    "don't split-words",
+    "a\x1cb c d",
+]
+
+
+def _random_texts(count: int, seed: int) -> list[str]:
+    rnd = random.Random(seed)
+    alphabet = "aBcDé Ж\t\n.,!-' "
+    return [
+        "".join(rnd.choice(alphabet) for _ in range(rnd.randrange(12)))
+        for _ in range(count)
+    ]
+
+
+def _chain(separator: str | None = None) -> Graph:
+    return (
+        Graph.graph_from_iter("rows")
+        .map(FilterPunctuation("text"))
+        .map(LowerCase("text"))
+        .map(Split("text", separator))
+    )
+
+
+def _run(graph: Graph, texts: tp.Sequence[str]) -> list[TRow]:
+    rows = [{"id": index, "text": text} for index, text in enumerate(texts)]
+    return list(graph.run(optimize=False, rows=lambda: ({**row} for row in rows)))
+
+
+@pytest.mark.parametrize("separator", [None, ",", " +"])
+def test_tokens_are_the_same_as_of_chain(separator: str | None) -> None:
+    texts = TEXTS + _random_texts(300, seed=separator is None)
+    graph = Graph.graph_from_iter("rows").map(Tokenize("text", separator))
+
+    assert _run(graph, texts) == _run(_chain(separator), texts)
+
+
+def test_word_count_counts_words_of_chain() -> None:
+    texts = TEXTS + _random_texts(100, seed=2)
+    rows = [{"text": text} for text in texts]
+    chain = _chain().sort(["text"]).reduce(Count("count"), ["text"]).sort(["count", "text"])
+
+    expected = list(chain.run(optimize=False, rows=lambda: ({**row} for row in rows)))
+
+    assert list(word_count_graph("rows").run(rows=lambda: ({**row} for row in rows))) == expected
+
+
+def test_batch_of_tokens() -> None:
+    row = {"id": 1, "text": "Hello, big World"}
+    assert list(Tokenize("text", batch=True)(row)) == [{"id": 1, "text": ["hello", "big", "world"]}]
+
+
+def test_unicode_punctuation_and_case_folding() -> None:
+    tokenize = Tokenize("text", unicode=True)
+    assert tokenize.tokens("«Straße» — это €5, не $5!") == ["strasse", "это", "5", "не", "5"]
+    assert Tokenize("text").tokens("«Straße» — это") == ["«straße»", "—", "это"]
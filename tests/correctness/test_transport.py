@@ -0,0 +1,81 @@
+import struct
+from multiprocessing import Pipe
+
+from compgraph.graph import Graph
+from compgraph.transport import BatchSender
+from compgraph.transport import OUT_OF_BAND_BYTES
+from compgraph.transport import recv_batch
+from compgraph.transport import recv_rows
+from compgraph.transport import send_batch
+from compgraph.transport import send_end
+
+
+def test_batch_round_trip_keeps_rows_and_large_binary_values() -> None:
+    local, remote = Pipe()
+    rows = [{"a": 1, "blob": b"x" * 100_000}, {"a": 2, "blob": bytearray(b"y" * 10)}]
+    send_batch(local, rows)
+    send_end(local)
+
+    batch = recv_batch(remote)
+    assert batch is not None
+    received, size = batch
+    assert received == rows
+    assert size > 0
+    assert recv_batch(remote) is None
+
+
+def test_large_bytes_travel_out_of_band() -> None:
+    local, remote = Pipe()
+    blob = b"x" * OUT_OF_BAND_BYTES
+    rows = [{"a": 1, "blob": blob}, {"a": 2, "blob": b"y" * 10, "other": blob}, {"a": 3, "blob": bytearray(blob)}]
+
+    size = send_batch(local, rows)
+
+    # only bytes are sent as buffers, they are not copied into pickled payload
+    assert struct.unpack_from("<I", remote.recv_bytes()) == (2,)
+    assert [remote.recv_bytes() for _ in range(2)] == [blob, blob]
+    assert OUT_OF_BAND_BYTES < size < 2 * OUT_OF_BAND_BYTES
+    assert rows[0]["blob"] is blob
+
+    send_batch(local, rows)
+    batch = recv_batch(remote)
+    assert batch is not None and batch[0] == rows and batch[1] == size
+    assert [type(row["blob"]) for row in batch[0]] == [bytes, bytes, bytearray]
+
+
+def test_sender_splits_rows_into_batches_and_counts_them() -> None:
+    local, remote = Pipe()
+    sender = BatchSender(local, batch_size=3)
+    rows = [{"n": index} for index in range(10)]
+    sender.send_all(rows)
+    sender.close()
+
+    assert sender.rows == 10
+    sizes = []
+    while (batch := recv_batch(remote)) is not None:
+        sizes.append(len(batch[0]))
+    assert sizes == [3, 3, 3, 1]
+
+
+def test_sender_shrinks_batches_of_big_rows() -> None:
+    local, remote = Pipe()
+    sender = BatchSender(local, batch_size=100, batch_bytes=500)
+    rows = [{"text": f"{index:03}" + "z" * 50} for index in range(150)]
+    sender.send_all(rows)
+    sender.close()
+
+    sizes = []
+    received = []
+    while (batch := recv_batch(remote)) is not None:
+        sizes.append(len(batch[0]))
+        received += batch[0]
+    assert received == rows
+    # the first batch is of batch_size rows, pickled batches of the next ones stay around batch_bytes
+    assert sizes[0] == 100
+    assert max(sizes[1:]) <= 10
+
+
+def test_sort_of_many_rows_goes_through_batches() -> None:
+    rows = [{"n": (index * 7919) % 10_007} for index in range(10_007)]
+    result = list(Graph.graph_from_iter("rows").sort(["n"]).run(rows=lambda: iter(rows)))
+    assert [row["n"] for row in result] == list(range(10_007))
@@ -0,0 +1,101 @@
+import typing as tp
+from datetime import datetime
+from datetime import timedelta
+
+import pytest
+
+from compgraph import reducer
+from compgraph.algorithms import yandex_maps_graph
+from compgraph.graph import Graph
+from compgraph.mapper import CalcHaversine
+from compgraph.mapper import ParseTime
+from compgraph.misc import get_valid_date
+from tests.correctness.samples import edges
+from tests.correctness.samples import sources
+from tests.correctness.samples import travels
+
+np = pytest.importorskip("numpy")
+
+from compgraph.columnar import FAST_TIME_FORMAT  # noqa: E402
+from compgraph.columnar import parse_times  # noqa: E402
+
+TIMES = [
+    "20171020T112238.723000",
+    "20171020T112238.7",
+    "20171020T112238.000001",
+    "20171020T112238",
+    "20160229T235959.999999",
+    "19700101T000000",
+    "19691231T235959.5",
+    "00010101T000000",
+    "99991231T235959.999999",
+    "2017102T11223",
+]
+INVALID_TIMES = [
+    "20171020T1122381",
+    "20170229T000000",
+    "20171020T246000",
+    "20171020 112238",
+    "20171020T112238.",
+    "x",
+    "",
+]
+
+
+def _micros(time: str, time_format: str) -> int:
+    return (get_valid_date(time, time_format) - datetime(1970, 1, 1)) // timedelta(microseconds=1)
+
+
+@pytest.mark.parametrize("time_format", [FAST_TIME_FORMAT, "%Y%m%dT%H%M%S", "%d.%m.%Y %H:%M"])
+def test_parse_times_as_get_valid_date(time_format: str) -> None:
+    times = TIMES + ["20.10.2017 11:22"]
+    valid = []
+    for time in times:
+        try:
+            get_valid_date(time, time_format)
+        except ValueError:
+            continue
+        valid.append(time)
+
+    assert parse_times(valid, time_format).tolist() == [_micros(time, time_format) for time in valid]
+
+
+@pytest.mark.parametrize("time", INVALID_TIMES)
+def test_invalid_times_raise_as_get_valid_date(time: str) -> None:
+    with pytest.raises(ValueError):
+        get_valid_date(time, FAST_TIME_FORMAT)
+    with pytest.raises(ValueError):
+        parse_times(["20171020T112238", time], FAST_TIME_FORMAT)
+
+
+def test_parse_time_mapper_on_batches() -> None:
+    rows = [{"t": time} for time in TIMES]
+    graph = Graph.graph_from_iter("rows").map(ParseTime("t", FAST_TIME_FORMAT, "weekday", "hour"))
+
+    expected = list(graph.run(optimize=False, rows=lambda: (dict(row) for row in rows)))
+    assert list(graph.run(batch_size=4, rows=lambda: (dict(row) for row in rows))) == expected
+
+
+def test_haversine_on_batches() -> None:
+    rows = edges(100, seed=1)
+    graph = Graph.graph_from_iter("rows").map(CalcHaversine("start", "end", "length"))
+
+    expected = list(graph.run(optimize=False, **sources({"rows": rows})))
+    result = list(graph.run(batch_size=16, **sources({"rows": rows})))
+
+    assert [row["length"] for row in result] == pytest.approx([row["length"] for row in expected], rel=1e-12)
+
+
+@pytest.mark.parametrize("batch_size", [None, 64])
+@pytest.mark.parametrize("with_numpy", [True, False])
+def test_yandex_maps_speeds(monkeypatch: pytest.MonkeyPatch, batch_size: tp.Optional[int], with_numpy: bool) -> None:
+    data = sources({"travel_time": travels(500, 30, seed=2), "edge_length": edges(30, seed=2)})
+    expected = list(yandex_maps_graph("travel_time", "edge_length").run(optimize=False, **data))
+    if not with_numpy:
+        monkeypatch.setattr(reducer, "np", None)
+
+    result = list(yandex_maps_graph("travel_time", "edge_length").run(batch_size=batch_size, **data))
+
+    assert [(row["weekday"], row["hour"]) for row in result] == [(row["weekday"], row["hour"]) for row in expected]
+    assert [row["speed"] for row in result] == pytest.approx([row["speed"] for row in expected], rel=1e-9)
+